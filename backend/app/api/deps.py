@@ -2,9 +2,20 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import Optional
+import time
 from app.database import get_db
 from app.models.user import User
 from app.services.auth import decode_access_token
+from app.services.user_cache import UserSnapshot, sync_user_changes, user_cache
+from app.services.admission import (
+    GateSlot,
+    check_rate_limit,
+    chat_rate_limiter,
+    upload_rate_limiter,
+    llm_gate,
+    ingestion_gate,
+)
+from app.metrics import track_stage
 
 # Security scheme for JWT bearer token
 security = HTTPBearer()
@@ -13,22 +24,34 @@ security = HTTPBearer()
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
+) -> UserSnapshot:
     """
     Dependency to get current authenticated user from JWT token.
     
+    Verified tokens are cached with a snapshot of their user, so repeat
+    requests with the same token skip both JWT decoding and the user query.
+    
     Args:
         credentials: Bearer token from Authorization header
         db: Database session
-        
+    
     Returns:
-        Current user object
-        
+        Snapshot of the current user
+    
     Raises:
         HTTPException: If token is invalid or user not found
     """
-    # Extract token
-    token = credentials.credentials
+    with track_stage("request", "auth"):
+        return _authenticate(credentials.credentials, db)
+
+
+def _authenticate(token: str, db: Session) -> UserSnapshot:
+    """Resolve a bearer token to a user snapshot (cache first, then JWT + DB)"""
+    # Serve from cache when this token was verified recently (and its user is unchanged)
+    sync_user_changes(db)
+    cached_user = user_cache.get(token)
+    if cached_user is not None:
+        return cached_user
     
     # Decode token
     payload = decode_access_token(token)
@@ -48,7 +71,8 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Query user from database
+    # Query user from database (a change seen after this point keeps the snapshot out of the cache)
+    read_at = time.monotonic()
     user = db.query(User).filter(User.username == username).first()
     if user is None:
         raise HTTPException(
@@ -64,22 +88,25 @@ def get_current_user(
             detail="Inactive user"
         )
     
-    return user
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.put(token, snapshot, payload.get("exp"), read_at=read_at)
+    
+    return snapshot
 
 
 def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: UserSnapshot = Depends(get_current_user)
+) -> UserSnapshot:
     """
     Dependency to get current active user.
     Additional check on top of get_current_user.
     
     Args:
         current_user: User from get_current_user dependency
-        
+    
     Returns:
-        Active user object
-        
+        Active user snapshot
+    
     Raises:
         HTTPException: If user is inactive
     """
@@ -91,10 +118,86 @@ def get_current_active_user(
     return current_user
 
 
+def get_current_superuser(
+    current_user: UserSnapshot = Depends(get_current_user)
+) -> UserSnapshot:
+    """
+    Dependency to require an admin (superuser) account.
+    
+    Args:
+        current_user: User from get_current_user dependency
+    
+    Returns:
+        Superuser snapshot
+    
+    Raises:
+        HTTPException: If user is not a superuser
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+
+async def admit_chat(
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Dependency applying admission control to chat requests.
+    
+    Charges the user's chat token bucket, then holds one of the global
+    LLM slots for the rest of the request.
+    
+    Args:
+        current_user: User from get_current_user dependency
+    
+    Raises:
+        HTTPException: 429 if the user is over their rate, 503 if no slot frees up in time
+    """
+    check_rate_limit(chat_rate_limiter, current_user.id)
+    with track_stage("request", "queue_wait"):
+        await llm_gate.acquire()
+    try:
+        yield
+    finally:
+        llm_gate.release()
+
+
+async def admit_upload(
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Dependency applying admission control to document uploads.
+    
+    Charges the user's upload token bucket, then holds one of the global
+    ingestion slots for the rest of the request, or until the handler
+    releases it (work handed to a background pool).
+    
+    Args:
+        current_user: User from get_current_user dependency
+    
+    Yields:
+        GateSlot of the held slot
+    
+    Raises:
+        HTTPException: 429 if the user is over their rate, 503 if no slot frees up in time
+    """
+    check_rate_limit(upload_rate_limiter, current_user.id)
+    with track_stage("request", "queue_wait"):
+        await ingestion_gate.acquire()
+    slot = GateSlot(ingestion_gate)
+    try:
+        yield slot
+    finally:
+        slot.release()
+
+
 def get_optional_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
-) -> Optional[User]:
+) -> Optional[UserSnapshot]:
     """
     Dependency to optionally get current user (doesn't raise error if not authenticated).
     Useful for endpoints that work with or without authentication.
@@ -102,9 +205,9 @@ def get_optional_current_user(
     Args:
         credentials: Optional bearer token
         db: Database session
-        
+    
     Returns:
-        User object if authenticated, None otherwise
+        User snapshot if authenticated, None otherwise
     """
     if credentials is None:
         return None
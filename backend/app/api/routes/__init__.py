@@ -5,5 +5,6 @@ API Routes Package
 from app.api.routes.auth import router as auth_router
 from app.api.routes.documents import router as documents_router
 from app.api.routes.chat import router as chat_router
+from app.api.routes.admin import router as admin_router
 
-__all__ = ["auth_router", "documents_router", "chat_router"]
\ No newline at end of file
+__all__ = ["auth_router", "documents_router", "chat_router", "admin_router"]
\ No newline at end of file
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+from app.api.deps import get_current_superuser
+from app.services.profiler import list_profiles, get_profile_path
+from app.services.ingestion import recover_documents
+from app.services.maintenance import collect_tombstones, reconcile, compact
+from app.services.user_cache import UserSnapshot
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/profiles", response_model=dict)
+def get_profiles(current_user: UserSnapshot = Depends(get_current_superuser)):
+    """
+    List captured slow-request profiles, newest first.
+    
+    Each entry carries the request metadata (method, path, status,
+    duration) and the sample count. Requires an admin account.
+    """
+    profiles = list_profiles()
+    return {
+        "total": len(profiles),
+        "profiles": profiles
+    }
+
+
+@router.get("/profiles/{name}")
+def download_profile(
+    name: str,
+    current_user: UserSnapshot = Depends(get_current_superuser)
+):
+    """
+    Download a profile as folded stacks.
+    
+    - **name**: Profile name from the list endpoint
+    
+    The file can be rendered with flamegraph.pl, speedscope or inferno.
+    """
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+
+@router.post("/maintenance/{job}", response_model=dict)
+def run_maintenance_job(
+    job: str,
+    background_tasks: BackgroundTasks,
+    current_user: UserSnapshot = Depends(get_current_superuser)
+):
+    """
+    Run a maintenance job now instead of waiting for its schedule.
+    
+    - **job**: `collect` (purge deleted documents), `recover` (resume
+      interrupted ingestion from its checkpoints), `reconcile` (repair
+      missing indexes, remove orphaned files and indexes) or `compact`
+      (VACUUM the database and local vector stores)
+    
+    Returns the job's report. `reconcile` can re-index many documents, so
+    it is queued to run after the response instead (see the logs for its
+    report). Requires an admin account.
+    """
+    jobs = {
+        "collect": collect_tombstones,
+        "recover": recover_documents,
+        "reconcile": reconcile,
+        "compact": compact,
+    }
+    if job not in jobs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown maintenance job. Choose one of: {', '.join(jobs)}"
+        )
+    
+    if job == "reconcile":
+        background_tasks.add_task(reconcile)
+        return {"job": job, "queued": True}
+    
+    return {"job": job, "report": jobs[job]()}
@@ -1,16 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models.user import User
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token
-from app.services.auth import hash_password, verify_password, create_access_token
+from app.services.auth import hash_password_async, verify_password_async, password_needs_rehash, create_access_token
 from app.api.deps import get_current_user
+from app.services.user_cache import UserSnapshot
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
 @router.post("/signup", response_model=Token, status_code=status.HTTP_201_CREATED)
-def signup(user_data: UserCreate, db: Session = Depends(get_db)):
+async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user account.
     
@@ -20,7 +22,7 @@ def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     - **full_name**: Optional full name
     """
     # Check if username already exists
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    existing_user = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,15 +30,15 @@ def signup(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Check if email already exists
-    existing_email = db.query(User).filter(User.email == user_data.email).first()
+    existing_email = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_email:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Hash password
-    hashed_password = hash_password(user_data.password)
+    # Hash password (awaited, so the hashing pool never holds up other requests)
+    hashed_password = await hash_password_async(user_data.password)
     
     # Create new user
     new_user = User(
@@ -47,8 +49,8 @@ def signup(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     # Create access token
     access_token = create_access_token(data={"sub": new_user.username})
@@ -61,7 +63,7 @@ def signup(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """
     Login with username and password.
     
@@ -71,9 +73,9 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
     Returns JWT access token for authenticated requests.
     """
     # Find user by username or email
-    user = db.query(User).filter(
+    user = await db.scalar(select(User).where(
         (User.username == credentials.username) | (User.email == credentials.username)
-    ).first()
+    ))
     
     if not user:
         raise HTTPException(
@@ -83,7 +85,7 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
         )
     
     # Verify password
-    if not verify_password(credentials.password, user.password_hash):
+    if not await verify_password_async(credentials.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -97,6 +99,16 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
             detail="Inactive user account"
         )
     
+    # Transparently upgrade hashes created with a different cost factor
+    if password_needs_rehash(user.password_hash):
+        try:
+            user.password_hash = await hash_password_async(credentials.password)
+            await db.commit()
+        except HTTPException:
+            # Hashing pool is busy; nothing was changed, so keep the old hash and upgrade
+            # on a later login (a rollback would expire user and force a reload here)
+            pass
+    
     # Create access token
     access_token = create_access_token(data={"sub": user.username})
     
@@ -108,7 +120,7 @@ def login(credentials: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+def get_current_user_info(current_user: UserSnapshot = Depends(get_current_user)):
     """
     Get current authenticated user information.
     Requires valid JWT token in Authorization header.
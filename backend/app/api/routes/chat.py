@@ -1,12 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Optional
 from sqlalchemy.orm import Session
+import time
 
+from app.config import settings
 from app.database import get_db
-from app.models.user import User
 from app.models.document import Document
-from app.schemas.chat import ChatRequest, ChatResponse
-from app.api.deps import get_current_user
-from app.services.rag_service import rag_service
+from app.schemas.chat import (
+    ChatRequest,
+    ChatResponse,
+    ChatExplain,
+    ChatHistoryResponse,
+    ConversationResponse,
+    ConversationListResponse
+)
+from app.api.deps import get_current_user, admit_chat
+from app.services.user_cache import UserSnapshot
+from app.services.ingestion_profiles import get_profile, indexed_profile
+from app.services.rag_service import get_rag_service, is_compatible_index, partial_index_chunks
+from app.services.conversations import (
+    create_conversation,
+    get_conversation,
+    list_conversations,
+    load_history,
+    append_exchange,
+    get_messages_page,
+    delete_conversation
+)
+from app.services.progressive import is_partial, prioritize_for_question
+from app.metrics import PARTIAL_INDEX_ANSWERS, track_stage, mark_handler_done
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
@@ -14,25 +36,63 @@ router = APIRouter(prefix="/chat", tags=["Chat"])
 @router.post("/", response_model=ChatResponse)
 def ask_question(
     chat_request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    explain: bool = False,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    _admission: None = Depends(admit_chat)
 ):
     """
     Ask a question about a document using RAG (Retrieval-Augmented Generation).
     
     - **document_id**: ID of the document to query
     - **question**: Your question about the document
+    - **conversation_id**: Conversation to continue; omit to start a new one
+      (the new id is returned in the response)
+    - **deadline_ms**: Latency budget (server default CHAT_DEADLINE_SECONDS);
+      if the AI model has not answered in time, the most relevant sentences
+      of the document are returned instead and **fallback** says why
+    - **page_start** / **page_end**: Only search these pages
+    - **explain**: Query flag; include retrieved chunk ids, scores, token
+      counts and stage timings in the response
+    
+    Large documents can be asked about while they are still being
+    indexed: the answer comes from the chunks embedded so far (**partial**,
+    with their share in **coverage**), and the pages the question points
+    at (the page range, or the pages sharing the most words with the
+    question) are embedded next (**prioritized_pages**). Workers other
+    than the one building the index search the copy it last published
+    (PROGRESSIVE_PUBLISH_SECONDS), and answer 409 until there is one.
+    
+    Stage durations are always returned in the Server-Timing header.
+    Requests are rate limited per user (429) and queued behind a global
+    cap on concurrent LLM calls (503 with Retry-After when the wait is too long).
     
     The system will:
     1. Retrieve relevant sections from the document
     2. Use AI (Groq) to generate an accurate answer
     3. Return the answer with source references
     """
+    budget = settings.CHAT_DEADLINE_SECONDS
+    if chat_request.deadline_ms is not None:
+        budget = min(chat_request.deadline_ms / 1000, settings.CHAT_MAX_DEADLINE_SECONDS)
+    deadline = time.monotonic() + budget
+    
+    page_range = None
+    if chat_request.page_start is not None or chat_request.page_end is not None:
+        page_range = (chat_request.page_start or 1, chat_request.page_end or 1_000_000)
+        if page_range[0] > page_range[1]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="page_start must not be after page_end"
+            )
+    
     # Verify document exists and belongs to user
-    document = db.query(Document).filter(
-        Document.id == chat_request.document_id,
-        Document.user_id == current_user.id
-    ).first()
+    with track_stage("chat", "db_lookup"):
+        document = db.query(Document).filter(
+            Document.id == chat_request.document_id,
+            Document.user_id == current_user.id,
+            Document.deleted_at.is_(None)
+        ).first()
     
     if not document:
         raise HTTPException(
@@ -40,37 +100,144 @@ def ask_question(
             detail="Document not found"
         )
     
+    # A document still being embedded is searched as far as it goes, and the pages asked about go next
+    prioritized_pages = None
+    partial = is_partial(document)
+    building = False
+    if partial:
+        with track_stage("chat", "prioritize"):
+            prioritized_pages = prioritize_for_question(db, document, chat_request.question, page_range)
+        building = get_rag_service().is_building(document.id)
+        if not building:
+            db.refresh(document)  # The build may have just finished or published a copy
+            partial = is_partial(document)
+            if partial and not document.partial_index:
+                # Another worker is building the index and has not published a searchable copy yet
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Document is still being indexed by another worker. Please try again shortly."
+                )
+    
     # Check if document has been processed
-    if not document.vector_store_id:
+    if not document.vector_store_id and not partial:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Document has not been processed yet. Please wait for processing to complete."
         )
     
-    # Query the document using RAG
-    result = rag_service.query_document(
-        question=chat_request.question,
-        document_id=chat_request.document_id
-    )
-    
-    if not result["success"]:
+    profile = indexed_profile(document.ingestion_profile, document.ingestion_params)
+    if not is_compatible_index(document.embedding_version, profile.embedding_backend):
+        # The reconciler rebuilds indexes made with a different embedding model
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=result["answer"]
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is being re-indexed for the current embedding model. Please try again later."
         )
     
-    return ChatResponse(
+    coverage = 1.0
+    partial_index = None
+    if partial:
+        if building and page_range is not None:
+            # The requested pages were just moved up; give the build a moment to embed them
+            wait = min(settings.PROGRESSIVE_PAGE_WAIT_SECONDS, (deadline - time.monotonic()) / 2)
+            with track_stage("chat", "page_wait"):
+                get_rag_service().wait_for_pages(document.id, page_range, max(0.0, wait))
+            db.refresh(document)
+            partial = is_partial(document)
+        if partial and building:
+            coverage = round(document.chunks_embedded / document.chunks_total, 4) if document.chunks_total else 0.0
+        elif partial:
+            # The published copy lags the build by up to PROGRESSIVE_PUBLISH_SECONDS
+            partial_index = document.partial_index
+            embedded = min(partial_index_chunks(partial_index), document.chunks_total or 0)
+            coverage = round(embedded / document.chunks_total, 4) if document.chunks_total else 0.0
+    
+    # Continue the conversation (recent turns go into the prompt) or start a new one
+    history = []
+    with track_stage("chat", "history"):
+        if chat_request.conversation_id is not None:
+            conversation = get_conversation(db, chat_request.conversation_id, current_user.id)
+            if not conversation or conversation.document_id != document.id:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Conversation not found"
+                )
+            history = load_history(db, conversation.id)
+        else:
+            conversation = create_conversation(db, current_user.id, document.id, chat_request.question)
+    
+    # Query the document using RAG; a conversation started for a question that fails is removed again
+    try:
+        result = get_rag_service().query_document(
+            question=chat_request.question,
+            document_id=chat_request.document_id,
+            history=history,
+            conversation_id=conversation.id,
+            deadline=deadline,
+            profile=profile,
+            page_range=page_range,
+            partial_index=partial_index
+        )
+        if not result["success"]:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=result["answer"]
+            )
+    except BaseException:
+        if chat_request.conversation_id is None:
+            delete_conversation(db, conversation)
+            db.commit()
+        raise
+    
+    with track_stage("chat", "history"):
+        append_exchange(
+            db,
+            conversation,
+            chat_request.question,
+            result["answer"],
+            [chunk["id"] for chunk in result["retrieved"]]
+        )
+    
+    if partial:
+        PARTIAL_INDEX_ANSWERS.inc()
+    
+    explain_data = None
+    if explain:
+        explain_data = ChatExplain(
+            chunks=result["retrieved"],
+            k=len(result["retrieved"]),
+            retrieval=result["retrieval"],
+            retrieval_cutoff=result["retrieval_cutoff"],
+            model=result["llm"]["model"],
+            route=result["llm"]["route"],
+            route_reason=result["llm"]["route_reason"],
+            prompt_tokens=result["llm"]["prompt_tokens"],
+            completion_tokens=result["llm"]["completion_tokens"],
+            llm_latency_ms=result["llm"]["latency_ms"],
+            stage_timings_ms={
+                stage: round(seconds * 1000, 2) for stage, seconds in result["timings"].items()
+            }
+        )
+    
+    response = ChatResponse(
         question=chat_request.question,
         answer=result["answer"],
         document_id=chat_request.document_id,
-        sources=result.get("sources", [])
+        conversation_id=conversation.id,
+        sources=result.get("sources", []),
+        fallback=result["fallback"],
+        partial=partial,
+        coverage=coverage,
+        prioritized_pages=prioritized_pages,
+        explain=explain_data
     )
+    mark_handler_done()
+    return response
 
 
 @router.get("/document/{document_id}", response_model=dict)
 def get_document_info_for_chat(
     document_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -82,7 +249,8 @@ def get_document_info_for_chat(
     """
     document = db.query(Document).filter(
         Document.id == document_id,
-        Document.user_id == current_user.id
+        Document.user_id == current_user.id,
+        Document.deleted_at.is_(None)
     ).first()
     
     if not document:
@@ -97,5 +265,91 @@ def get_document_info_for_chat(
         "page_count": document.page_count,
         "uploaded_at": document.uploaded_at,
         "is_processed": bool(document.vector_store_id),
-        "ready_for_chat": bool(document.vector_store_id and document.extracted_text)
-    }
\ No newline at end of file
+        "ready_for_chat": bool((document.vector_store_id or is_partial(document)) and document.extracted_text),
+        "partial": is_partial(document),
+        "status": document.status,
+        "chunks_embedded": document.chunks_embedded,
+        "chunks_total": document.chunks_total,
+        "ingestion_profile": get_profile(document.ingestion_profile).name
+    }
+
+
+@router.get("/conversations", response_model=ConversationListResponse)
+def get_conversations(
+    document_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    List the user's conversations, newest first.
+    
+    - **document_id**: Only conversations about this document
+    - **before_id**: Cursor from the previous page's `next_before_id`
+    - **limit**: Maximum number of conversations to return
+    """
+    page = list_conversations(db, current_user.id, document_id, before_id, limit)
+    return {
+        "conversations": [ConversationResponse.model_validate(c) for c in page["conversations"]],
+        "next_before_id": page["next_before_id"]
+    }
+
+
+@router.get("/conversations/{conversation_id}/messages", response_model=ChatHistoryResponse)
+def get_conversation_history(
+    conversation_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a page of a conversation's messages.
+    
+    - **conversation_id**: ID of the conversation
+    - **before_id**: Cursor from the previous page's `next_before_id`
+      (omit for the most recent messages)
+    - **limit**: Maximum number of messages to return
+    
+    Messages within a page are oldest first; follow `next_before_id` to
+    page back through older messages.
+    """
+    conversation = get_conversation(db, conversation_id, current_user.id)
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    
+    page = get_messages_page(db, conversation.id, before_id, limit)
+    return {
+        "document_id": conversation.document_id,
+        "conversation_id": conversation.id,
+        "chat_history": page["messages"],
+        "next_before_id": page["next_before_id"]
+    }
+
+
+@router.delete("/conversations/{conversation_id}", status_code=status.HTTP_200_OK)
+def remove_conversation(
+    conversation_id: int,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Delete a conversation and its messages.
+    
+    - **conversation_id**: ID of the conversation to delete
+    """
+    conversation = get_conversation(db, conversation_id, current_user.id)
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    
+    delete_conversation(db, conversation)
+    db.commit()
+    
+    return {"message": "Conversation deleted successfully"}
@@ -1,137 +1,225 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import datetime
-import os
-import uuid
-from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, List, Optional
+from functools import partial
+import asyncio
+import json
+import shutil
 
-from app.database import get_db
-from app.models.user import User
+from app.database import get_db, get_async_db
 from app.models.document import Document
-from app.schemas.document import DocumentResponse, DocumentListResponse, DocumentUploadResponse
-from app.api.deps import get_current_user
-from app.services.pdf_processor import extract_text_from_pdf, get_file_size_mb, validate_pdf
-from app.services.rag_service import rag_service
+from app.schemas.document import (
+    DocumentResponse,
+    DocumentListResponse,
+    DocumentUploadResponse,
+    DocumentVersion,
+    DocumentVersionsResponse,
+    IngestionProfilesResponse
+)
+from app.api.deps import get_current_user, admit_upload
+from app.services.user_cache import UserSnapshot
+from app.services.admission import GateSlot, check_rate_limit, upload_rate_limiter, bulk_ingestion_gate
+from app.services.ingestion import (
+    IngestionError,
+    PreparedUpload,
+    prepare_upload,
+    create_document,
+    index_document,
+    discard_upload,
+    stage_uploads,
+    make_staging_dir,
+    bulk_ingest
+)
+from app.services.ingestion_profiles import profile_costs, validate_profile_name
+from app.services.maintenance import tombstone_document, collect_document
+from app.services.near_duplicates import find_near_duplicates, compare_pages
+from app.services.progressive import start_progressive, wait_until_queryable, is_partial
 from app.config import settings
+from app.metrics import mark_handler_done
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
 
+def _check_profile(profile: Optional[str]):
+    try:
+        validate_profile_name(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _ingest_upload(
+    db: Session,
+    user_id: int,
+    prepared: PreparedUpload,
+    profile: Optional[str],
+    release_admission: Callable[[], None]
+) -> dict:
+    """Create and index an uploaded document and build the response (in the threadpool, with the request session)"""
+    try:
+        # Create document record
+        new_document = create_document(db, user_id, prepared, profile)
+    except Exception as e:
+        # Clean up file on error
+        discard_upload(prepared)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing document: {str(e)}"
+        )
+    
+    # Create vector store for RAG (large documents finish in the background)
+    queryable = start_progressive(new_document)
+    if queryable is None:
+        searchable = index_document(db, new_document)
+    else:
+        # The background pool bounds the builds; free the ingestion slot while waiting
+        release_admission()
+        searchable = wait_until_queryable(db, new_document, queryable)
+    
+    message = "Document uploaded and processed successfully"
+    if is_partial(new_document):
+        message = "Document uploaded; indexing continues in the background and chat is available"
+    elif not searchable and queryable is not None:
+        message = "Document uploaded; indexing is queued and continues in the background"
+    return {
+        "message": message,
+        "document": DocumentResponse.model_validate(new_document)
+    }
+
+
 @router.post("/upload", response_model=DocumentUploadResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    profile: Optional[str] = Query(None, description='"small", "standard", "large" or "auto"'),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    admission: GateSlot = Depends(admit_upload)
 ):
     """
     Upload a PDF document for processing.
     
     - **file**: PDF file to upload (max 10MB)
+    - **profile**: Ingestion profile (chunking, embedding backend and
+      retrieval depth); "auto" or omitted picks one from the page count
+      unless INGESTION_PROFILE_DEFAULT names one
     
     The document will be:
     1. Validated as a PDF
     2. Saved to the server
     3. Text extracted
     4. Embedded into vector database for RAG
-    """
-    # Validate file type
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only PDF files are allowed"
-        )
     
-    # Generate unique filename
-    file_extension = Path(file.filename).suffix
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
+    Documents of PROGRESSIVE_MIN_PAGES pages or more are returned as soon
+    as their first chunks are searchable, with status "embedding"; the
+    rest is embedded in the background and chat works meanwhile. When the
+    background builds are all busy the upload returns after
+    PROGRESSIVE_UPLOAD_WAIT_SECONDS with the document still queued.
     
+    Uploads are rate limited per user (429) and share a global cap on
+    concurrent ingestions (503 with Retry-After when the wait is too long).
+    """
+    _check_profile(profile)
+    
+    # Store, validate and extract off the event loop
     try:
-        # Save file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Validate PDF
-        validation = validate_pdf(file_path)
-        if not validation["valid"]:
-            os.remove(file_path)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid PDF file: {validation['error']}"
-            )
-        
-        # Get file size
-        file_size = get_file_size_mb(file_path)
-        
-        # Check file size limit
-        if file_size and file_size > (settings.MAX_UPLOAD_SIZE / (1024 * 1024)):
-            os.remove(file_path)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File size exceeds limit of {settings.MAX_UPLOAD_SIZE / (1024 * 1024)}MB"
-            )
-        
-        # Extract text from PDF
-        extraction_result = extract_text_from_pdf(file_path)
-        
-        if not extraction_result["success"]:
-            os.remove(file_path)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to extract text: {extraction_result['error']}"
-            )
-        
-        # Create document record
-        new_document = Document(
-            user_id=current_user.id,
-            filename=unique_filename,
-            original_filename=file.filename,
-            file_path=file_path,
-            file_size=file_size,
-            mime_type=file.content_type or "application/pdf",
-            extracted_text=extraction_result["text"],
-            page_count=extraction_result["page_count"],
-            processed_at=datetime.utcnow()
-        )
-        
-        db.add(new_document)
-        db.commit()
-        db.refresh(new_document)
-        
-        # Create vector store for RAG
-        success = rag_service.create_vector_store(
-            text=extraction_result["text"],
-            document_id=new_document.id
-        )
-        
-        if success:
-            new_document.vector_store_id = f"doc_{new_document.id}"
-            db.commit()
-        
-        return {
-            "message": "Document uploaded and processed successfully",
-            "document": DocumentResponse.model_validate(new_document)
-        }
-        
-    except HTTPException:
-        raise
+        prepared = await run_in_threadpool(prepare_upload, file.filename, file.file, file.content_type)
+    except IngestionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.reason)
     except Exception as e:
-        # Clean up file on error
-        if os.path.exists(file_path):
-            os.remove(file_path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing document: {str(e)}"
         )
+    
+    # Every use of the session, up to the validated response, stays in one
+    # threadpool call; the admission slot is released back on the event loop
+    loop = asyncio.get_running_loop()
+    response = await run_in_threadpool(
+        _ingest_upload,
+        db,
+        current_user.id,
+        prepared,
+        profile,
+        partial(loop.call_soon_threadsafe, admission.release)
+    )
+    mark_handler_done()
+    return response
+
+
+@router.post("/upload/bulk")
+async def upload_documents_bulk(
+    files: List[UploadFile] = File(...),
+    profile: Optional[str] = Query(None, description='"small", "standard", "large" or "auto"'),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """
+    Upload many PDFs at once, as individual files and/or ZIP archives.
+    
+    - **files**: PDF files and/or .zip archives of PDFs
+    - **profile**: Ingestion profile for every file (see single upload)
+    
+    Files are processed in parallel (BULK_UPLOAD_WORKERS) and document rows
+    are committed in batches. Progress streams back as NDJSON, one event
+    per line:
+    
+    - `{"event": "accepted", "total": N, ...}`
+    - `{"event": "extracted", "index": i, "filename": ..., "page_count": ...}`
+    - `{"event": "ready", "index": i, "filename": ..., "document_id": ...}`
+    - `{"event": "failed", "index": i, "filename": ..., "reason": ...}`
+    - `{"event": "summary", "total": N, "ready": ..., "failed": ..., "elapsed_seconds": ...}`
+    
+    Counts as one upload against the per-user rate limit; a global cap
+    limits concurrent bulk uploads (503 with Retry-After when busy).
+    """
+    _check_profile(profile)
+    check_rate_limit(upload_rate_limiter, current_user.id)
+    
+    # Request files are closed when this handler returns, so stage copies
+    # for the streamed response before handing over
+    staging_dir = make_staging_dir()
+    try:
+        sources = await run_in_threadpool(
+            stage_uploads, [(upload.filename, upload.file) for upload in files], staging_dir
+        )
+    except IngestionError as e:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise HTTPException(status_code=e.status_code, detail=e.reason)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    
+    try:
+        await bulk_ingestion_gate.acquire()
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    
+    async def progress():
+        try:
+            async for event in bulk_ingest(
+                current_user.id,
+                sources,
+                workers=max(1, settings.BULK_UPLOAD_WORKERS),
+                batch_size=max(1, settings.BULK_COMMIT_BATCH_SIZE),
+                profile=profile
+            ):
+                yield json.dumps(event) + "\n"
+        finally:
+            bulk_ingestion_gate.release()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
 
 
 @router.get("/", response_model=DocumentListResponse)
-def list_documents(
+async def list_documents(
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get list of user's uploaded documents.
@@ -139,12 +227,15 @@ def list_documents(
     - **skip**: Number of records to skip (pagination)
     - **limit**: Maximum number of records to return
     """
-    # Query user's documents
-    documents = db.query(Document).filter(
-        Document.user_id == current_user.id
-    ).order_by(Document.uploaded_at.desc()).offset(skip).limit(limit).all()
+    # Query user's documents on the async engine (clients poll this while uploads are indexed)
+    query = select(Document).where(
+        Document.user_id == current_user.id,
+        Document.deleted_at.is_(None)
+    )
+    result = await db.execute(query.order_by(Document.uploaded_at.desc()).offset(skip).limit(limit))
+    documents = result.scalars().all()
     
-    total = db.query(Document).filter(Document.user_id == current_user.id).count()
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
     
     return {
         "total": total,
@@ -152,20 +243,71 @@ def list_documents(
     }
 
 
+@router.get("/profiles", response_model=IngestionProfilesResponse)
+def get_ingestion_profiles(
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    List the ingestion profiles and what indexing your documents with each has cost.
+    
+    Per profile: its chunking, embedding backend and retrieval depth,
+    and over your indexed documents the pages, chunks and seconds spent
+    embedding, in total and per document / page.
+    """
+    return {
+        "default": settings.INGESTION_PROFILE_DEFAULT,
+        "profiles": profile_costs(db, current_user.id)
+    }
+
+
 @router.get("/{document_id}", response_model=DocumentResponse)
-def get_document(
+async def get_document(
     document_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get details of a specific document.
     
     - **document_id**: ID of the document
     """
+    document = await db.scalar(select(Document).where(
+        Document.id == document_id,
+        Document.user_id == current_user.id,
+        Document.deleted_at.is_(None)
+    ))
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    return DocumentResponse.model_validate(document)
+
+
+@router.get("/{document_id}/versions", response_model=DocumentVersionsResponse)
+def get_document_versions(
+    document_id: int,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    List the user's other documents that are near-duplicates of this one.
+    
+    - **document_id**: ID of the document
+    
+    Versions are found with MinHash/LSH over word shingles and listed
+    most similar first, with counts of unchanged, modified, added and
+    removed pages. **duplicate_of_id** is the earlier version this
+    document was matched to when it was indexed, and **chunks_reused**
+    how many of its chunks took their vectors from it.
+    """
     document = db.query(Document).filter(
         Document.id == document_id,
-        Document.user_id == current_user.id
+        Document.user_id == current_user.id,
+        Document.deleted_at.is_(None)
     ).first()
     
     if not document:
@@ -174,23 +316,47 @@ def get_document(
             detail="Document not found"
         )
     
-    return DocumentResponse.model_validate(document)
+    versions = []
+    for other, score in find_near_duplicates(db, document):
+        pages = compare_pages(db, document.id, other.id)
+        versions.append(DocumentVersion(
+            id=other.id,
+            original_filename=other.original_filename,
+            uploaded_at=other.uploaded_at,
+            similarity=score,
+            pages_unchanged=pages["unchanged"],
+            pages_modified=pages["modified"],
+            pages_added=pages["added"],
+            pages_removed=pages["removed"]
+        ))
+    
+    return DocumentVersionsResponse(
+        document_id=document.id,
+        duplicate_of_id=document.duplicate_of_id,
+        chunks_reused=document.chunks_reused,
+        versions=versions
+    )
 
 
 @router.delete("/{document_id}", status_code=status.HTTP_200_OK)
 def delete_document(
     document_id: int,
-    current_user: User = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    Delete a document and its vector store.
+    Delete a document, its vector store and its conversations.
     
     - **document_id**: ID of the document to delete
+    
+    The document disappears immediately; its file and vector store are
+    removed in the background (retried by the periodic collector).
     """
     document = db.query(Document).filter(
         Document.id == document_id,
-        Document.user_id == current_user.id
+        Document.user_id == current_user.id,
+        Document.deleted_at.is_(None)
     ).first()
     
     if not document:
@@ -199,15 +365,8 @@ def delete_document(
             detail="Document not found"
         )
     
-    # Delete file from disk
-    if os.path.exists(document.file_path):
-        os.remove(document.file_path)
-    
-    # Delete vector store
-    rag_service.delete_vector_store(document_id)
-    
-    # Delete from database
-    db.delete(document)
-    db.commit()
+    # Tombstone now, clean up storage after the response is sent
+    tombstone_document(db, document)
+    background_tasks.add_task(collect_document, document_id)
     
-    return {"message": "Document deleted successfully"}
\ No newline at end of file
+    return {"message": "Document deleted successfully"}
@@ -1,3 +1,4 @@
+import logging
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -10,55 +11,209 @@ class Settings:
     
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")  # Derived from DATABASE_URL if empty
+    SQL_ECHO = os.getenv("SQL_ECHO", "False").lower() == "true"
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a pooled connection
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Seconds before a connection is recycled
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
     
     # JWT Settings
     SECRET_KEY = os.getenv("SECRET_KEY", "default-secret-key-change-me")
     ALGORITHM = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
+    AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", 60))  # 0 disables the cache
+    AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+    AUTH_CACHE_SYNC_SECONDS = float(os.getenv("AUTH_CACHE_SYNC_SECONDS", 1))  # How stale other workers' cached users may get; 0 = check every request
+    
+    # Password Hashing
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    BCRYPT_POOL_SIZE = int(os.getenv("BCRYPT_POOL_SIZE", 2))  # Worker processes (capped at the core count); 0 hashes inline
+    BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", 16))  # Queued hashes before failing fast
+    BCRYPT_RETRY_AFTER_SECONDS = int(os.getenv("BCRYPT_RETRY_AFTER_SECONDS", 2))
     
     # Groq API
     GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-    GROQ_MODEL = "openai/gpt-oss-120b"
+    GROQ_MODEL = os.getenv("GROQ_MODEL", "openai/gpt-oss-120b")  # Large model; every question when routing is off
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "")  # Override the API endpoint (e.g. a mock server)
+    
+    # LLM routing: short, confident lookups go to a small model, the rest to GROQ_MODEL
+    LLM_ROUTING_ENABLED = os.getenv("LLM_ROUTING_ENABLED", "True").lower() == "true"
+    LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "llama-3.1-8b-instant")
+    LLM_FAST_MAX_TOKENS = int(os.getenv("LLM_FAST_MAX_TOKENS", 400))
+    LLM_FAST_TEMPERATURE = float(os.getenv("LLM_FAST_TEMPERATURE", 0.2))
+    LLM_LARGE_MAX_TOKENS = int(os.getenv("LLM_LARGE_MAX_TOKENS", 1000))
+    LLM_LARGE_TEMPERATURE = float(os.getenv("LLM_LARGE_TEMPERATURE", 0.9))
+    LLM_FAST_MAX_QUESTION_WORDS = int(os.getenv("LLM_FAST_MAX_QUESTION_WORDS", 20))
+    LLM_FAST_MAX_PROMPT_TOKENS = int(os.getenv("LLM_FAST_MAX_PROMPT_TOKENS", 4000))  # Context plus history (a full RETRIEVAL_MAX_K context is about 3000)
+    LLM_FAST_MIN_SCORE = float(os.getenv("LLM_FAST_MIN_SCORE", 0.45))  # Best chunk similarity needed to trust the small model
+    
+    # Chat deadlines: past the budget, answer with the most relevant sentences instead
+    CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", 15))  # Default budget from the start of the handler
+    CHAT_MAX_DEADLINE_SECONDS = float(os.getenv("CHAT_MAX_DEADLINE_SECONDS", 60))  # Cap on budgets requested by clients
+    CHAT_FALLBACK_RESERVE_SECONDS = float(os.getenv("CHAT_FALLBACK_RESERVE_SECONDS", 0.5))  # Kept back from the LLM to build the fallback
+    CHAT_FALLBACK_SENTENCES = int(os.getenv("CHAT_FALLBACK_SENTENCES", 3))
+    CHAT_FALLBACK_MAX_CANDIDATES = int(os.getenv("CHAT_FALLBACK_MAX_CANDIDATES", 64))  # Sentences embedded and ranked
     
     # Application
     APP_NAME = os.getenv("APP_NAME", "AI Document Assistant")
     DEBUG = os.getenv("DEBUG", "True").lower() == "true"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
     ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:5173")
     
     # File Upload
     UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
     MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 10485760))
     ALLOWED_EXTENSIONS = [".pdf"]
+    BULK_UPLOAD_WORKERS = int(os.getenv("BULK_UPLOAD_WORKERS", 4))  # Parallel files per bulk upload
+    BULK_COMMIT_BATCH_SIZE = int(os.getenv("BULK_COMMIT_BATCH_SIZE", 25))  # Document rows per commit
+    BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", 1000))  # Files per bulk upload (after unzipping)
+    PDF_EXTRACTORS = os.getenv("PDF_EXTRACTORS", "auto")  # Engine order, e.g. "pypdfium2,pypdf2"; "auto" = fastest installed first
+    PDF_EXTRACTOR_FALLBACK = os.getenv("PDF_EXTRACTOR_FALLBACK", "True").lower() == "true"  # Retry failed/empty pages with the next engine
+    
+    # Ingestion checkpoints and recovery
+    INGESTION_CHECKPOINT_CHUNKS = int(os.getenv("INGESTION_CHECKPOINT_CHUNKS", 256))  # Chunks embedded per checkpoint
+    INGESTION_STALE_SECONDS = int(os.getenv("INGESTION_STALE_SECONDS", 120))  # Checkpoint age before a document counts as abandoned
+    INGESTION_MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", 3))  # Recovery attempts before marking failed
+    INGESTION_RECOVERY_INTERVAL_SECONDS = int(os.getenv("INGESTION_RECOVERY_INTERVAL_SECONDS", 60))  # Also runs at startup; 0 disables
+    
+    # Progressive indexing: large uploads answer questions after a first slice and finish embedding in the background
+    PROGRESSIVE_INDEXING_ENABLED = os.getenv("PROGRESSIVE_INDEXING_ENABLED", "True").lower() == "true"
+    PROGRESSIVE_MIN_PAGES = int(os.getenv("PROGRESSIVE_MIN_PAGES", 100))  # Smaller uploads are fully indexed before the upload returns
+    PROGRESSIVE_FIRST_SLICE_CHUNKS = int(os.getenv("PROGRESSIVE_FIRST_SLICE_CHUNKS", 64))  # Chunks indexed before the upload returns
+    PROGRESSIVE_BATCH_CHUNKS = int(os.getenv("PROGRESSIVE_BATCH_CHUNKS", 32))  # Chunks per background batch; queried pages move up between batches
+    PROGRESSIVE_PRIORITY_PAGES = int(os.getenv("PROGRESSIVE_PRIORITY_PAGES", 5))  # Pages with the most question words moved up per question
+    PROGRESSIVE_PAGE_WAIT_SECONDS = float(os.getenv("PROGRESSIVE_PAGE_WAIT_SECONDS", 3))  # A page-range question waits this long for its pages (at most half its deadline)
+    PROGRESSIVE_WORKERS = int(os.getenv("PROGRESSIVE_WORKERS", 2))  # Background builds per worker process; more uploads wait for a slot
+    PROGRESSIVE_UPLOAD_WAIT_SECONDS = float(os.getenv("PROGRESSIVE_UPLOAD_WAIT_SECONDS", 30))  # Most an upload waits for its first slice; then it returns still queued/embedding
+    PROGRESSIVE_PUBLISH_SECONDS = float(os.getenv("PROGRESSIVE_PUBLISH_SECONDS", 10))  # How often a build publishes a searchable copy for other workers; 0 = only the building worker answers
+    
+    # Blob Storage ("local" uses UPLOAD_DIR / CHROMA_DB_DIR; "s3" is any S3-compatible store)
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+    S3_BUCKET = os.getenv("S3_BUCKET", "")
+    S3_PREFIX = os.getenv("S3_PREFIX", "")
+    S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "")  # e.g. http://minio:9000
+    S3_REGION = os.getenv("S3_REGION", "")
+    S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY", "")
+    STORAGE_CACHE_DIR = os.getenv("STORAGE_CACHE_DIR", "storage_cache")
+    STORAGE_CACHE_MAX_BYTES = int(os.getenv("STORAGE_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+    STORAGE_CACHE_REVALIDATE_SECONDS = float(os.getenv("STORAGE_CACHE_REVALIDATE_SECONDS", 30))  # How long a cached index is served before checking for a newer one on S3
+    
+    # Admission control (per worker process; 0 disables a limit)
+    CHAT_RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_PER_MINUTE", 30))  # Per-user token refill rate
+    CHAT_BURST = int(os.getenv("CHAT_BURST", 10))
+    UPLOAD_RATE_PER_MINUTE = float(os.getenv("UPLOAD_RATE_PER_MINUTE", 10))
+    UPLOAD_BURST = int(os.getenv("UPLOAD_BURST", 5))
+    MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", 8))
+    MAX_CONCURRENT_INGESTIONS = int(os.getenv("MAX_CONCURRENT_INGESTIONS", 2))
+    MAX_CONCURRENT_BULK_UPLOADS = int(os.getenv("MAX_CONCURRENT_BULK_UPLOADS", 1))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 32))  # Waiting requests per gate
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 10))
+    ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 5))
+    
+    # CPU budgets per worker process (0 = derived from CPU_BUDGET_CORES)
+    CPU_BUDGET_CORES = int(os.getenv("CPU_BUDGET_CORES", 0))  # 0 = CPUs this process may use; divide by workers per node
+    EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))  # torch / ONNX intra-op threads; default half the cores
+    EXTRACTION_SLOTS = int(os.getenv("EXTRACTION_SLOTS", 0))  # Concurrent PDF extractions; default a quarter of the cores
+    REQUEST_THREADS = int(os.getenv("REQUEST_THREADS", 0))  # Threadpool for sync routes; default 2 per core, at least 16
     
     # Vector Database
     CHROMA_DB_DIR = os.getenv("CHROMA_DB_DIR", "chroma_db")
     EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # "torch" (fp32 sentence-transformers) or "onnx-int8"
+    EMBEDDING_STRICT_INDEX_VERSION = os.getenv("EMBEDDING_STRICT_INDEX_VERSION", "False").lower() == "true"  # Re-index when only the backend changed
+    ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+    ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", 0))  # 0 = EMBEDDING_THREADS
+    ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", 32))
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
+    # Ingestion profiles (small / standard / large): chunking, embedding backend and retrieval depth per document
+    INGESTION_PROFILE_DEFAULT = os.getenv("INGESTION_PROFILE_DEFAULT", "auto")  # For uploads that name none; "auto" picks by page count
+    INGESTION_PROFILE_SMALL_MAX_PAGES = int(os.getenv("INGESTION_PROFILE_SMALL_MAX_PAGES", 10))  # "auto": "small" up to this many pages
+    INGESTION_PROFILE_LARGE_MIN_PAGES = int(os.getenv("INGESTION_PROFILE_LARGE_MIN_PAGES", 200))  # "auto": "large" from this many pages
+    INGESTION_PROFILE_LARGE_BACKEND = os.getenv("INGESTION_PROFILE_LARGE_BACKEND", "")  # e.g. "onnx-int8"; "" = EMBEDDING_BACKEND (loaded in-process, not via the sidecar)
+    HNSW_M = int(os.getenv("HNSW_M", 16))  # Graph links per node; recorded on each index when it is built
+    HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", 100))  # Build-time candidate list
+    HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", 64))  # Query-time candidate list (never below the k searched)
+    
+    # Near-duplicate versions: MinHash/LSH signatures per document and page; a revision reuses unchanged pages' vectors
+    NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "True").lower() == "true"
+    NEAR_DUPLICATE_MIN_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_MIN_SIMILARITY", 0.5))  # Estimated Jaccard of word shingles
+    MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", 128))  # Changing it leaves older signatures unmatched
+    MINHASH_SHINGLE_WORDS = int(os.getenv("MINHASH_SHINGLE_WORDS", 5))
+    LSH_BANDS = int(os.getenv("LSH_BANDS", 32))  # More bands find less similar candidates; must divide MINHASH_PERMUTATIONS
+    
+    # Retrieval depth: up to RETRIEVAL_MAX_K chunks, cut once scores fall off
+    RETRIEVAL_MIN_K = int(os.getenv("RETRIEVAL_MIN_K", 2))  # Always kept, whatever their scores
+    RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", 12))
+    RETRIEVAL_SCORE_FLOOR = float(os.getenv("RETRIEVAL_SCORE_FLOOR", 0.2))  # Similarity below which chunks are dropped
+    RETRIEVAL_RELATIVE_DROP = float(os.getenv("RETRIEVAL_RELATIVE_DROP", 0.5))  # Drop chunks this far (fraction) below the best; 0 disables
+    
+    # Conversations
+    CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", 1500))  # Prompt budget for past turns
+    CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", 12))
+    CONVERSATION_CACHE_MAX_CONVERSATIONS = int(os.getenv("CONVERSATION_CACHE_MAX_CONVERSATIONS", 1000))  # 0 disables reuse
+    CONVERSATION_CACHE_MAX_CHUNKS = int(os.getenv("CONVERSATION_CACHE_MAX_CHUNKS", 24))  # Per conversation
+    CONVERSATION_REUSE_MIN_SCORE = float(os.getenv("CONVERSATION_REUSE_MIN_SCORE", 0.5))  # Cosine floor for reuse
+    CONVERSATION_REUSE_MIN_CHUNKS = int(os.getenv("CONVERSATION_REUSE_MIN_CHUNKS", 8))  # Relevant cached chunks needed to skip the search
+    
+    # Shared embedding sidecar (empty socket path = load the model in each worker)
+    EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")
+    EMBEDDING_SERVER_AUTOSTART = os.getenv("EMBEDDING_SERVER_AUTOSTART", "True").lower() == "true"
+    EMBEDDING_SERVER_START_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_START_TIMEOUT", 120))
+    EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", 120))
+    EMBEDDING_SERVER_RETRY_SECONDS = float(os.getenv("EMBEDDING_SERVER_RETRY_SECONDS", 30))  # How long a worker embeds in-process after the sidecar fails before trying it again
+    EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", 64))
+    EMBEDDING_SERVER_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_SERVER_BATCH_WAIT_MS", 5))
+    EMBEDDING_SERVER_THREADS = int(os.getenv("EMBEDDING_SERVER_THREADS", 0))  # 0 = EMBEDDING_THREADS
+    
+    # Maintenance: tombstone collector, orphan reconciler, compaction (0 disables a job)
+    MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "True").lower() == "true"
+    TOMBSTONE_COLLECT_INTERVAL_SECONDS = int(os.getenv("TOMBSTONE_COLLECT_INTERVAL_SECONDS", 30))
+    RECONCILE_INTERVAL_SECONDS = int(os.getenv("RECONCILE_INTERVAL_SECONDS", 3600))
+    RECONCILE_GRACE_SECONDS = int(os.getenv("RECONCILE_GRACE_SECONDS", 3600))  # Never touch younger uploads
+    COMPACTION_INTERVAL_SECONDS = int(os.getenv("COMPACTION_INTERVAL_SECONDS", 86400))
+    
+    # Slow-request profiling
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() == "true"
+    PROFILE_PATHS = os.getenv("PROFILE_PATHS", "/api/chat/,/api/documents/upload")
+    PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", 2000))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 10))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
     
     # Server
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", 8000))
+    WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "True").lower() == "true"
     
     @classmethod
     def get_cors_origins(cls):
         """Convert comma-separated origins to list"""
         return [origin.strip() for origin in cls.ALLOWED_ORIGINS.split(",")]
     
+    @classmethod
+    def get_profile_paths(cls):
+        """Convert comma-separated profiled path prefixes to list"""
+        return [path.strip() for path in cls.PROFILE_PATHS.split(",") if path.strip()]
+    
     @classmethod
     def setup_directories(cls):
         """Create necessary directories if they don't exist"""
         Path(cls.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
         Path(cls.CHROMA_DB_DIR).mkdir(parents=True, exist_ok=True)
-        print(f"✅ Created directories: {cls.UPLOAD_DIR}, {cls.CHROMA_DB_DIR}")
+        logging.getLogger(__name__).info(
+            "Created directories", extra={"upload_dir": cls.UPLOAD_DIR, "chroma_db_dir": cls.CHROMA_DB_DIR}
+        )
 
 
 # Create global settings instance
+# (directories are created by the application lifespan hook, not on import)
 settings = Settings()
 
-# Setup directories on import
-settings.setup_directories()
-
 # # Print confirmation
 # if __name__ == "__main__":
 #     print("Settings loaded successfully!")
@@ -1,18 +1,134 @@
-from sqlalchemy import create_engine
+import logging
+from typing import List
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+
+def is_sqlite_url(url: str) -> bool:
+    """Check whether a database URL points at SQLite (sync or async driver)"""
+    return url.startswith("sqlite")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection for concurrent access.
+    
+    WAL lets readers proceed while a writer commits, synchronous=NORMAL is
+    durable under WAL without an fsync per commit, and busy_timeout makes
+    writers wait for the lock instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _engine_options(url: str) -> dict:
+    """
+    Build engine keyword arguments for a database URL.
+    
+    SQLite uses SQLAlchemy's default file pool; pool sizing only applies
+    to server databases such as PostgreSQL.
+    """
+    options = {"echo": settings.SQL_ECHO}
+    
+    if is_sqlite_url(url):
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+    
+    return options
+
+
+def create_db_engine(url: str = None, sqlite_pragmas: bool = True):
+    """
+    Create a synchronous engine with the production database profile.
+    
+    Args:
+        url: Database URL (defaults to settings.DATABASE_URL)
+        sqlite_pragmas: Apply WAL/synchronous/busy_timeout pragmas on SQLite
+        
+    Returns:
+        SQLAlchemy Engine
+    """
+    url = url or settings.DATABASE_URL
+    db_engine = create_engine(url, **_engine_options(url))
+    
+    if sqlite_pragmas and is_sqlite_url(url):
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+    
+    return db_engine
+
+
+def get_async_database_url() -> str:
+    """
+    Resolve the async database URL.
+    
+    Uses ASYNC_DATABASE_URL when set, otherwise swaps the DATABASE_URL
+    driver for its asyncio counterpart (aiosqlite / asyncpg).
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    
+    url = settings.DATABASE_URL
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    return url
+
+
 # Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=settings.DEBUG  # Log SQL queries in debug mode
-)
+engine = create_db_engine(settings.DATABASE_URL)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine is created on first use so sync-only processes never need an async driver
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """
+    Get (lazily creating) the async engine used by async routes.
+    
+    Returns:
+        SQLAlchemy AsyncEngine
+    """
+    global _async_engine, _async_session_factory
+    
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        
+        url = get_async_database_url()
+        options = _engine_options(url)
+        if is_sqlite_url(url):
+            # aiosqlite runs its own thread per connection
+            options.pop("connect_args")
+        
+        _async_engine = create_async_engine(url, **options)
+        if is_sqlite_url(url):
+            event.listen(_async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        
+        _async_session_factory = async_sessionmaker(
+            _async_engine, autoflush=False, expire_on_commit=False
+        )
+    
+    return _async_engine
+
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -34,16 +150,102 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency function to get an async database session.
+    Use this in async route dependencies so queries don't block the event loop.
+    
+    Example:
+        @app.get("/items/")
+        async def read_items(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(Item))
+            return result.scalars().all()
+    """
+    get_async_engine()
+    async with _async_session_factory() as db:
+        yield db
+
+
+async def dispose_engines():
+    """
+    Close pooled connections of both engines.
+    Call this on application shutdown.
+    """
+    engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
 def init_db():
     """
     Initialize database - create all tables.
     Call this when starting the application.
     """
     # Import all models here to ensure they're registered with Base
-    from app.models import user, document
+    from app.models import user, document, conversation
     
     Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created successfully!")
+    logger.info("Database tables created")
+
+
+def add_missing_columns(bind=None) -> List[str]:
+    """
+    Add model columns that are missing from existing tables.
+    
+    A minimal forward-only migration for databases created before a
+    column was introduced: new columns are added as nullable with no
+    default (non-nullable columns without a server default are skipped
+    and logged), and any missing indexes are created.
+    
+    Args:
+        bind: Engine to migrate (defaults to the application engine)
+        
+    Returns:
+        Names of the added columns as "table.column"
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    added = []
+    
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    logger.warning(
+                        "Cannot add non-nullable column without a server default",
+                        extra={"table": table.name, "column": column.name}
+                    )
+                    continue
+                
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.quote(table.name)} "
+                    f"ADD COLUMN {preparer.quote(column.name)} {column_type}"
+                ))
+                added.append(f"{table.name}.{column.name}")
+            
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    
+    if added:
+        logger.info("Added missing columns", extra={"columns": added})
+    return added
+
+
+def upgrade_db():
+    """
+    Bring an existing database up to the current models.
+    Creates missing tables, then adds missing columns to existing ones.
+    """
+    init_db()
+    add_missing_columns()
 
 
 def drop_db():
@@ -52,7 +254,7 @@ def drop_db():
     Use with caution! Only for development/testing.
     """
     Base.metadata.drop_all(bind=engine)
-    print("⚠️ All database tables dropped!")
+    logger.warning("All database tables dropped")
 
 
 def reset_db():
@@ -62,7 +264,7 @@ def reset_db():
     """
     drop_db()
     init_db()
-    print("🔄 Database reset complete!")
+    logger.info("Database reset complete")
 
 
 if __name__ == "__main__":
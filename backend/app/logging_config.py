@@ -0,0 +1,51 @@
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+
+from app.config import settings
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Render log records as single-line JSON.
+    Fields passed with `extra={...}` become top-level keys.
+    """
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging():
+    """
+    Configure the root "app" logger from LOG_LEVEL and LOG_FORMAT.
+    Safe to call more than once.
+    """
+    logger = logging.getLogger("app")
+    logger.setLevel(settings.LOG_LEVEL)
+    logger.propagate = False
+    
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        logger.addHandler(handler)
+    
+    formatter = (
+        JsonFormatter() if settings.LOG_FORMAT == "json"
+        else logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+    for handler in logger.handlers:
+        handler.setFormatter(formatter)
@@ -1,11 +1,40 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+import time
 
 from app.config import settings
-from app.database import init_db
-from app.api.routes import auth_router, documents_router, chat_router
+from app.logging_config import setup_logging
+from app.metrics import MetricsMiddleware, ServerTimingMiddleware, AUTH_CACHE_HIT_RATIO, render_metrics
+from app.database import upgrade_db, dispose_engines
+from app.api.routes import auth_router, documents_router, chat_router, admin_router
+from app.services.admission import admission_stats
+from app.services.auth import start_password_pool, shutdown_password_pool
+from app.services.user_cache import user_cache
+from app.services.health import startup_state, FirstRequestMiddleware, check_readiness
+from app.services.llm_router import routing_stats
+from app.services.rag_service import get_rag_service
+from app.services.profiler import ProfilingMiddleware
+from app.services.maintenance import run_maintenance_loop
+from app.services.resources import apply_resource_budgets, resource_stats
+
+setup_logging()
+logger = logging.getLogger(__name__)
+AUTH_CACHE_HIT_RATIO.set_function(lambda: user_cache.stats()["hit_rate"])
+
+
+async def warmup_models():
+    """Load the embedding model and vector store in the background"""
+    try:
+        startup_state.warmup_timings = await run_in_threadpool(get_rag_service().warmup)
+    except Exception as e:
+        startup_state.warmup_error = str(e)
+        logger.exception("Warmup failed")
 
 
 @asynccontextmanager
@@ -14,19 +43,40 @@ async def lifespan(app: FastAPI):
     Lifespan events - runs on startup and shutdown
     """
     # Startup
-    print("🚀 Starting AI Document Assistant API...")
-    print(f"📦 App Name: {settings.APP_NAME}")
-    print(f"🔧 Debug Mode: {settings.DEBUG}")
+    logger.info("Starting API", extra={"app_name": settings.APP_NAME, "debug": settings.DEBUG})
     
-    # Initialize database
-    # init_db()
+    settings.setup_directories()
     
-    print("✅ Application started successfully!")
+    # Initialize database: create missing tables and add columns introduced
+    # since the database was created
+    await run_in_threadpool(upgrade_db)
+    
+    # Size torch, the request threadpool and worker pools to their CPU budgets
+    apply_resource_budgets()
+    
+    # Spawn bcrypt workers before the first login
+    start_password_pool()
+    
+    # Load heavy models without blocking liveness; /ready reports when done
+    warmup_task = asyncio.create_task(warmup_models()) if settings.WARMUP_ON_STARTUP else None
+    
+    # Ingestion recovery (first pass right away), tombstone collector,
+    # orphan reconciler and compaction
+    maintenance_task = asyncio.create_task(run_maintenance_loop()) if settings.MAINTENANCE_ENABLED else None
+    
+    startup_state.app_ready_at = time.time()
+    logger.info("Application started")
     
     yield
     
     # Shutdown
-    print("👋 Shutting down application...")
+    logger.info("Shutting down application")
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+    shutdown_password_pool()
+    await dispose_engines()
 
 
 # Create FastAPI app
@@ -46,7 +96,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(FirstRequestMiddleware)
+app.add_middleware(MetricsMiddleware)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
 
 # Root endpoint
@@ -63,23 +119,55 @@ def root():
     }
 
 
-# Health check endpoint
+# Liveness endpoint
 @app.get("/health", tags=["Health"])
-def health_check():
+async def health_check():
     """
-    Health check endpoint
+    Liveness check - the process is up and its event loop is responsive.
+    Does not touch the database or models; use /ready for that.
     """
     return {
-        "status": "healthy",
-        "database": "connected",
-        "services": "operational"
+        "status": "alive",
+        "pid": os.getpid(),
+        "startup": startup_state.report(),
+        "auth_cache": user_cache.stats(),
+        "admission": admission_stats(),
+        "resources": resource_stats(),
+        "llm_routing": routing_stats()
     }
 
 
+# Readiness endpoint
+@app.get("/ready", tags=["Health"])
+def readiness_check():
+    """
+    Readiness check - database reachable, embedding model loaded and
+    vector store opened (with WARMUP_ON_STARTUP off, the first probe
+    starts loading them). Returns 503 until every component is ready.
+    """
+    readiness = check_readiness()
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content=readiness
+    )
+
+
+# Prometheus metrics endpoint
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms, chunk/page/token
+    counters, in-flight and queue depth gauges, and process RSS.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 # Register routers
 app.include_router(auth_router, prefix="/api")
 app.include_router(documents_router, prefix="/api")
 app.include_router(chat_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
 
 
 # Global exception handler
@@ -0,0 +1,253 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Process CPU, RSS and open file metrics come from prometheus_client's default
+# process collector (process_resident_memory_bytes etc.), registered on import.
+
+_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+STAGE_DURATION = Histogram(
+    "docassist_stage_duration_seconds",
+    "Time spent in each ingestion and chat pipeline stage",
+    ["pipeline", "stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUEST_DURATION = Histogram(
+    "docassist_http_request_duration_seconds",
+    "HTTP request latency by route group",
+    ["group", "method", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "docassist_http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ["group"],
+)
+QUEUE_DEPTH = Gauge(
+    "docassist_queue_depth",
+    "Jobs waiting or running in internal work queues",
+    ["queue"],
+)
+RESOURCE_BUDGET = Gauge(
+    "docassist_cpu_budget",
+    "Threads, slots or processes budgeted to each workload class",
+    ["workload"],
+)
+RESOURCE_IN_USE = Gauge(
+    "docassist_cpu_budget_in_use",
+    "Part of each workload class's CPU budget currently in use",
+    ["workload"],
+)
+ADMISSION_REJECTED = Counter(
+    "docassist_admission_rejected_total",
+    "Requests turned away by rate limits or concurrency gates",
+    ["gate", "reason"],
+)
+MAINTENANCE_ACTIONS = Counter(
+    "docassist_maintenance_actions_total",
+    "Tombstones, purges, repairs and compactions done by background maintenance",
+    ["action"],
+)
+PDF_PAGE_FALLBACKS = Counter(
+    "docassist_pdf_page_fallbacks_total",
+    "PDF pages extracted by a fallback engine",
+    ["extractor"],
+)
+PAGES_EXTRACTED = Counter("docassist_pages_extracted_total", "PDF pages extracted")
+CHUNKS_EMBEDDED = Counter("docassist_chunks_embedded_total", "Text chunks embedded and stored")
+CHUNKS_REUSED = Counter("docassist_chunks_reused_total", "Text chunks stored with a vector copied from an earlier version")
+TIME_TO_QUERYABLE = Histogram(
+    "docassist_time_to_queryable_seconds",
+    "Seconds from the start of a progressive build until the document answers questions",
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+)
+PROFILE_DOCUMENTS = Counter("docassist_profile_documents_total", "Documents indexed per ingestion profile", ["profile"])
+PROFILE_EMBEDDING_SECONDS = Counter(
+    "docassist_profile_embedding_seconds_total",
+    "Seconds spent embedding chunks per ingestion profile",
+    ["profile"]
+)
+RETRIEVED_CHUNKS = Histogram(
+    "docassist_retrieved_chunks",
+    "Chunks selected for each chat prompt",
+    buckets=(1, 2, 3, 4, 6, 8, 10, 12, 16, 24, 32),
+)
+LLM_TOKENS = Counter("docassist_llm_tokens_total", "LLM tokens used", ["kind"])
+LLM_ROUTE_DECISIONS = Counter(
+    "docassist_llm_route_decisions_total",
+    "Chat questions sent to each LLM route, by the reason the route was chosen",
+    ["route", "reason"],
+)
+CHAT_ANSWERS = Counter(
+    "docassist_chat_answers_total",
+    "Chat answers, generated by the LLM or extractive fallbacks",
+    ["kind"],
+)
+CHAT_FALLBACKS = Counter(
+    "docassist_chat_fallbacks_total",
+    "Extractive fallback answers by cause (timeout or error)",
+    ["reason"],
+)
+PARTIAL_INDEX_ANSWERS = Counter(
+    "docassist_partial_index_answers_total",
+    "Chat answers searched on a document whose index was still being built",
+)
+LLM_ROUTE_DURATION = Histogram(
+    "docassist_llm_route_duration_seconds",
+    "LLM call latency per route",
+    ["route"],
+    buckets=_LATENCY_BUCKETS,
+)
+AUTH_CACHE_HIT_RATIO = Gauge("docassist_auth_cache_hit_ratio", "Verified-token cache hit ratio")
+
+# Stage durations of the current request, set by ServerTimingMiddleware.
+# The dict is shared (not copied) with threadpool workers, so sync routes
+# and dependencies add to it too. Keys starting with "_" are markers.
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+# Request path prefixes mapped to a bounded set of label values
+_ROUTE_GROUPS = (
+    ("/api/chat", "chat"),
+    ("/api/documents", "documents"),
+    ("/api/auth", "auth"),
+    ("/metrics", "metrics"),
+)
+
+
+def route_group(path: str) -> str:
+    """Map a request path to a low-cardinality metrics label"""
+    for prefix, group in _ROUTE_GROUPS:
+        if path.startswith(prefix):
+            return group
+    return "other"
+
+
+def observe_stage(pipeline: str, stage: str, seconds: float):
+    """Record the duration of one pipeline stage"""
+    STAGE_DURATION.labels(pipeline, stage).observe(seconds)
+
+
+@contextmanager
+def track_stage(pipeline: str, stage: str, timings: Optional[Dict[str, float]] = None):
+    """
+    Time a block as a pipeline stage.
+    
+    The duration also goes into the current request's Server-Timing
+    breakdown when one is being collected.
+    
+    Args:
+        pipeline: "ingestion" or "chat"
+        stage: Stage name (e.g. "extract", "embed", "llm_call")
+        timings: Optional dict that also receives the duration under `stage`
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.labels(pipeline, stage).observe(elapsed)
+        if timings is not None:
+            timings[stage] = elapsed
+        request_timings = _request_timings.get()
+        if request_timings is not None:
+            request_timings[stage] = request_timings.get(stage, 0.0) + elapsed
+
+
+def mark_handler_done():
+    """
+    Mark the point where a route handler returns its result.
+    Everything after it until the response starts counts as serialization.
+    """
+    request_timings = _request_timings.get()
+    if request_timings is not None:
+        request_timings["_handler_done"] = time.perf_counter()
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Render stage durations (seconds) as a Server-Timing header value (ms)"""
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.2f}"
+        for stage, seconds in timings.items()
+        if not stage.startswith("_")
+    )
+
+
+class MetricsMiddleware:
+    """ASGI middleware tracking in-flight requests and latency per route group"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        group = route_group(scope["path"])
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        in_flight = REQUESTS_IN_FLIGHT.labels(group)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            REQUEST_DURATION.labels(group, scope["method"], str(status_code)).observe(
+                time.perf_counter() - start
+            )
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware adding a Server-Timing header with per-stage durations
+    (auth, db_lookup, collection_open, embed, search, llm_call,
+    serialization, total) to chat and document responses.
+    """
+    
+    GROUPS = ("chat", "documents")
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or route_group(scope["path"]) not in self.GROUPS:
+            await self.app(scope, receive, send)
+            return
+        
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                if "_handler_done" in timings:
+                    timings["serialization"] = now - timings["_handler_done"]
+                timings["total"] = now - start
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", format_server_timing(timings).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
+
+
+def render_metrics():
+    """Serialize all metrics in the Prometheus text format"""
+    return generate_latest(), CONTENT_TYPE_LATEST
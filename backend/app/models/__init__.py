@@ -2,7 +2,8 @@
 Database Models Package
 """
 
-from app.models.user import User
-from app.models.document import Document
+from app.models.user import User, UserChange
+from app.models.document import Document, DocumentPage, DocumentBand
+from app.models.conversation import Conversation, ChatMessage
 
-__all__ = ["User", "Document"]
\ No newline at end of file
+__all__ = ["User", "UserChange", "Document", "DocumentPage", "DocumentBand", "Conversation", "ChatMessage"]
\ No newline at end of file
@@ -0,0 +1,73 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+
+class Conversation(Base):
+    """
+    Conversation model grouping a user's questions about one document
+    """
+    __tablename__ = "conversations"
+    
+    # Primary Key
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Foreign Keys
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    
+    # Display title (first question, truncated)
+    title = Column(String(200), nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Relationships (messages are only read through paginated queries)
+    document = relationship("Document")
+    
+    def __repr__(self):
+        return f"<Conversation(id={self.id}, document_id={self.document_id}, user_id={self.user_id})>"
+
+
+class ChatMessage(Base):
+    """
+    Append-only chat message store.
+    
+    Rows are never updated; the token count is computed once on insert so
+    history windows can be budgeted without re-tokenizing old messages.
+    """
+    __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Keyset pagination: WHERE conversation_id = ? AND id < ? ORDER BY id DESC
+        Index("ix_chat_messages_conversation_id_id", "conversation_id", "id"),
+    )
+    
+    # Primary Key
+    id = Column(Integer, primary_key=True)
+    
+    # Foreign Key
+    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    
+    # Content
+    role = Column(String(16), nullable=False)  # "user" or "assistant"
+    content = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=False, default=0)
+    sources = Column(Text, nullable=True)  # Comma-separated chunk ids used for an answer
+    
+    # Timestamp
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<ChatMessage(id={self.id}, conversation_id={self.conversation_id}, role='{self.role}')>"
+    
+    def to_dict(self):
+        """Convert message object to dictionary"""
+        return {
+            "id": self.id,
+            "role": self.role,
+            "content": self.content,
+            "sources": self.sources.split(",") if self.sources else [],
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
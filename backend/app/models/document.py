@@ -1,8 +1,19 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Text, ForeignKey, Float, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
+# Ingestion states, in order; any of them can move to "failed"
+STATUS_UPLOADED = "uploaded"  # File stored, no text yet
+STATUS_EXTRACTED = "extracted"
+STATUS_CHUNKED = "chunked"
+STATUS_EMBEDDING = "embedding"  # chunks_embedded of chunks_total are in the index
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+# States a dead worker can leave behind; recovery resumes them
+RESUMABLE_STATUSES = (STATUS_UPLOADED, STATUS_EXTRACTED, STATUS_CHUNKED, STATUS_EMBEDDING)
+
 
 class Document(Base):
     """
@@ -29,10 +40,30 @@ class Document(Base):
     
     # Vector DB Reference
     vector_store_id = Column(String(100), nullable=True)  # ChromaDB collection ID
+    embedding_version = Column(String(200), nullable=True)  # "<model>@<backend>" of the index; NULL = torch
+    
+    # Ingestion state (NULL on rows created before states were tracked)
+    status = Column(String(20), nullable=True, index=True)
+    status_updated_at = Column(DateTime, nullable=True)  # Last checkpoint; also the recovery lease
+    status_error = Column(String(500), nullable=True)
+    chunks_total = Column(Integer, nullable=True)
+    chunks_embedded = Column(Integer, nullable=True)  # Checkpoint: chunks durably written to the index
+    ingest_attempts = Column(Integer, nullable=True)  # Recovery attempts, to give up on poison documents
+    ingestion_profile = Column(String(20), nullable=True)  # Chunking/embedding/retrieval profile; None = "standard"
+    ingestion_params = Column(String(300), nullable=True)  # JSON of the profile as resolved for the index; NULL = from settings
+    embedding_seconds = Column(Float, nullable=True)  # Time spent embedding chunks by the last build
+    index_priority_pages = Column(String(500), nullable=True)  # Pages questions pointed at while embedding ("12,40"); embedded next
+    partial_index = Column(String(100), nullable=True)  # Latest copy of the index being built that other workers search ("doc_7.partial/640")
+    
+    # Near-duplicate versions
+    minhash = Column(LargeBinary, nullable=True)  # MinHash signature of the whole text (uint32 per permutation)
+    duplicate_of_id = Column(Integer, ForeignKey("documents.id"), nullable=True)  # Most similar earlier version
+    chunks_reused = Column(Integer, nullable=True)  # Chunks whose vectors were copied from an earlier version by the last build
     
     # Timestamps
     uploaded_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     processed_at = Column(DateTime, nullable=True)  # When text extraction completed
+    deleted_at = Column(DateTime, nullable=True, index=True)  # Tombstone; files are removed by the collector
     
     # Relationships
     owner = relationship("User", back_populates="documents")
@@ -49,6 +80,60 @@ class Document(Base):
             "original_filename": self.original_filename,
             "file_size": self.file_size,
             "page_count": self.page_count,
+            "status": self.status,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "ingestion_profile": self.ingestion_profile,
+            "embedding_seconds": self.embedding_seconds,
+            "duplicate_of_id": self.duplicate_of_id,
+            "chunks_reused": self.chunks_reused,
             "uploaded_at": self.uploaded_at.isoformat() if self.uploaded_at else None,
             "processed_at": self.processed_at.isoformat() if self.processed_at else None,
-        }
\ No newline at end of file
+        }
+
+
+class DocumentPage(Base):
+    """
+    Per-page fingerprints of a document: an exact content hash and a
+    MinHash signature, for telling unchanged, edited and new pages apart
+    between versions
+    """
+    __tablename__ = "document_pages"
+    __table_args__ = (
+        Index("ix_document_pages_document_id_page_number", "document_id", "page_number"),
+    )
+    
+    # Primary Key
+    id = Column(Integer, primary_key=True)
+    
+    # Foreign Key
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    
+    # Fingerprints
+    page_number = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=False)  # SHA-256 of the whitespace-normalized page text
+    minhash = Column(LargeBinary, nullable=False)
+    
+    def __repr__(self):
+        return f"<DocumentPage(document_id={self.document_id}, page_number={self.page_number})>"
+
+
+class DocumentBand(Base):
+    """
+    LSH index over document MinHash signatures: one row per band, keyed by
+    the hash of that band's rows. Documents sharing any bucket are
+    near-duplicate candidates.
+    """
+    __tablename__ = "document_bands"
+    
+    # Primary Key
+    id = Column(Integer, primary_key=True)
+    
+    # Foreign Key
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    
+    # Band index and rows, hashed together
+    bucket = Column(BigInteger, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<DocumentBand(document_id={self.document_id}, bucket={self.bucket})>"
\ No newline at end of file
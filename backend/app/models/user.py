@@ -42,4 +42,18 @@ class User(Base):
             "full_name": self.full_name,
             "is_active": self.is_active,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
\ No newline at end of file
+        }
+
+
+class UserChange(Base):
+    """
+    Log of changes to user rows (updates, renames, deletions).
+    
+    Every worker process reads new entries to drop its cached tokens of
+    the changed users, see user_cache.sync_user_changes()
+    """
+    __tablename__ = "user_changes"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)  # No foreign key: deletions are logged too
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
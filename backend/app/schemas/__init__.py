@@ -14,7 +14,11 @@ from app.schemas.document import (
 )
 from app.schemas.chat import (
     ChatRequest,
-    ChatResponse
+    ChatResponse,
+    ChatExplain,
+    ChatHistoryResponse,
+    ConversationResponse,
+    ConversationListResponse
 )
 
 __all__ = [
@@ -25,5 +29,9 @@ __all__ = [
     "DocumentResponse",
     "DocumentListResponse",
     "ChatRequest",
-    "ChatResponse"
+    "ChatResponse",
+    "ChatExplain",
+    "ChatHistoryResponse",
+    "ConversationResponse",
+    "ConversationListResponse"
 ]
\ No newline at end of file
@@ -1,27 +1,60 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
+from datetime import datetime
 
 
 class ChatRequest(BaseModel):
     """Schema for chat question request"""
     document_id: int = Field(..., description="ID of the document to query")
     question: str = Field(..., min_length=1, max_length=1000, description="Question about the document")
+    conversation_id: Optional[int] = Field(None, description="Conversation to continue (omit to start a new one)")
+    deadline_ms: Optional[int] = Field(None, ge=100, description="Latency budget; past it an extractive answer is returned (default: server setting)")
+    page_start: Optional[int] = Field(None, ge=1, description="Only search from this page on")
+    page_end: Optional[int] = Field(None, ge=1, description="Only search up to this page")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "document_id": 1,
-                "question": "What is the main topic of this document?"
+                "question": "What is the main topic of this document?",
+                "conversation_id": None
             }
         }
 
 
+class RetrievedChunk(BaseModel):
+    """Schema for a chunk retrieved for an answer"""
+    id: str
+    score: float = Field(..., description="Similarity to the question (higher is more similar)")
+
+
+class ChatExplain(BaseModel):
+    """Schema for the debug breakdown returned with ?explain=true"""
+    chunks: List[RetrievedChunk]
+    k: int
+    retrieval: Optional[str] = Field(None, description="fresh, extended or reused (conversation chunk cache)")
+    retrieval_cutoff: Optional[str] = Field(None, description="Why no more chunks were used: score_floor, relative_drop, max_k or exhausted")
+    model: str
+    route: Optional[str] = Field(None, description="LLM route taken: fast or large")
+    route_reason: Optional[str] = Field(None, description="Why the route was chosen, e.g. lookup, synthesis, low_confidence")
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    llm_latency_ms: float
+    stage_timings_ms: Dict[str, float]
+
+
 class ChatResponse(BaseModel):
     """Schema for chat answer response"""
     question: str
     answer: str
     document_id: int
+    conversation_id: Optional[int] = None
     sources: Optional[List[str]] = None
+    fallback: Optional[str] = Field(None, description="Set when the answer is extractive instead of generated: timeout or error")
+    partial: bool = Field(False, description="The document was still being indexed; only part of it was searched")
+    coverage: Optional[float] = Field(None, description="Fraction of the document's chunks that were searchable (1.0 once fully indexed)")
+    prioritized_pages: Optional[List[int]] = Field(None, description="Pages moved to the front of the embedding queue for this question")
+    explain: Optional[ChatExplain] = None
     
     class Config:
         json_schema_extra = {
@@ -29,26 +62,60 @@ class ChatResponse(BaseModel):
                 "question": "What is the main topic of this document?",
                 "answer": "The main topic of this document is...",
                 "document_id": 1,
-                "sources": ["Page 1: Introduction", "Page 3: Overview"]
+                "conversation_id": 7,
+                "sources": ["Page 1: Introduction", "Page 3: Overview"],
+                "partial": False,
+                "coverage": 1.0
             }
         }
 
 
+class ConversationResponse(BaseModel):
+    """Schema for a conversation summary"""
+    id: int
+    document_id: int
+    title: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class ConversationListResponse(BaseModel):
+    """Schema for a page of conversations"""
+    conversations: List[ConversationResponse]
+    next_before_id: Optional[int] = Field(None, description="Cursor for the next (older) page")
+
+
 class ChatHistoryResponse(BaseModel):
-    """Schema for chat history"""
+    """Schema for one page of a conversation's history"""
     document_id: int
+    conversation_id: int
     chat_history: List[dict]
+    next_before_id: Optional[int] = Field(None, description="Cursor for the next (older) page")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "document_id": 1,
+                "conversation_id": 7,
                 "chat_history": [
                     {
-                        "question": "What is this about?",
-                        "answer": "This document discusses...",
-                        "timestamp": "2024-01-01T12:00:00"
+                        "id": 41,
+                        "role": "user",
+                        "content": "What is this about?",
+                        "sources": [],
+                        "created_at": "2024-01-01T12:00:00"
+                    },
+                    {
+                        "id": 42,
+                        "role": "assistant",
+                        "content": "This document discusses...",
+                        "sources": ["1-3", "1-4"],
+                        "created_at": "2024-01-01T12:00:00"
                     }
-                ]
+                ],
+                "next_before_id": 41
             }
         }
\ No newline at end of file
@@ -11,6 +11,14 @@ class DocumentResponse(BaseModel):
     original_filename: str
     file_size: Optional[float] = None
     page_count: Optional[int] = None
+    status: Optional[str] = None
+    status_error: Optional[str] = None
+    chunks_total: Optional[int] = None
+    chunks_embedded: Optional[int] = None
+    duplicate_of_id: Optional[int] = None
+    chunks_reused: Optional[int] = None
+    ingestion_profile: Optional[str] = None
+    embedding_seconds: Optional[float] = None
     uploaded_at: datetime
     processed_at: Optional[datetime] = None
     
@@ -24,6 +32,13 @@ class DocumentResponse(BaseModel):
                 "original_filename": "my_document.pdf",
                 "file_size": 2.5,
                 "page_count": 10,
+                "status": "ready",
+                "chunks_total": 42,
+                "chunks_embedded": 42,
+                "duplicate_of_id": None,
+                "chunks_reused": 0,
+                "ingestion_profile": "small",
+                "embedding_seconds": 1.8,
                 "uploaded_at": "2024-01-01T12:00:00",
                 "processed_at": "2024-01-01T12:01:00"
             }
@@ -70,4 +85,92 @@ class DocumentUploadResponse(BaseModel):
                     "uploaded_at": "2024-01-01T12:00:00"
                 }
             }
+        }
+
+
+class DocumentVersion(BaseModel):
+    """A near-duplicate of a document and how its pages differ"""
+    id: int
+    original_filename: str
+    uploaded_at: datetime
+    similarity: float  # Estimated Jaccard similarity of the word shingles
+    pages_unchanged: int
+    pages_modified: int
+    pages_added: int  # Pages of the document with no counterpart in this version
+    pages_removed: int  # Pages of this version with no counterpart in the document
+
+
+class DocumentVersionsResponse(BaseModel):
+    """Schema for the near-duplicate versions of a document"""
+    document_id: int
+    duplicate_of_id: Optional[int] = None
+    chunks_reused: Optional[int] = None
+    versions: List[DocumentVersion]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "document_id": 2,
+                "duplicate_of_id": 1,
+                "chunks_reused": 118,
+                "versions": [
+                    {
+                        "id": 1,
+                        "original_filename": "contract_v1.pdf",
+                        "uploaded_at": "2024-01-01T12:00:00",
+                        "similarity": 0.93,
+                        "pages_unchanged": 18,
+                        "pages_modified": 2,
+                        "pages_added": 0,
+                        "pages_removed": 0
+                    }
+                ]
+            }
+        }
+
+
+class IngestionProfileCost(BaseModel):
+    """An ingestion profile and what indexing documents with it has cost"""
+    name: str
+    chunk_size: int
+    chunk_overlap: int
+    splitter: str
+    embedding_backend: str
+    retrieval_k: int
+    documents: int
+    pages: int
+    chunks: int
+    embedding_seconds: float
+    embedding_seconds_per_document: Optional[float] = None
+    embedding_ms_per_page: Optional[float] = None
+    chunks_per_page: Optional[float] = None
+
+
+class IngestionProfilesResponse(BaseModel):
+    """Schema for the ingestion profiles and their cost"""
+    default: str
+    profiles: List[IngestionProfileCost]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "default": "auto",
+                "profiles": [
+                    {
+                        "name": "small",
+                        "chunk_size": 500,
+                        "chunk_overlap": 100,
+                        "splitter": "sentence",
+                        "embedding_backend": "torch",
+                        "retrieval_k": 8,
+                        "documents": 12,
+                        "pages": 41,
+                        "chunks": 388,
+                        "embedding_seconds": 9.7,
+                        "embedding_seconds_per_document": 0.808,
+                        "embedding_ms_per_page": 236.59,
+                        "chunks_per_page": 9.46
+                    }
+                ]
+            }
         }
\ No newline at end of file
@@ -5,6 +5,9 @@ Services Package - Business Logic Layer
 from app.services.auth import (
     hash_password,
     verify_password,
+    hash_password_async,
+    verify_password_async,
+    password_needs_rehash,
     create_access_token,
     decode_access_token,
     # get_user_from_token
@@ -13,6 +16,9 @@ from app.services.auth import (
 __all__ = [
     "hash_password",
     "verify_password", 
+    "hash_password_async",
+    "verify_password_async",
+    "password_needs_rehash",
     "create_access_token",
     "decode_access_token",
     # "get_user_from_token"
@@ -0,0 +1,229 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from fastapi import HTTPException, status
+
+from app.config import settings
+from app.metrics import ADMISSION_REJECTED, QUEUE_DEPTH
+
+
+class TokenBucket:
+    """
+    Per-user token buckets.
+    
+    Each user gets `burst` tokens that refill at `rate_per_minute`; a
+    request costs one token. Idle buckets are pruned once the table grows.
+    """
+    
+    MAX_USERS = 10000
+    
+    def __init__(self, name: str, rate_per_minute: float, burst: int):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self._buckets: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+    
+    def take(self, user_id: int) -> float:
+        """
+        Take one token for a user.
+        
+        Args:
+            user_id: ID of the requesting user
+        
+        Returns:
+            0 if the request is allowed, otherwise seconds until a token is available
+        """
+        if self.rate <= 0:
+            return 0.0
+        
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(user_id, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            if tokens >= 1.0:
+                self._buckets[user_id] = (tokens - 1.0, now)
+                if len(self._buckets) > self.MAX_USERS:
+                    self._prune(now)
+                return 0.0
+            self._buckets[user_id] = (tokens, now)
+            return (1.0 - tokens) / self.rate
+    
+    def _prune(self, now: float):
+        """Drop buckets that have refilled completely (caller holds the lock)"""
+        for user_id, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * self.rate >= self.burst:
+                del self._buckets[user_id]
+    
+    def stats(self) -> dict:
+        """Bucket configuration and number of tracked users"""
+        with self._lock:
+            tracked = len(self._buckets)
+        return {"rate_per_minute": self.rate * 60, "burst": self.burst, "tracked_users": tracked}
+
+
+class ConcurrencyGate:
+    """
+    Global cap on in-flight work with a bounded FIFO wait queue.
+    
+    Waiting happens on the event loop, so queued requests do not hold
+    threadpool threads. A request is rejected when the queue is full or
+    it has waited longer than `queue_timeout` seconds. Limits apply per
+    worker process.
+    """
+    
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._depth = QUEUE_DEPTH.labels(name)
+    
+    async def acquire(self):
+        """
+        Wait for a slot.
+        
+        Raises:
+            HTTPException: 503 with Retry-After if the queue is full or the wait times out
+        """
+        if self.limit <= 0:
+            return
+        
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            self._update_depth()
+            return
+        
+        if len(self._waiters) >= self.max_queue:
+            _reject_busy(self.name, "queue_full")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_depth()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            _reject_busy(self.name, "queue_timeout")
+        except BaseException:
+            # Cancelled (e.g. client went away) - give back a slot handed to us
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+    
+    def release(self):
+        """Free a slot, handing it straight to the oldest waiter if there is one"""
+        if self.limit <= 0:
+            return
+        
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_depth()
+                return
+        self._active -= 1
+        self._update_depth()
+    
+    def _discard(self, waiter: asyncio.Future):
+        """Remove a waiter that gave up"""
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._update_depth()
+    
+    def _update_depth(self):
+        self._depth.set(self._active + len(self._waiters))
+    
+    def stats(self) -> dict:
+        """Current occupancy of the gate"""
+        return {
+            "limit": self.limit,
+            "in_flight": self._active,
+            "waiting": len(self._waiters),
+            "max_queue": self.max_queue,
+        }
+
+
+class GateSlot:
+    """A held ConcurrencyGate slot that a request can give back before it ends"""
+    
+    def __init__(self, gate: ConcurrencyGate):
+        self.gate = gate
+        self.held = True
+    
+    def release(self):
+        """Free the slot (once; later calls do nothing). Call on the event loop."""
+        if self.held:
+            self.held = False
+            self.gate.release()
+
+
+def _reject_busy(gate: str, reason: str):
+    """Fail with 503 and a Retry-After hint"""
+    ADMISSION_REJECTED.labels(gate, reason).inc()
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please retry shortly",
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+
+
+def check_rate_limit(bucket: TokenBucket, user_id: int):
+    """
+    Charge one request to a user's token bucket.
+    
+    Raises:
+        HTTPException: 429 with Retry-After if the user is over their rate
+    """
+    wait_seconds = bucket.take(user_id)
+    if wait_seconds > 0:
+        ADMISSION_REJECTED.labels(bucket.name, "rate_limited").inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please slow down",
+            headers={"Retry-After": str(max(1, math.ceil(wait_seconds)))},
+        )
+
+
+# Global limiters (one set per worker process)
+chat_rate_limiter = TokenBucket("chat", settings.CHAT_RATE_PER_MINUTE, settings.CHAT_BURST)
+upload_rate_limiter = TokenBucket("upload", settings.UPLOAD_RATE_PER_MINUTE, settings.UPLOAD_BURST)
+llm_gate = ConcurrencyGate(
+    "llm",
+    settings.MAX_CONCURRENT_LLM_CALLS,
+    settings.ADMISSION_MAX_QUEUE,
+    settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+ingestion_gate = ConcurrencyGate(
+    "ingestion",
+    settings.MAX_CONCURRENT_INGESTIONS,
+    settings.ADMISSION_MAX_QUEUE,
+    settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+bulk_ingestion_gate = ConcurrencyGate(
+    "bulk_ingestion",
+    settings.MAX_CONCURRENT_BULK_UPLOADS,
+    settings.ADMISSION_MAX_QUEUE,
+    settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+
+
+def admission_stats() -> dict:
+    """Limiter configuration and gate occupancy for health reporting"""
+    return {
+        "chat_rate": chat_rate_limiter.stats(),
+        "upload_rate": upload_rate_limiter.stats(),
+        "llm": llm_gate.stats(),
+        "ingestion": ingestion_gate.stats(),
+        "bulk_ingestion": bulk_ingestion_gate.stats(),
+    }
@@ -1,50 +1,248 @@
+import asyncio
 import bcrypt
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi import HTTPException, status
 
 from app.config import settings
+from app.metrics import QUEUE_DEPTH
+from app.services.resources import cpu_budget
+
+logger = logging.getLogger(__name__)
+
+# Dedicated process pool for bcrypt so hashing never competes with request threads.
+# Admission is bounded: workers plus BCRYPT_MAX_PENDING queued jobs, then fail fast.
+# The worker count is the hashing share of the CPU budget.
+_hash_workers = cpu_budget().hashing_processes
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_pool_lock = threading.Lock()
+_hash_admission = threading.BoundedSemaphore(
+    max(1, _hash_workers + settings.BCRYPT_MAX_PENDING)
+)
+_hash_queue_depth = QUEUE_DEPTH.labels("bcrypt")
+_hash_in_flight = 0
+_hash_in_flight_lock = threading.Lock()
+
+
+def _bcrypt_hash(password_bytes: bytes, rounds: int) -> bytes:
+    """Worker-side bcrypt hash (must stay module-level to be picklable)"""
+    return bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds=rounds))
+
+
+def _bcrypt_check(password_bytes: bytes, hashed_bytes: bytes) -> bool:
+    """Worker-side bcrypt verify (must stay module-level to be picklable)"""
+    return bcrypt.checkpw(password_bytes, hashed_bytes)
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    """Get (lazily creating) the bcrypt process pool"""
+    global _hash_pool
+    
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                _hash_pool = ProcessPoolExecutor(
+                    max_workers=_hash_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _hash_pool
+
+
+def _finish_bcrypt(future: Optional[Future] = None):
+    """Give back the admission slot of a finished (or never queued) hashing job"""
+    global _hash_in_flight
+    
+    with _hash_in_flight_lock:
+        _hash_in_flight -= 1
+    _hash_queue_depth.dec()
+    _hash_admission.release()
+
+
+def _submit_bcrypt(func, *args) -> Future:
+    """
+    Queue a bcrypt function in the hashing pool.
+    
+    Returns:
+        Future of its result; the admission slot is released when it completes
+    
+    Raises:
+        HTTPException: 503 with Retry-After if the hashing queue is full
+    """
+    global _hash_in_flight
+    
+    if not _hash_admission.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry shortly",
+            headers={"Retry-After": str(settings.BCRYPT_RETRY_AFTER_SECONDS)},
+        )
+    
+    _hash_queue_depth.inc()
+    with _hash_in_flight_lock:
+        _hash_in_flight += 1
+    try:
+        future = _get_hash_pool().submit(func, *args)
+    except BaseException:
+        _finish_bcrypt()
+        raise
+    future.add_done_callback(_finish_bcrypt)
+    return future
+
+
+def _run_bcrypt(func, *args):
+    """
+    Run a bcrypt function in the hashing pool, blocking the calling thread.
+    
+    Raises:
+        HTTPException: 503 with Retry-After if the hashing queue is full
+    """
+    if _hash_workers <= 0:
+        return func(*args)
+    return _submit_bcrypt(func, *args).result()
+
+
+async def _run_bcrypt_async(func, *args):
+    """
+    Run a bcrypt function in the hashing pool without blocking the event loop.
+    
+    Raises:
+        HTTPException: 503 with Retry-After if the hashing queue is full
+    """
+    if _hash_workers <= 0:
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+    return await asyncio.wrap_future(_submit_bcrypt(func, *args))
+
+
+def start_password_pool():
+    """
+    Spawn the bcrypt workers ahead of the first login.
+    Call this on application startup.
+    """
+    if _hash_workers <= 0:
+        return
+    pool = _get_hash_pool()
+    futures = [pool.submit(_bcrypt_hash, b"warmup", 4) for _ in range(_hash_workers)]
+    for future in futures:
+        future.result()
+
+
+def password_pool_stats() -> dict:
+    """Worker processes and hashes currently running or queued in them"""
+    return {"processes": _hash_workers, "in_flight": _hash_in_flight}
+
+
+def shutdown_password_pool():
+    """
+    Stop the bcrypt workers.
+    Call this on application shutdown.
+    """
+    global _hash_pool
+    
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(wait=False, cancel_futures=True)
+            _hash_pool = None
 
 
 def hash_password(password: str) -> str:
     """
     Hash a password using bcrypt.
     Truncates password to 72 bytes (bcrypt limitation).
+    Runs in the dedicated hashing pool with the configured cost factor.
     
     Args:
         password: Plain text password
-        
+    
     Returns:
         Hashed password as string
+    
+    Raises:
+        HTTPException: If the hashing pool is saturated
     """
     # Truncate password to 72 bytes if necessary (bcrypt limitation)
     password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt(rounds=12)  # 12 rounds is a good balance
-    hashed = bcrypt.hashpw(password_bytes, salt)
+    hashed = _run_bcrypt(_bcrypt_hash, password_bytes, settings.BCRYPT_ROUNDS)
     return hashed.decode('utf-8')
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a password against a bcrypt hash.
+    Runs in the dedicated hashing pool.
     
     Args:
         plain_password: Plain text password to verify
         hashed_password: Bcrypt hashed password
-        
+    
     Returns:
         True if password matches, False otherwise
+    
+    Raises:
+        HTTPException: If the hashing pool is saturated
+    """
+    password_bytes = plain_password.encode('utf-8')[:72]
+    hashed_bytes = hashed_password.encode('utf-8')
+    try:
+        return _run_bcrypt(_bcrypt_check, password_bytes, hashed_bytes)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.warning("Password verification error", extra={"error": str(e)})
+        return False
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hash a password like hash_password(), awaiting the hashing pool.
+    
+    Raises:
+        HTTPException: If the hashing pool is saturated
     """
+    password_bytes = password.encode('utf-8')[:72]
+    hashed = await _run_bcrypt_async(_bcrypt_hash, password_bytes, settings.BCRYPT_ROUNDS)
+    return hashed.decode('utf-8')
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify a password like verify_password(), awaiting the hashing pool.
+    
+    Raises:
+        HTTPException: If the hashing pool is saturated
+    """
+    password_bytes = plain_password.encode('utf-8')[:72]
+    hashed_bytes = hashed_password.encode('utf-8')
     try:
-        password_bytes = plain_password.encode('utf-8')[:72]
-        hashed_bytes = hashed_password.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hashed_bytes)
+        return await _run_bcrypt_async(_bcrypt_check, password_bytes, hashed_bytes)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Password verification error: {e}")
+        logger.warning("Password verification error", extra={"error": str(e)})
         return False
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Check whether a stored hash uses a different cost than BCRYPT_ROUNDS.
+    
+    Args:
+        hashed_password: Bcrypt hash in "$2b$<cost>$..." format
+    
+    Returns:
+        True if the hash should be upgraded
+    """
+    try:
+        cost = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return False
+    return cost != settings.BCRYPT_ROUNDS
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token.
@@ -52,7 +250,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     Args:
         data: Dictionary containing claims to encode in the token
         expires_delta: Optional custom expiration time
-        
+    
     Returns:
         Encoded JWT token as string
     """
@@ -82,10 +280,10 @@ def decode_access_token(token: str) -> dict:
     
     Args:
         token: JWT token string
-        
+    
     Returns:
         Decoded token payload
-        
+    
     Raises:
         HTTPException: If token is invalid or expired
     """
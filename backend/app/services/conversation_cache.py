@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.config import settings
+
+
+class ConversationChunkCache:
+    """
+    Bounded cache of the chunks recently retrieved in each conversation.
+    
+    Each conversation keeps up to `max_chunks` chunks (text plus a
+    unit-length embedding), most recently used last. Follow-up questions
+    score these against the new query embedding before touching the
+    vector store. The least recently used conversation is evicted when
+    the cache is full.
+    """
+    
+    def __init__(self, max_conversations: int, max_chunks: int):
+        self.max_conversations = max_conversations
+        self.max_chunks = max_chunks
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_conversations > 0 and self.max_chunks > 0
+    
+    def score(self, conversation_id: int, document_id: int, query_embedding: List[float]) -> List[Dict[str, Any]]:
+        """
+        Score a conversation's cached chunks against a query.
+        
+        Args:
+            conversation_id: Conversation to look up
+            document_id: Document the conversation is about (guards against stale entries)
+            query_embedding: Embedding of the new question
+        
+        Returns:
+            Cached chunks with id, text, embedding and cosine "score", best first
+        """
+        if not self.enabled:
+            return []
+        
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or entry[0] != document_id:
+                self.misses += 1
+                return []
+            self._entries.move_to_end(conversation_id)
+            self.hits += 1
+            chunks = list(entry[1].items())
+        
+        query = _unit(query_embedding)
+        matrix = np.stack([embedding for _, (_, embedding) in chunks])
+        scores = matrix @ query
+        
+        scored = [
+            {"id": chunk_id, "text": text, "embedding": embedding, "score": round(float(score), 4)}
+            for (chunk_id, (text, embedding)), score in zip(chunks, scores)
+        ]
+        scored.sort(key=lambda chunk: chunk["score"], reverse=True)
+        return scored
+    
+    def remember(self, conversation_id: int, document_id: int, chunks: List[Dict[str, Any]]):
+        """
+        Record the chunks used to answer a question.
+        
+        Args:
+            conversation_id: Conversation the answer belongs to
+            document_id: Document the chunks come from
+            chunks: Chunks with id, text and embedding
+        """
+        if not self.enabled or not chunks:
+            return
+        
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or entry[0] != document_id:
+                entry = (document_id, OrderedDict())
+                self._entries[conversation_id] = entry
+            self._entries.move_to_end(conversation_id)
+            
+            cached = entry[1]
+            for chunk in chunks:
+                cached.pop(chunk["id"], None)
+                cached[chunk["id"]] = (chunk["text"], _unit(chunk["embedding"]))
+            while len(cached) > self.max_chunks:
+                cached.popitem(last=False)
+            
+            while len(self._entries) > self.max_conversations:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, conversation_id: int):
+        """Drop the cached chunks of a conversation"""
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+    
+    def invalidate_document(self, document_id: int):
+        """Drop every conversation cached for a document"""
+        with self._lock:
+            for conversation_id, entry in list(self._entries.items()):
+                if entry[0] == document_id:
+                    del self._entries[conversation_id]
+    
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return cache size and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "conversations": len(self._entries),
+                "max_conversations": self.max_conversations,
+                "max_chunks": self.max_chunks,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _unit(vector) -> np.ndarray:
+    """Return a float32 copy of a vector scaled to unit length"""
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm > 0 else array
+
+
+# Global conversation chunk cache instance
+conversation_cache = ConversationChunkCache(
+    max_conversations=settings.CONVERSATION_CACHE_MAX_CONVERSATIONS,
+    max_chunks=settings.CONVERSATION_CACHE_MAX_CHUNKS,
+)
@@ -0,0 +1,213 @@
+import math
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.conversation import Conversation, ChatMessage
+from app.services.conversation_cache import conversation_cache
+
+# Rough characters-per-token ratio for English text with GPT-style tokenizers
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text"""
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def create_conversation(db: Session, user_id: int, document_id: int, title: str) -> Conversation:
+    """
+    Start a new conversation about a document.
+    
+    Args:
+        db: Database session
+        user_id: Owner of the conversation
+        document_id: Document being discussed
+        title: Display title (truncated to 200 characters)
+    
+    Returns:
+        Committed Conversation
+    """
+    conversation = Conversation(user_id=user_id, document_id=document_id, title=title[:200])
+    db.add(conversation)
+    db.commit()
+    db.refresh(conversation)
+    return conversation
+
+
+def get_conversation(db: Session, conversation_id: int, user_id: int) -> Optional[Conversation]:
+    """Fetch a conversation if it belongs to the user"""
+    return db.query(Conversation).filter(
+        Conversation.id == conversation_id,
+        Conversation.user_id == user_id
+    ).first()
+
+
+def list_conversations(
+    db: Session,
+    user_id: int,
+    document_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = 20
+) -> Dict[str, Any]:
+    """
+    Read one page of a user's conversations, newest first.
+    
+    Args:
+        db: Database session
+        user_id: Owner of the conversations
+        document_id: Only conversations about this document
+        before_id: Only conversations older than this id (cursor from the previous page)
+        limit: Maximum number of conversations
+    
+    Returns:
+        Dictionary with "conversations" and "next_before_id"
+        (None when there are no older conversations)
+    """
+    query = db.query(Conversation).filter(Conversation.user_id == user_id)
+    if document_id is not None:
+        query = query.filter(Conversation.document_id == document_id)
+    if before_id is not None:
+        query = query.filter(Conversation.id < before_id)
+    
+    rows = query.order_by(Conversation.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return {
+        "conversations": rows,
+        "next_before_id": rows[-1].id if has_more else None,
+    }
+
+
+def load_history(db: Session, conversation_id: int) -> List[Dict[str, str]]:
+    """
+    Load the most recent turns of a conversation for the prompt.
+    
+    Reads at most CHAT_HISTORY_MAX_MESSAGES newest messages and keeps as
+    many as fit in CHAT_HISTORY_MAX_TOKENS, so long sessions cost the same
+    as short ones.
+    
+    Args:
+        db: Database session
+        conversation_id: Conversation to read
+    
+    Returns:
+        Messages as {"role", "content"} dicts, oldest first
+    """
+    if settings.CHAT_HISTORY_MAX_MESSAGES <= 0 or settings.CHAT_HISTORY_MAX_TOKENS <= 0:
+        return []
+    
+    rows = db.query(ChatMessage.role, ChatMessage.content, ChatMessage.token_count).filter(
+        ChatMessage.conversation_id == conversation_id
+    ).order_by(ChatMessage.id.desc()).limit(settings.CHAT_HISTORY_MAX_MESSAGES).all()
+    
+    history = []
+    budget = settings.CHAT_HISTORY_MAX_TOKENS
+    for role, content, token_count in rows:
+        if token_count > budget:
+            break
+        budget -= token_count
+        history.append({"role": role, "content": content})
+    
+    history.reverse()
+    return history
+
+
+def append_exchange(
+    db: Session,
+    conversation: Conversation,
+    question: str,
+    answer: str,
+    chunk_ids: List[str]
+):
+    """
+    Append a question and its answer to a conversation and commit.
+    
+    Args:
+        db: Database session
+        conversation: Conversation to append to
+        question: User's question
+        answer: Assistant's answer
+        chunk_ids: Ids of the chunks the answer was grounded on
+    """
+    now = datetime.utcnow()
+    db.add_all([
+        ChatMessage(
+            conversation_id=conversation.id,
+            role="user",
+            content=question,
+            token_count=estimate_tokens(question),
+            created_at=now
+        ),
+        ChatMessage(
+            conversation_id=conversation.id,
+            role="assistant",
+            content=answer,
+            token_count=estimate_tokens(answer),
+            sources=",".join(chunk_ids) or None,
+            created_at=now
+        ),
+    ])
+    conversation.updated_at = now
+    db.commit()
+
+
+def get_messages_page(
+    db: Session,
+    conversation_id: int,
+    before_id: Optional[int] = None,
+    limit: int = 50
+) -> Dict[str, Any]:
+    """
+    Read one page of a conversation's messages, newest page first.
+    
+    Uses keyset pagination on (conversation_id, id), so every page costs
+    the same regardless of how long the conversation is.
+    
+    Args:
+        db: Database session
+        conversation_id: Conversation to read
+        before_id: Only return messages older than this id (cursor from the previous page)
+        limit: Maximum number of messages
+    
+    Returns:
+        Dictionary with "messages" (oldest first) and "next_before_id"
+        (None when there are no older messages)
+    """
+    query = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation_id)
+    if before_id is not None:
+        query = query.filter(ChatMessage.id < before_id)
+    
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    
+    return {
+        "messages": [row.to_dict() for row in rows],
+        "next_before_id": rows[0].id if has_more else None,
+    }
+
+
+def delete_conversation(db: Session, conversation: Conversation):
+    """Delete a conversation and its messages (caller commits)"""
+    db.query(ChatMessage).filter(
+        ChatMessage.conversation_id == conversation.id
+    ).delete(synchronize_session=False)
+    db.delete(conversation)
+    conversation_cache.invalidate(conversation.id)
+
+
+def delete_document_conversations(db: Session, document_id: int):
+    """Delete every conversation about a document (caller commits)"""
+    conversation_ids = db.query(Conversation.id).filter(Conversation.document_id == document_id)
+    db.query(ChatMessage).filter(
+        ChatMessage.conversation_id.in_(conversation_ids.scalar_subquery())
+    ).delete(synchronize_session=False)
+    db.query(Conversation).filter(
+        Conversation.document_id == document_id
+    ).delete(synchronize_session=False)
+    conversation_cache.invalidate_document(document_id)
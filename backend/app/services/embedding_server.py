@@ -0,0 +1,367 @@
+"""
+Shared embedding sidecar.
+
+One process loads the sentence-transformers model and serves embedding
+requests over a Unix socket to every uvicorn worker on the node, so
+model memory and torch threads no longer multiply with the worker count.
+Concurrent requests are merged into batches before hitting the model.
+
+Run it under your process manager:
+
+    python -m app.services.embedding_server
+
+or set EMBEDDING_SERVER_AUTOSTART=true and the first worker to need it
+spawns it (detached). The server holds a lock file for its whole
+lifetime, from before the model loads, so only one runs per socket.
+
+Wire format: every message is a 4-byte big-endian length followed by the
+payload. A request is a JSON object {"texts": [...]}. A reply is a JSON
+header {"count": n, "dim": d, "error": null} followed by one binary
+message holding n*d little-endian float32 values.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from array import array
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct(">I")
+
+
+# ---------------------------------------------------------------------------
+# Framing helpers
+# ---------------------------------------------------------------------------
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Embedding server closed the connection")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def _send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+def _to_float32_bytes(vectors: List[List[float]]) -> bytes:
+    values = array("f")
+    for vector in vectors:
+        values.extend(vector)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_float32_bytes(payload: bytes, count: int, dim: int) -> List[List[float]]:
+    values = array("f")
+    values.frombytes(payload)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return [values[i * dim:(i + 1) * dim].tolist() for i in range(count)]
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+class RemoteEmbeddings(Embeddings):
+    """
+    LangChain embeddings backed by the embedding sidecar.
+    
+    Keeps one connection per thread. If the sidecar becomes unreachable,
+    embeds with the in-process model from `fallback` for
+    EMBEDDING_SERVER_RETRY_SECONDS, then tries the sidecar again and drops
+    the in-process copy once it answers.
+    """
+    
+    def __init__(self, socket_path: str, fallback: Optional[Callable[[], Embeddings]] = None):
+        self.socket_path = socket_path
+        self._fallback_factory = fallback
+        self._fallback: Optional[Embeddings] = None
+        self._retry_at = 0.0  # Monotonic time to try the sidecar again while on the fallback
+        self._local = threading.local()
+        self._fallback_lock = threading.Lock()
+    
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(settings.EMBEDDING_SERVER_TIMEOUT)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+    
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            finally:
+                self._local.sock = None
+    
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        sock = self._connection()
+        _send_frame(sock, json.dumps({"texts": texts}).encode("utf-8"))
+        header = json.loads(_recv_frame(sock))
+        if header.get("error"):
+            raise RuntimeError(f"Embedding server error: {header['error']}")
+        payload = _recv_frame(sock)
+        return _from_float32_bytes(payload, header["count"], header["dim"])
+    
+    def _use_fallback(self, error: Exception) -> Embeddings:
+        if self._fallback_factory is None:
+            raise error
+        with self._fallback_lock:
+            self._retry_at = time.monotonic() + settings.EMBEDDING_SERVER_RETRY_SECONDS
+            if self._fallback is None:
+                logger.warning(
+                    "Embedding server unavailable, loading model in-process",
+                    extra={"socket": self.socket_path, "error": str(error)}
+                )
+                self._fallback = self._fallback_factory()
+            return self._fallback
+    
+    def _drop_fallback(self):
+        with self._fallback_lock:
+            if self._fallback is not None:
+                logger.info("Embedding server is back, releasing in-process model", extra={"socket": self.socket_path})
+                self._fallback = None
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        fallback = self._fallback
+        if fallback is not None and time.monotonic() < self._retry_at:
+            return fallback.embed_documents(texts)
+        
+        # One retry on a fresh connection covers sidecar restarts (none while backing off)
+        attempts = 1 if fallback is not None else 2
+        for attempt in range(attempts):
+            try:
+                vectors = self._request(list(texts))
+            except (OSError, ConnectionError) as e:
+                self._close()
+                if attempt == attempts - 1:
+                    return self._use_fallback(e).embed_documents(texts)
+                continue
+            if fallback is not None:
+                self._drop_fallback()
+            return vectors
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+    
+    def ping(self) -> bool:
+        """Check the sidecar answers (an empty request round-trip)"""
+        try:
+            self._request([])
+            return True
+        except (OSError, ConnectionError, RuntimeError):
+            self._close()
+            return False
+
+
+def _hold_server_lock(socket_path: str):
+    """
+    Take the sidecar lock for a socket.
+    
+    Returns:
+        The open lock file (the lock lasts until it is closed, or the
+        process exits), or None if a server already holds it
+    """
+    lock_file = open(f"{socket_path}.lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _spawn_server(socket_path: str):
+    """Start a detached sidecar unless one is already running or loading its model"""
+    lock_file = _hold_server_lock(socket_path)
+    if lock_file is None:
+        return  # A server holds the lock; it answers once its model is loaded
+    lock_file.close()  # The server takes it over; of several spawned at once, all but one exit
+    
+    logger.info("Starting embedding server", extra={"socket": socket_path})
+    subprocess.Popen(
+        [sys.executable, "-m", "app.services.embedding_server"],
+        start_new_session=True,
+        stdin=subprocess.DEVNULL,
+    )
+
+
+def connect_embedding_server(fallback: Callable[[], Embeddings]) -> Optional[RemoteEmbeddings]:
+    """
+    Connect to the embedding sidecar, starting it if configured.
+    
+    Args:
+        fallback: Factory for the in-process model, used if the sidecar dies later
+    
+    Returns:
+        RemoteEmbeddings, or None if the sidecar could not be reached
+    """
+    socket_path = settings.EMBEDDING_SERVER_SOCKET
+    client = RemoteEmbeddings(socket_path, fallback=fallback)
+    if client.ping():
+        return client
+    
+    if settings.EMBEDDING_SERVER_AUTOSTART:
+        _spawn_server(socket_path)
+        deadline = time.monotonic() + settings.EMBEDDING_SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if client.ping():
+                return client
+            time.sleep(0.25)
+    
+    logger.warning("Embedding server not reachable", extra={"socket": socket_path})
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Server
+# ---------------------------------------------------------------------------
+
+class EmbeddingServer:
+    """Asyncio Unix-socket server with request coalescing"""
+    
+    def __init__(self, socket_path: str, embeddings: Embeddings):
+        self.socket_path = socket_path
+        self.embeddings = embeddings
+        self.queue: "asyncio.Queue" = asyncio.Queue()
+    
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                (size,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                request = json.loads(await reader.readexactly(size))
+                texts = request.get("texts", [])
+                
+                future = loop.create_future()
+                if texts:
+                    await self.queue.put((texts, future))
+                else:
+                    future.set_result([])
+                
+                try:
+                    vectors = await future
+                    header = {"count": len(vectors), "dim": len(vectors[0]) if vectors else 0, "error": None}
+                    payload = _to_float32_bytes(vectors)
+                except Exception as e:
+                    header = {"count": 0, "dim": 0, "error": str(e)}
+                    payload = b""
+                
+                header_bytes = json.dumps(header).encode("utf-8")
+                writer.write(_LENGTH.pack(len(header_bytes)) + header_bytes)
+                writer.write(_LENGTH.pack(len(payload)) + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    
+    async def batcher(self):
+        """Merge queued requests into one model call, bounded by size and wait time"""
+        loop = asyncio.get_running_loop()
+        max_batch = settings.EMBEDDING_SERVER_MAX_BATCH
+        max_wait = settings.EMBEDDING_SERVER_BATCH_WAIT_MS / 1000
+        
+        while True:
+            batch = [await self.queue.get()]
+            total = len(batch[0][0])
+            deadline = loop.time() + max_wait
+            while total < max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                total += len(item[0])
+            
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                # The model runs on one executor thread; torch parallelizes inside it
+                vectors = await loop.run_in_executor(None, self.embeddings.embed_documents, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            offset = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+    
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            if RemoteEmbeddings(self.socket_path).ping():
+                logger.info("Embedding server already running", extra={"socket": self.socket_path})
+                return
+            os.unlink(self.socket_path)  # Stale socket from a crashed server (its lock went with it)
+        
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        batcher = asyncio.create_task(self.batcher())
+        logger.info("Embedding server listening", extra={"socket": self.socket_path})
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def main():
+    from app.logging_config import setup_logging
+    from app.services.rag_service import create_local_embeddings
+    from app.services.resources import limit_torch_threads
+    
+    setup_logging()
+    if not settings.EMBEDDING_SERVER_SOCKET:
+        raise SystemExit("EMBEDDING_SERVER_SOCKET is not set")
+    
+    # Held until exit, so workers never start a second server while this one loads
+    lock_file = _hold_server_lock(settings.EMBEDDING_SERVER_SOCKET)
+    if lock_file is None:
+        logger.info("Embedding server already running", extra={"socket": settings.EMBEDDING_SERVER_SOCKET})
+        return
+    
+    embeddings = create_local_embeddings()
+    if settings.EMBEDDING_SERVER_THREADS > 0:
+        # The sidecar embeds for every worker on the node, so it may get more than one worker's share
+        limit_torch_threads(settings.EMBEDDING_SERVER_THREADS)
+    embeddings.embed_query("warmup")
+    asyncio.run(EmbeddingServer(settings.EMBEDDING_SERVER_SOCKET, embeddings).serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+
+def _process_start_time() -> float:
+    """
+    Wall-clock time the current process started.
+    Read from /proc on Linux; falls back to the time this module was imported.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime) is in clock ticks since boot; skip past "(comm)"
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return time.time()
+
+
+class StartupState:
+    """Tracks startup milestones for liveness, readiness and cold-start reporting"""
+    
+    def __init__(self):
+        self.process_started_at = _process_start_time()
+        self.app_ready_at: Optional[float] = None
+        self.first_request_at: Optional[float] = None
+        self.warmup_timings: Dict[str, float] = {}
+        self.warmup_error: Optional[str] = None
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._warmup_lock = threading.Lock()
+    
+    def mark_first_request(self):
+        """Record the first served request (only the first call counts)"""
+        if self.first_request_at is None:
+            self.first_request_at = time.time()
+            logger.info(
+                "First request served",
+                extra={"seconds_since_process_start": round(self.first_request_at - self.process_started_at, 3)}
+            )
+    
+    def start_warmup(self, warmup: Callable[[], Dict[str, float]]) -> bool:
+        """
+        Run a warmup in a background thread, once per process.
+        
+        Returns:
+            True while it is running
+        """
+        with self._warmup_lock:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(
+                    target=self._run_warmup, args=(warmup,), name="warmup", daemon=True
+                )
+                self._warmup_thread.start()
+            return self._warmup_thread.is_alive()
+    
+    def _run_warmup(self, warmup: Callable[[], Dict[str, float]]):
+        try:
+            self.warmup_timings = warmup()
+        except Exception as e:
+            self.warmup_error = str(e)
+            logger.exception("Warmup failed")
+    
+    def report(self) -> Dict[str, Any]:
+        """Startup timings in seconds relative to process start"""
+        def since_start(moment):
+            return round(moment - self.process_started_at, 3) if moment else None
+        
+        return {
+            "uptime_seconds": round(time.time() - self.process_started_at, 1),
+            "app_ready_after_seconds": since_start(self.app_ready_at),
+            "first_request_after_seconds": since_start(self.first_request_at),
+            "warmup_seconds": self.warmup_timings,
+            "warmup_error": self.warmup_error,
+        }
+
+
+# Global startup state
+startup_state = StartupState()
+
+
+class FirstRequestMiddleware:
+    """ASGI middleware that records when the first HTTP response goes out"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or startup_state.first_request_at is not None:
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                startup_state.mark_first_request()
+            await send(message)
+        
+        await self.app(scope, receive, send_wrapper)
+
+
+def check_database() -> Dict[str, Any]:
+    """Run a trivial query against the application database"""
+    start = time.perf_counter()
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return {"ready": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+    except Exception as e:
+        return {"ready": False, "error": str(e)}
+
+
+def check_readiness() -> Dict[str, Any]:
+    """
+    Check every component a request depends on.
+    
+    Reports what is actually loaded. With WARMUP_ON_STARTUP off, the
+    first probe starts loading the embedding model and vector store in
+    the background, and the process turns ready once they are loaded.
+    
+    Returns:
+        Dictionary with overall "ready" flag and per-component details
+    """
+    from app.services.rag_service import get_rag_service
+    
+    rag_service = get_rag_service()
+    storage_writable = all(
+        Path(directory).is_dir() and os.access(directory, os.W_OK)
+        for directory in (settings.UPLOAD_DIR, settings.CHROMA_DB_DIR)
+    )
+    
+    # Without startup warmup nothing loads until it is needed; load it now
+    loading = False
+    loaded = rag_service.embeddings_loaded and rag_service.vector_store_ready
+    if not settings.WARMUP_ON_STARTUP and not loaded:
+        loading = startup_state.start_warmup(rag_service.warmup)
+    components = {
+        "database": check_database(),
+        "embedding_model": {
+            "ready": rag_service.embeddings_loaded,
+            "loading": loading and not rag_service.embeddings_loaded,
+        },
+        "vector_store": {
+            "ready": rag_service.vector_store_ready and storage_writable,
+            "loading": loading and not rag_service.vector_store_ready,
+        },
+    }
+    
+    return {
+        "ready": all(component["ready"] for component in components.values()),
+        "components": components,
+    }
@@ -0,0 +1,834 @@
+import asyncio
+import logging
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from functools import partial
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal
+from app.metrics import track_stage
+from app.models.document import (
+    Document,
+    STATUS_EXTRACTED,
+    STATUS_CHUNKED,
+    STATUS_EMBEDDING,
+    STATUS_READY,
+    STATUS_FAILED,
+    RESUMABLE_STATUSES
+)
+from app.services.ingestion_profiles import choose_profile, get_profile, indexed_profile, profile_params
+from app.services.near_duplicates import register_version
+from app.services.pdf_processor import extract_text_from_pdf, get_file_size_mb, validate_pdf
+from app.services.rag_service import get_rag_service, embedding_version
+from app.services.resources import extraction_slots
+from app.services.storage import get_storage, UPLOADS
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read when staging uploads
+_COPY_CHUNK_SIZE = 1024 * 1024
+# Most pages remembered in Document.index_priority_pages
+_MAX_PRIORITY_PAGES = 64
+
+
+class IngestionError(Exception):
+    """A file was rejected; `reason` is safe to show to the user"""
+    
+    def __init__(self, reason: str, status_code: int = 400):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+
+
+@dataclass
+class PreparedUpload:
+    """A stored, validated and extracted PDF that has no Document row yet"""
+    original_filename: str
+    unique_filename: str
+    file_size: Optional[float]
+    mime_type: str
+    text: str
+    page_count: int
+
+
+@dataclass
+class BulkSource:
+    """One file of a bulk upload; `open` returns a fresh readable stream"""
+    filename: str
+    open: Callable[[], BinaryIO]
+    size: Optional[int] = None
+
+
+def prepare_upload(filename: str, stream: BinaryIO, content_type: Optional[str] = None) -> PreparedUpload:
+    """
+    Store, validate and extract one uploaded PDF.
+    
+    Args:
+        filename: Original filename from the client
+        stream: Readable file contents
+        content_type: MIME type from the client
+    
+    Returns:
+        PreparedUpload ready to be inserted as a Document
+    
+    Raises:
+        IngestionError: If the file is rejected (the stored copy is removed)
+    """
+    if not filename.lower().endswith('.pdf'):
+        raise IngestionError("Only PDF files are allowed")
+    
+    unique_filename = f"{uuid.uuid4()}{Path(filename).suffix}"
+    storage = get_storage()
+    
+    try:
+        # Stream the upload into storage without reading it into memory
+        storage.put_stream(UPLOADS, unique_filename, stream)
+        file_path = str(storage.local_path(UPLOADS, unique_filename))
+        
+        # Validate PDF
+        with track_stage("ingestion", "validate"):
+            validation = validate_pdf(file_path)
+        if not validation["valid"]:
+            raise IngestionError(f"Invalid PDF file: {validation['error']}")
+        
+        # Check file size limit
+        file_size = get_file_size_mb(file_path)
+        if file_size and file_size > (settings.MAX_UPLOAD_SIZE / (1024 * 1024)):
+            raise IngestionError(
+                f"File size exceeds limit of {settings.MAX_UPLOAD_SIZE / (1024 * 1024)}MB"
+            )
+        
+        # Extract text from PDF (waits for an extraction slot under load)
+        with extraction_slots, track_stage("ingestion", "extract"):
+            extraction_result = extract_text_from_pdf(file_path)
+        if not extraction_result["success"]:
+            raise IngestionError(f"Failed to extract text: {extraction_result['error']}", status_code=500)
+    
+    except BaseException:
+        storage.delete(UPLOADS, unique_filename)
+        raise
+    
+    return PreparedUpload(
+        original_filename=filename,
+        unique_filename=unique_filename,
+        file_size=file_size,
+        mime_type=content_type or "application/pdf",
+        text=extraction_result["text"],
+        page_count=extraction_result["page_count"],
+    )
+
+
+def discard_upload(prepared: PreparedUpload):
+    """Remove the stored file of an upload that will not become a Document"""
+    get_storage().delete(UPLOADS, prepared.unique_filename)
+
+
+def _new_document(user_id: int, prepared: PreparedUpload, profile: Optional[str] = None) -> Document:
+    now = datetime.utcnow()
+    return Document(
+        user_id=user_id,
+        filename=prepared.unique_filename,
+        original_filename=prepared.original_filename,
+        file_path=get_storage().uri(UPLOADS, prepared.unique_filename),
+        file_size=prepared.file_size,
+        mime_type=prepared.mime_type,
+        extracted_text=prepared.text,
+        page_count=prepared.page_count,
+        processed_at=now,
+        status=STATUS_EXTRACTED,
+        status_updated_at=now,
+        ingestion_profile=choose_profile(prepared.page_count, profile).name
+    )
+
+
+def create_document(db: Session, user_id: int, prepared: PreparedUpload, profile: Optional[str] = None) -> Document:
+    """
+    Insert the Document row for a prepared upload and commit.
+    
+    Args:
+        db: Database session
+        user_id: Owner of the document
+        prepared: Result of prepare_upload()
+        profile: Ingestion profile name, "auto" or None (INGESTION_PROFILE_DEFAULT)
+    
+    Returns:
+        Committed Document
+    """
+    document = _new_document(user_id, prepared, profile)
+    with track_stage("ingestion", "db_write"):
+        db.add(document)
+        db.commit()
+        db.refresh(document)
+    return document
+
+
+class LeaseKeeper:
+    """
+    Keeps the recovery leases of documents this process is ingesting.
+    
+    Checkpoints renew a lease, but a document can go longer than
+    INGESTION_STALE_SECONDS without one (queued behind other files of a
+    bulk upload, or while its index is published). A daemon thread renews
+    every held lease a few times per stale window, so recovery in any
+    worker never takes over live work. Holds are counted, so nested
+    holders (a bulk upload and the build it runs) can overlap.
+    """
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._held: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    def hold(self, document_ids: Iterable[int]):
+        with self._lock:
+            self._held.update(document_ids)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ingestion-leases", daemon=True)
+                self._thread.start()
+    
+    def release(self, document_ids: Iterable[int]):
+        with self._lock:
+            self._held.subtract(document_ids)
+            self._held += Counter()  # Drop ids that are no longer held
+    
+    def is_held(self, document_id: int) -> bool:
+        with self._lock:
+            return self._held[document_id] > 0
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                document_ids = list(self._held)
+            if not document_ids:
+                continue
+            
+            db = SessionLocal()
+            try:
+                db.query(Document).filter(
+                    Document.id.in_(document_ids),
+                    Document.status.in_(RESUMABLE_STATUSES)
+                ).update({Document.status_updated_at: datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("Failed to renew ingestion leases", extra={"documents": len(document_ids)})
+            finally:
+                db.close()
+
+
+# Global lease keeper (one renewal thread per worker process)
+lease_keeper = LeaseKeeper(interval=max(1.0, settings.INGESTION_STALE_SECONDS / 4))
+
+
+def set_status(document_id: int, status: str, **values):
+    """
+    Record an ingestion state change in its own short transaction.
+    
+    Safe to call from worker threads. Every call also renews the
+    document's recovery lease (status_updated_at).
+    
+    Args:
+        document_id: Document to update
+        status: New state
+        **values: Other Document columns to set (e.g. chunks_embedded)
+    """
+    db = SessionLocal()
+    try:
+        db.query(Document).filter(Document.id == document_id).update(
+            {"status": status, "status_updated_at": datetime.utcnow(), **values},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def parse_pages(value: Optional[str]) -> List[int]:
+    """Page numbers stored in Document.index_priority_pages"""
+    return [int(page) for page in value.split(",") if page] if value else []
+
+
+def request_priority_pages(db: Session, document: Document, pages: Iterable[int]):
+    """
+    Ask the build of a document to embed these pages next (commits).
+    
+    The pages go to the front of the document's index_priority_pages,
+    which every worker's build reads before each batch; the oldest
+    requests drop off past _MAX_PRIORITY_PAGES.
+    """
+    merged = list(dict.fromkeys([*pages, *parse_pages(document.index_priority_pages)]))[:_MAX_PRIORITY_PAGES]
+    value = ",".join(str(page) for page in merged) or None
+    if value != document.index_priority_pages:
+        document.index_priority_pages = value
+        db.commit()
+
+
+def _priority_pages(document_id: int) -> List[int]:
+    """Read a document's requested pages in a short session (safe from worker threads)"""
+    db = SessionLocal()
+    try:
+        return parse_pages(
+            db.query(Document.index_priority_pages).filter(Document.id == document_id).scalar()
+        )
+    finally:
+        db.close()
+
+
+def _find_earlier_version(document_id: int, text: str, version: str) -> Optional[int]:
+    """
+    Fingerprint a document in its own short transaction.
+    
+    Returns:
+        Earlier near-duplicate to copy vectors from, or None (also when
+        fingerprinting fails, which never stops indexing)
+    """
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if document is None:
+            return None
+        with track_stage("ingestion", "fingerprint"):
+            source_id = register_version(db, document, text, version)
+        db.commit()
+        return source_id
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to fingerprint document", extra={"document_id": document_id})
+        return None
+    finally:
+        db.close()
+
+
+def build_index(
+    document_id: int,
+    text: str,
+    resume_from: int = 0,
+    profile: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    on_checkpoint: Optional[Callable[[int, int], None]] = None,
+    params: Optional[str] = None,
+    partial_every: Optional[float] = None
+) -> bool:
+    """
+    Build a document's vector store, checkpointing progress on its row.
+    
+    The row moves to "chunked" and then "embedding" (chunks_embedded of
+    chunks_total), or to "failed". Marking it ready is left to the caller
+    so bulk uploads can do it in batches. With NEAR_DUPLICATE_ENABLED the
+    document is fingerprinted first, and vectors of text it shares with
+    an earlier near-duplicate version are copied (chunks_reused). With
+    PROGRESSIVE_INDEXING_ENABLED, pages requested through
+    request_priority_pages() are embedded before the rest, and a copy of
+    the partial index is published for other workers every
+    PROGRESSIVE_PUBLISH_SECONDS (partial_index).
+    
+    A new build resolves the profile from the current settings and
+    records the result (ingestion_params); a resumed one keeps using the
+    recorded parameters, so its chunks match those already written.
+    
+    Args:
+        document_id: Document to index
+        text: Extracted text of the document
+        resume_from: chunks_embedded checkpoint of an interrupted build
+        profile: The document's ingestion_profile
+        batch_size: Chunks per checkpoint (default INGESTION_CHECKPOINT_CHUNKS)
+        on_checkpoint: Called with (chunks_embedded, chunks_total) after
+            each checkpoint is recorded
+        params: The document's ingestion_params (used when resuming)
+        partial_every: Seconds between published partial copies (default
+            PROGRESSIVE_PUBLISH_SECONDS; 0 publishes none)
+    
+    Returns:
+        True if the vector store was created
+    """
+    ingestion_profile = indexed_profile(profile, params) if resume_from else get_profile(profile)
+    params = profile_params(ingestion_profile)
+    version = embedding_version(ingestion_profile.embedding_backend)
+    
+    def checkpoint(done: int, total: int, reused: int, embedding_seconds: float):
+        # A build starting from nothing drops the copy an earlier build published
+        cleared = {} if done else {"partial_index": None}
+        set_status(
+            document_id,
+            STATUS_EMBEDDING if done else STATUS_CHUNKED,
+            chunks_embedded=done,
+            chunks_total=total,
+            chunks_reused=reused,
+            embedding_seconds=embedding_seconds,
+            embedding_version=version,
+            ingestion_params=params,
+            **cleared
+        )
+        if on_checkpoint is not None:
+            on_checkpoint(done, total)
+    
+    def priority() -> List[int]:
+        return _priority_pages(document_id)
+    
+    def published(name: str):
+        set_status(document_id, STATUS_EMBEDDING, partial_index=name)
+    
+    progressive = settings.PROGRESSIVE_INDEXING_ENABLED
+    if partial_every is None:
+        partial_every = settings.PROGRESSIVE_PUBLISH_SECONDS
+    
+    lease_keeper.hold([document_id])
+    try:
+        reuse_from = _find_earlier_version(document_id, text, version) if settings.NEAR_DUPLICATE_ENABLED else None
+        success = get_rag_service().create_vector_store(
+            text=text,
+            document_id=document_id,
+            resume_from=resume_from,
+            checkpoint=checkpoint,
+            reuse_from=reuse_from,
+            profile=ingestion_profile,
+            priority=priority if progressive else None,
+            batch_size=batch_size,
+            partial_every=partial_every if progressive else None,
+            on_partial=published
+        )
+    finally:
+        lease_keeper.release([document_id])
+    if not success:
+        set_status(document_id, STATUS_FAILED, status_error="Failed to index document")
+    return success
+
+
+def resume_point(document: Document) -> int:
+    """
+    Chunks an interrupted build of the document left in its index.
+    
+    Returns:
+        chunks_embedded, or 0 if the build cannot be resumed: not
+        embedding, recorded parameters missing (built before they were
+        stored) or the embedding model changed since
+    """
+    if document.status != STATUS_EMBEDDING or not document.ingestion_params:
+        return 0
+    profile = indexed_profile(document.ingestion_profile, document.ingestion_params)
+    if document.embedding_version != embedding_version(profile.embedding_backend):
+        return 0
+    return document.chunks_embedded or 0
+
+
+def index_document(db: Session, document: Document) -> bool:
+    """
+    Build the vector store for a document and record it on the row.
+    
+    The document is chunked, embedded and searched as its ingestion
+    profile says. A document interrupted while embedding resumes from its
+    last checkpoint with the parameters it was started with, as long as
+    the embedding model is unchanged; anything else is indexed from the
+    start.
+    
+    Args:
+        db: Database session
+        document: Committed Document with extracted text
+    
+    Returns:
+        True if the vector store was created
+    """
+    success = build_index(
+        document.id,
+        document.extracted_text,
+        resume_point(document),
+        document.ingestion_profile,
+        params=document.ingestion_params
+    )
+    # Pick up the checkpoint columns written by build_index first; a status
+    # still "ready" in the session would not be written back over "embedding"
+    db.refresh(document)
+    if success:
+        document.vector_store_id = f"doc_{document.id}"
+        document.status = STATUS_READY
+        document.status_updated_at = datetime.utcnow()
+        document.status_error = None
+        document.index_priority_pages = None
+        document.partial_index = None
+        db.commit()
+    return success
+
+
+def claim_document(db: Session, document_id: int, lease: Optional[datetime], count_attempt: bool = True) -> bool:
+    """
+    Take over a document by renewing its lease.
+    
+    The update only matches if nobody renewed the lease since it was read,
+    so when several workers recover (or reconcile) at once each document
+    goes to one.
+    
+    Args:
+        db: Database session
+        document_id: Document to claim
+        lease: Its status_updated_at as read with the decision to claim it
+        count_attempt: Count the claim as an ingestion attempt (recovery)
+    
+    Returns:
+        True if this worker now owns the document
+    """
+    query = db.query(Document).filter(Document.id == document_id)
+    if lease is None:
+        query = query.filter(Document.status_updated_at.is_(None))
+    else:
+        query = query.filter(Document.status_updated_at == lease)
+    values = {Document.status_updated_at: datetime.utcnow()}
+    if count_attempt:
+        values[Document.ingest_attempts] = func.coalesce(Document.ingest_attempts, 0) + 1
+    claimed = query.update(values, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def _resume(db: Session, document: Document) -> bool:
+    """Finish ingesting a claimed document from wherever it stopped"""
+    if (document.ingest_attempts or 0) > settings.INGESTION_MAX_ATTEMPTS:
+        set_status(document.id, STATUS_FAILED, status_error="Gave up after repeated interrupted ingestion")
+        return False
+    
+    if not document.extracted_text:
+        # Stored but never extracted
+        storage = get_storage()
+        if not storage.exists(UPLOADS, document.filename):
+            set_status(document.id, STATUS_FAILED, status_error="Uploaded file is missing")
+            return False
+        
+        with extraction_slots, track_stage("ingestion", "extract"):
+            extraction_result = extract_text_from_pdf(str(storage.local_path(UPLOADS, document.filename)))
+        if not extraction_result["success"]:
+            set_status(document.id, STATUS_FAILED, status_error="Failed to extract text")
+            return False
+        
+        document.extracted_text = extraction_result["text"]
+        document.page_count = extraction_result["page_count"]
+        document.processed_at = datetime.utcnow()
+        document.status = STATUS_EXTRACTED
+        document.status_updated_at = datetime.utcnow()
+        db.commit()
+    
+    return index_document(db, document)
+
+
+def recover_documents(limit: int = 20) -> Dict[str, int]:
+    """
+    Resume ingestion of documents whose worker died part-way.
+    
+    A document is picked up when it is in a resumable state and its last
+    checkpoint is older than INGESTION_STALE_SECONDS. Embedding continues
+    from the chunks_embedded checkpoint instead of starting over. A
+    document that keeps getting interrupted is marked failed after
+    INGESTION_MAX_ATTEMPTS.
+    
+    Args:
+        limit: Maximum number of documents to resume in this run
+    
+    Returns:
+        Counts of "resumed" and "failed" documents
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.INGESTION_STALE_SECONDS)
+    report = {"resumed": 0, "failed": 0}
+    
+    db = SessionLocal()
+    try:
+        candidates = db.query(Document.id, Document.status_updated_at).filter(
+            Document.deleted_at.is_(None),
+            Document.status.in_(RESUMABLE_STATUSES),
+            or_(Document.status_updated_at.is_(None), Document.status_updated_at < stale_before)
+        ).order_by(Document.id).limit(limit).all()
+        
+        for document_id, lease in candidates:
+            if lease_keeper.is_held(document_id) or not claim_document(db, document_id, lease):
+                continue
+            
+            document = db.get(Document, document_id)
+            logger.info(
+                "Resuming interrupted ingestion",
+                extra={"document_id": document_id, "status": document.status, "chunks_embedded": document.chunks_embedded}
+            )
+            lease_keeper.hold([document_id])
+            try:
+                if _resume(db, document):
+                    report["resumed"] += 1
+                else:
+                    report["failed"] += 1
+            except Exception:
+                db.rollback()
+                report["failed"] += 1
+                logger.exception("Failed to resume ingestion", extra={"document_id": document_id})
+            finally:
+                lease_keeper.release([document_id])
+                db.expunge_all()  # Don't keep extracted text of every resumed document in memory
+    finally:
+        db.close()
+    
+    if report["resumed"] or report["failed"]:
+        logger.info("Recovered interrupted ingestion", extra=report)
+    return report
+
+
+def stage_uploads(uploads: Iterable[tuple], staging_dir: str) -> List[BulkSource]:
+    """
+    Copy uploaded files into a staging directory and expand ZIP archives.
+    
+    Request files are closed once the endpoint returns, so a streamed
+    bulk response needs its own copies. Archives are read through their
+    central directory, and members are decompressed one at a time when
+    processed. They are never unpacked in full.
+    
+    Args:
+        uploads: (filename, stream) pairs
+        staging_dir: Directory owned by the bulk job
+    
+    Returns:
+        One source per PDF (or non-PDF, which is rejected when processed)
+    
+    Raises:
+        IngestionError: If an archive is unreadable or holds too many files
+    """
+    sources: List[BulkSource] = []
+    for position, (filename, stream) in enumerate(uploads):
+        staged_path = Path(staging_dir) / f"{position}{Path(filename).suffix.lower()}"
+        with open(staged_path, "wb") as f:
+            shutil.copyfileobj(stream, f, _COPY_CHUNK_SIZE)
+        
+        if filename.lower().endswith(".zip"):
+            sources.extend(_archive_sources(filename, staged_path))
+        else:
+            sources.append(BulkSource(
+                filename=filename,
+                open=lambda path=staged_path: open(path, "rb"),
+                size=staged_path.stat().st_size
+            ))
+        
+        if len(sources) > settings.BULK_MAX_FILES:
+            raise IngestionError(f"Bulk uploads are limited to {settings.BULK_MAX_FILES} files")
+    return sources
+
+
+def _archive_sources(filename: str, path: Path) -> List[BulkSource]:
+    """List the files inside a ZIP archive as bulk sources"""
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise IngestionError(f"Invalid ZIP archive: {filename}")
+    
+    sources = []
+    for info in archive.infolist():
+        name = Path(info.filename).name
+        if info.is_dir() or not name or name.startswith("."):
+            continue
+        sources.append(BulkSource(
+            filename=name,
+            open=lambda info=info: archive.open(info),
+            size=info.file_size
+        ))
+    return sources
+
+
+def _prepare_source(source: BulkSource) -> PreparedUpload:
+    """Worker: prepare one bulk source"""
+    if source.size is not None and source.size > settings.MAX_UPLOAD_SIZE:
+        raise IngestionError(
+            f"File size exceeds limit of {settings.MAX_UPLOAD_SIZE / (1024 * 1024)}MB"
+        )
+    if not source.filename.lower().endswith(".pdf"):
+        raise IngestionError("Only PDF files are allowed")
+    with source.open() as stream:
+        return prepare_upload(source.filename, stream)
+
+
+def _insert_batch(db: Session, user_id: int, batch: List[PreparedUpload], profile: Optional[str]) -> List[Tuple[int, str]]:
+    """Insert a batch of Document rows in one commit, returning their ids and ingestion profiles"""
+    documents = [_new_document(user_id, prepared, profile) for prepared in batch]
+    with track_stage("ingestion", "db_write"):
+        db.add_all(documents)
+        db.commit()
+    return [(document.id, document.ingestion_profile) for document in documents]
+
+
+def _mark_indexed(db: Session, document_ids: List[int]):
+    """Record the vector stores of a batch of documents in one commit"""
+    with track_stage("ingestion", "db_write"):
+        for document_id in document_ids:
+            db.query(Document).filter(Document.id == document_id).update(
+                {
+                    Document.vector_store_id: f"doc_{document_id}",
+                    Document.status: STATUS_READY,
+                    Document.status_updated_at: datetime.utcnow(),
+                    Document.index_priority_pages: None,
+                    Document.partial_index: None,
+                },
+                synchronize_session=False
+            )
+        db.commit()
+
+
+async def bulk_ingest(
+    user_id: int,
+    sources: List[BulkSource],
+    workers: int,
+    batch_size: int,
+    profile: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Ingest many files in parallel, yielding progress events as they happen.
+    
+    Storing, extraction and embedding run on a dedicated pool of `workers`
+    threads. Document rows are inserted and marked indexed in batches of
+    `batch_size` (or sooner when nothing else is in flight).
+    
+    Args:
+        user_id: Owner of the documents
+        sources: Files to ingest
+        workers: Parallel worker threads
+        batch_size: Rows per database commit
+        profile: Ingestion profile name for every file, "auto" or None
+            (INGESTION_PROFILE_DEFAULT)
+    
+    Yields:
+        Event dicts: "accepted", then per file "extracted" and "ready" or
+        "failed" (with a reason), then a final "summary"
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-ingest")
+    db = SessionLocal()
+    start = time.perf_counter()
+    
+    queued = iter(enumerate(sources))
+    pending: Dict[asyncio.Future, tuple] = {}
+    to_insert: List[tuple] = []
+    to_mark: List[tuple] = []
+    leased: List[int] = []  # Rows inserted by this upload and not yet ready or failed
+    ready = failed = 0
+    
+    def failure(index: int, filename: str, reason: str, document_id: Optional[int] = None) -> Dict[str, Any]:
+        nonlocal failed
+        failed += 1
+        event = {"event": "failed", "index": index, "filename": filename, "reason": reason}
+        if document_id is not None:
+            event["document_id"] = document_id
+            unlease(document_id)
+        return event
+    
+    def unlease(document_id: int):
+        leased.remove(document_id)
+        lease_keeper.release([document_id])
+    
+    def in_flight(kind: str) -> bool:
+        return any(task[0] == kind for task in pending.values())
+    
+    try:
+        yield {"event": "accepted", "total": len(sources), "workers": workers}
+        
+        while True:
+            # Keep the pool busy without opening every source at once
+            while len(pending) < workers * 2:
+                item = next(queued, None)
+                if item is None:
+                    break
+                index, source = item
+                future = loop.run_in_executor(executor, _prepare_source, source)
+                pending[future] = ("prepare", index, source.filename)
+            
+            if to_insert and (len(to_insert) >= batch_size or not in_flight("prepare")):
+                batch, to_insert = to_insert, []
+                try:
+                    inserted = await run_in_threadpool(
+                        _insert_batch, db, user_id, [prepared for _, prepared in batch], profile
+                    )
+                except Exception:
+                    logger.exception("Bulk insert failed", extra={"user_id": user_id, "files": len(batch)})
+                    db.rollback()
+                    for index, prepared in batch:
+                        discard_upload(prepared)
+                        yield failure(index, prepared.original_filename, "Failed to save document")
+                    continue
+                # Queued rows keep their lease until marked ready, so recovery leaves them alone
+                document_ids = [document_id for document_id, _ in inserted]
+                leased.extend(document_ids)
+                lease_keeper.hold(document_ids)
+                for (index, prepared), (document_id, document_profile) in zip(batch, inserted):
+                    # Nobody asks about a bulk upload before it is ready, so publish no partial copies
+                    build = partial(build_index, document_id, prepared.text, 0, document_profile, partial_every=0)
+                    future = loop.run_in_executor(executor, build)
+                    pending[future] = ("index", index, prepared.original_filename, document_id)
+                continue
+            
+            if to_mark and (len(to_mark) >= batch_size or not in_flight("index")):
+                batch, to_mark = to_mark, []
+                try:
+                    await run_in_threadpool(_mark_indexed, db, [document_id for _, _, document_id in batch])
+                except Exception:
+                    logger.exception("Bulk update failed", extra={"user_id": user_id, "files": len(batch)})
+                    db.rollback()
+                    for index, filename, document_id in batch:
+                        yield failure(index, filename, "Failed to save document", document_id)
+                    continue
+                for index, filename, document_id in batch:
+                    unlease(document_id)
+                    ready += 1
+                    yield {"event": "ready", "index": index, "filename": filename, "document_id": document_id}
+                continue
+            
+            if not pending:
+                break
+            
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                kind, index, filename, *rest = pending.pop(future)
+                try:
+                    result = future.result()
+                except IngestionError as e:
+                    yield failure(index, filename, e.reason)
+                    continue
+                except Exception as e:
+                    logger.exception("Bulk ingestion step failed", extra={"filename": filename, "step": kind})
+                    yield failure(index, filename, f"Error processing document: {str(e)}", *rest)
+                    continue
+                
+                if kind == "prepare":
+                    to_insert.append((index, result))
+                    yield {
+                        "event": "extracted",
+                        "index": index,
+                        "filename": filename,
+                        "page_count": result.page_count,
+                    }
+                elif result:
+                    to_mark.append((index, filename, rest[0]))
+                else:
+                    yield failure(index, filename, "Failed to index document", rest[0])
+        
+        yield {
+            "event": "summary",
+            "total": len(sources),
+            "ready": ready,
+            "failed": failed,
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+        }
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        lease_keeper.release(leased)  # Whatever is left over is resumed by recovery
+        db.close()
+
+
+def make_staging_dir() -> str:
+    """Create a private directory for a bulk job's staged uploads"""
+    return tempfile.mkdtemp(prefix="bulk_upload_")
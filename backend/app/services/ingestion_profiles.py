@@ -0,0 +1,196 @@
+"""
+Ingestion profiles.
+
+Chunking, embeddings and retrieval depth used to be the same for every
+document: a 3-page memo and a 900-page manual were both cut into
+CHUNK_SIZE chunks and searched for up to RETRIEVAL_MAX_K of them. A
+profile bundles these per document:
+
+- "small": short chunks split at sentence ends, for fine-grained answers
+  from documents of a few pages
+- "standard": CHUNK_SIZE / CHUNK_OVERLAP and RETRIEVAL_MAX_K, as before
+- "large": longer chunks with little overlap, so fewer chunks are
+  embedded, an optional cheaper embedding backend
+  (INGESTION_PROFILE_LARGE_BACKEND) and a deeper search
+
+An upload names its profile or gets one from its page count ("auto").
+The profile's name and its parameters as resolved when the index was
+built are stored on the Document; chat, resumed builds and the
+reconciler use those, so changing a setting never mixes two chunkings
+or embedding backends in one index.
+"""
+import json
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.document import Document
+
+SMALL = "small"
+STANDARD = "standard"
+LARGE = "large"
+AUTO = "auto"
+PROFILE_NAMES = (SMALL, STANDARD, LARGE)
+
+# Separators of the "sentence" splitter: paragraphs, lines, then sentence ends before words
+_SENTENCE_SEPARATORS = ["\n\n", "\n", ". ", "? ", "! ", "; ", " ", ""]
+
+
+@dataclass(frozen=True)
+class IngestionProfile:
+    """How a document is chunked, embedded and searched"""
+    name: str
+    chunk_size: int
+    chunk_overlap: int
+    splitter: str  # "recursive" (paragraphs, lines, words) or "sentence"
+    embedding_backend: Optional[str]  # None = EMBEDDING_BACKEND
+    retrieval_k: int  # Most chunks searched and put into a prompt
+    
+    @property
+    def chunking(self) -> str:
+        """Chunking parameters as one string, recorded on the index"""
+        return f"{self.splitter}:{self.chunk_size}:{self.chunk_overlap}"
+
+
+def get_profile(name: Optional[str] = None) -> IngestionProfile:
+    """
+    Build a profile from the current settings.
+    
+    Documents indexed before profiles existed have no name and get
+    "standard", which matches how they were built.
+    
+    Raises:
+        ValueError: If the name is not a known profile
+    """
+    name = name or STANDARD
+    if name == SMALL:
+        return IngestionProfile(SMALL, 500, 100, "sentence", None, 8)
+    if name == STANDARD:
+        return IngestionProfile(STANDARD, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, "recursive", None, settings.RETRIEVAL_MAX_K)
+    if name == LARGE:
+        # all-MiniLM-L6-v2 reads 256 tokens, about 1200 characters of English; longer chunks would be truncated
+        return IngestionProfile(
+            LARGE, 1200, 100, "recursive", settings.INGESTION_PROFILE_LARGE_BACKEND or None, settings.RETRIEVAL_MAX_K + 4
+        )
+    raise ValueError(f"Unknown ingestion profile: {name}")
+
+
+def profile_params(profile: IngestionProfile) -> str:
+    """Resolved parameters of a profile as JSON for Document.ingestion_params (backend spelled out)"""
+    return json.dumps({**asdict(profile), "embedding_backend": profile.embedding_backend or settings.EMBEDDING_BACKEND})
+
+
+def indexed_profile(name: Optional[str], params: Optional[str]) -> IngestionProfile:
+    """
+    Profile a document's index was built with.
+    
+    Args:
+        name: The document's ingestion_profile
+        params: The document's ingestion_params; documents indexed
+            before these were stored resolve `name` from the current
+            settings instead
+    """
+    if params:
+        return IngestionProfile(**json.loads(params))
+    return get_profile(name)
+
+
+def choose_profile(page_count: Optional[int], requested: Optional[str] = None) -> IngestionProfile:
+    """
+    Pick the profile for a new document.
+    
+    Args:
+        page_count: Pages of the document
+        requested: Profile named by the upload; None for INGESTION_PROFILE_DEFAULT
+    
+    Returns:
+        The named profile, or for "auto" the one matching the page count
+    
+    Raises:
+        ValueError: If the name is not a known profile or "auto"
+    """
+    name = requested or settings.INGESTION_PROFILE_DEFAULT
+    if name != AUTO:
+        return get_profile(name)
+    if (page_count or 0) <= settings.INGESTION_PROFILE_SMALL_MAX_PAGES:
+        return get_profile(SMALL)
+    if page_count >= settings.INGESTION_PROFILE_LARGE_MIN_PAGES:
+        return get_profile(LARGE)
+    return get_profile(STANDARD)
+
+
+def validate_profile_name(name: Optional[str]):
+    """
+    Check a profile name given by a client before any work is done.
+    
+    Raises:
+        ValueError: If the name is neither a profile nor "auto"
+    """
+    if name is not None and name != AUTO:
+        get_profile(name)
+
+
+def make_splitter(profile: IngestionProfile):
+    """Text splitter for a profile's chunking"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    
+    separators = _SENTENCE_SEPARATORS if profile.splitter == "sentence" else None
+    return RecursiveCharacterTextSplitter(
+        chunk_size=profile.chunk_size,
+        chunk_overlap=profile.chunk_overlap,
+        length_function=len,
+        separators=separators,
+    )
+
+
+def profile_costs(db: Session, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Indexing cost per profile.
+    
+    Args:
+        db: Database session
+        user_id: Only this user's documents (default: everyone's)
+    
+    Returns:
+        One dict per profile with its definition and, over its indexed
+        documents, "documents", "pages", "chunks", "embedding_seconds"
+        and averages per document and per page
+    """
+    query = db.query(
+        func.coalesce(Document.ingestion_profile, STANDARD),
+        func.count(Document.id),
+        func.sum(Document.page_count),
+        func.sum(Document.chunks_total),
+        func.sum(Document.embedding_seconds),
+    ).filter(
+        Document.deleted_at.is_(None),
+        Document.embedding_seconds.isnot(None)
+    )
+    if user_id is not None:
+        query = query.filter(Document.user_id == user_id)
+    totals = {row[0]: row[1:] for row in query.group_by(func.coalesce(Document.ingestion_profile, STANDARD)).all()}
+    
+    report = []
+    for name in PROFILE_NAMES:
+        profile = get_profile(name)
+        documents, pages, chunks, seconds = totals.get(name, (0, 0, 0, 0.0))
+        pages, chunks, seconds = pages or 0, chunks or 0, seconds or 0.0
+        report.append({
+            "name": profile.name,
+            "chunk_size": profile.chunk_size,
+            "chunk_overlap": profile.chunk_overlap,
+            "splitter": profile.splitter,
+            "embedding_backend": profile.embedding_backend or settings.EMBEDDING_BACKEND,
+            "retrieval_k": profile.retrieval_k,
+            "documents": documents,
+            "pages": pages,
+            "chunks": chunks,
+            "embedding_seconds": round(seconds, 3),
+            "embedding_seconds_per_document": round(seconds / documents, 3) if documents else None,
+            "embedding_ms_per_page": round(seconds * 1000 / pages, 2) if pages else None,
+            "chunks_per_page": round(chunks / pages, 2) if pages else None,
+        })
+    return report
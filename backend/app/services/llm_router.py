@@ -0,0 +1,162 @@
+"""
+LLM model routing.
+
+Every chat question used to go to the large model with the same
+generation parameters. The router picks a route per question from cheap
+signals known before the call:
+
+- question type: synthesis wording ("summarize", "compare", "why", ...)
+  always goes to the large model; fast answers are only for lookups
+  ("what is", "when", "how many", yes/no questions)
+- question length in words
+- prompt size (retrieved context plus conversation history) in tokens
+- retrieval confidence: the best chunk's similarity
+
+A short lookup with a small, confident context goes to the fast route;
+anything else goes to the large one. Each decision is counted by route
+and reason, and call latency is tracked per route (Prometheus, plus
+recent percentiles in /health), so the thresholds can be tuned.
+"""
+import logging
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.config import settings
+from app.metrics import LLM_ROUTE_DECISIONS, LLM_ROUTE_DURATION
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+LARGE = "large"
+
+_SYNTHESIS = re.compile(
+    r"\b(summari[sz]e|summary|overview|compare|comparison|contrast|differences?|explain|why|"
+    r"analy[sz]e|evaluate|assess|implications?|pros and cons|advantages|recommend|"
+    r"discuss|relationship|themes?)\b",
+    re.IGNORECASE,
+)
+_LOOKUP = re.compile(
+    r"^\s*(what|when|who|whom|whose|where|which|how (much|many|long|old|often)|"
+    r"is|are|was|were|does|do|did|can|has|have)\b",
+    re.IGNORECASE,
+)
+
+# Latencies kept per route for the percentiles in routing_stats()
+_LATENCY_WINDOW = 1000
+
+
+@dataclass(frozen=True)
+class LLMRoute:
+    """Model and generation parameters of one route"""
+    name: str
+    model: str
+    max_tokens: int
+    temperature: float
+
+
+def get_route(name: str) -> LLMRoute:
+    """Build a route from the current settings"""
+    if name == FAST:
+        return LLMRoute(FAST, settings.LLM_FAST_MODEL, settings.LLM_FAST_MAX_TOKENS, settings.LLM_FAST_TEMPERATURE)
+    return LLMRoute(LARGE, settings.GROQ_MODEL, settings.LLM_LARGE_MAX_TOKENS, settings.LLM_LARGE_TEMPERATURE)
+
+
+def question_type(question: str) -> str:
+    """Classify a question as "synthesis", "lookup" or "other" from its wording"""
+    if _SYNTHESIS.search(question):
+        return "synthesis"
+    if _LOOKUP.match(question):
+        return "lookup"
+    return "other"
+
+
+def choose_route(question: str, prompt_tokens: int, top_score: Optional[float]) -> Tuple[LLMRoute, str]:
+    """
+    Pick the route for a question.
+    
+    Args:
+        question: User's question
+        prompt_tokens: Estimated tokens of the prompt (context and history)
+        top_score: Similarity of the best retrieved chunk, None without chunks
+    
+    Returns:
+        The route and the reason it was chosen: "disabled", "synthesis",
+        "not_lookup", "long_question", "large_prompt", "low_confidence"
+        (large route) or "lookup" (fast route)
+    """
+    if not settings.LLM_ROUTING_ENABLED:
+        return get_route(LARGE), "disabled"
+    
+    kind = question_type(question)
+    if kind == "synthesis":
+        reason = "synthesis"
+    elif kind != "lookup":
+        reason = "not_lookup"
+    elif len(question.split()) > settings.LLM_FAST_MAX_QUESTION_WORDS:
+        reason = "long_question"
+    elif prompt_tokens > settings.LLM_FAST_MAX_PROMPT_TOKENS:
+        reason = "large_prompt"
+    elif top_score is None or top_score < settings.LLM_FAST_MIN_SCORE:
+        reason = "low_confidence"
+    else:
+        return get_route(FAST), "lookup"
+    return get_route(LARGE), reason
+
+
+class RouteRecorder:
+    """Counts of routing decisions and recent call latencies per route"""
+    
+    def __init__(self, window: int = _LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._decisions: Dict[str, Dict[str, int]] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._window = window
+    
+    def decision(self, route: LLMRoute, reason: str, **signals):
+        """Record the route chosen for a question and the signals behind it"""
+        LLM_ROUTE_DECISIONS.labels(route.name, reason).inc()
+        with self._lock:
+            reasons = self._decisions.setdefault(route.name, {})
+            reasons[reason] = reasons.get(reason, 0) + 1
+        logger.debug("LLM route chosen", extra={"route": route.name, "model": route.model, "reason": reason, **signals})
+    
+    def latency(self, route: LLMRoute, seconds: float):
+        """Record the duration of one LLM call on a route"""
+        LLM_ROUTE_DURATION.labels(route.name).observe(seconds)
+        with self._lock:
+            self._latencies.setdefault(route.name, deque(maxlen=self._window)).append(seconds)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Decisions by reason and recent latency percentiles (ms) per route"""
+        with self._lock:
+            report = {}
+            for name in (FAST, LARGE):
+                latencies = sorted(self._latencies.get(name, ()))
+                reasons = dict(self._decisions.get(name, {}))
+                report[name] = {
+                    "model": get_route(name).model,
+                    "decisions": sum(reasons.values()),
+                    "reasons": reasons,
+                    "p50_ms": _percentile_ms(latencies, 0.5),
+                    "p95_ms": _percentile_ms(latencies, 0.95),
+                }
+            report["enabled"] = settings.LLM_ROUTING_ENABLED
+            return report
+
+
+def _percentile_ms(ordered: list, fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+
+
+# Global recorder (one per worker process)
+route_recorder = RouteRecorder()
+
+
+def routing_stats() -> Dict[str, Any]:
+    """Routing decisions and per-route latency for health reporting"""
+    return route_recorder.stats()
@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.database import SessionLocal, engine, is_sqlite_url
+from app.metrics import MAINTENANCE_ACTIONS
+from app.models.document import Document, STATUS_CHUNKED, STATUS_EMBEDDING, STATUS_EXTRACTED, STATUS_READY
+from app.services.conversations import delete_document_conversations
+from app.services.ingestion_profiles import indexed_profile
+from app.services.near_duplicates import delete_document_signatures
+from app.services.ingestion import claim_document, index_document, lease_keeper, recover_documents
+from app.services.rag_service import get_rag_service, is_compatible_index
+from app.services.storage import get_storage, UPLOADS, INDEXES
+
+logger = logging.getLogger(__name__)
+
+_INDEX_NAME = re.compile(r"^doc_(\d+)$")
+_PARTIAL_INDEX_NAME = re.compile(r"^doc_(\d+)\.partial$")
+
+
+def tombstone_document(db: Session, document: Document):
+    """
+    Mark a document deleted and commit.
+    
+    The row disappears from every query immediately; its file, vector
+    store and conversations are removed later by the collector.
+    """
+    document.deleted_at = datetime.utcnow()
+    db.commit()
+    MAINTENANCE_ACTIONS.labels("tombstoned").inc()
+
+
+def purge_document(db: Session, document: Document):
+    """
+    Remove a document's file, vector store, conversations, fingerprints and row.
+    
+    Storage is cleaned first so a crash part-way leaves the tombstone
+    behind for the next collector run.
+    """
+    get_storage().delete(UPLOADS, document.filename)
+    get_rag_service().delete_vector_store(document.id)
+    delete_document_conversations(db, document.id)
+    delete_document_signatures(db, document.id)
+    db.delete(document)
+    db.commit()
+    MAINTENANCE_ACTIONS.labels("purged").inc()
+
+
+def collect_document(document_id: int):
+    """Purge a single tombstoned document (run right after a delete request)"""
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(
+            Document.id == document_id,
+            Document.deleted_at.isnot(None)
+        ).first()
+        if document is not None:
+            purge_document(db, document)
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to collect document", extra={"document_id": document_id})
+    finally:
+        db.close()
+
+
+def collect_tombstones(limit: int = 100) -> Dict[str, int]:
+    """
+    Purge tombstoned documents, oldest first.
+    
+    Args:
+        limit: Maximum number of documents to purge in this run
+    
+    Returns:
+        Counts of "collected" documents and "errors"
+    """
+    db = SessionLocal()
+    report = {"collected": 0, "errors": 0}
+    try:
+        tombstones = db.query(Document).filter(
+            Document.deleted_at.isnot(None)
+        ).order_by(Document.deleted_at).limit(limit).all()
+        
+        for document in tombstones:
+            try:
+                purge_document(db, document)
+                report["collected"] += 1
+            except Exception:
+                db.rollback()
+                report["errors"] += 1
+                logger.exception("Failed to collect document", extra={"document_id": document.id})
+    finally:
+        db.close()
+    
+    if report["collected"] or report["errors"]:
+        logger.info("Collected tombstones", extra=report)
+    return report
+
+
+def reconcile() -> Dict[str, int]:
+    """
+    Repair half-ingested documents and remove orphaned storage.
+    
+    - Ready documents whose index is gone or was built with a different
+      embedding model (and older rows without a vector store) are
+      re-indexed from their extracted text; ones that cannot be repaired
+      (no text or no file) are tombstoned. Documents still being
+      ingested are left to recover_documents(). Each repair first claims
+      the document's lease (as recovery does), so when every worker
+      reconciles at once a document is rebuilt by one of them.
+    - Uploaded files that no row points to are deleted.
+    - Index directories whose document row no longer exists are deleted,
+      and so are the partial copies published while building a document
+      (partial_index) once it is no longer being built.
+    
+    Anything younger than RECONCILE_GRACE_SECONDS is left alone so
+    in-flight uploads are not mistaken for orphans.
+    
+    Returns:
+        Counts of each repair action
+    """
+    storage = get_storage()
+    grace = settings.RECONCILE_GRACE_SECONDS
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.INGESTION_STALE_SECONDS)
+    report = {"reindexed": 0, "tombstoned": 0, "orphan_uploads": 0, "orphan_indexes": 0, "errors": 0}
+    
+    db = SessionLocal()
+    try:
+        # Indexed documents whose index is missing, and untracked half-ingested rows
+        candidates = db.query(
+            Document.id,
+            Document.vector_store_id,
+            Document.embedding_version,
+            Document.ingestion_profile,
+            Document.ingestion_params,
+            Document.status_updated_at
+        ).filter(
+            Document.deleted_at.is_(None),
+            Document.uploaded_at < cutoff,
+            or_(Document.status.is_(None), Document.status == STATUS_READY),
+            # A lease renewed lately means another worker has claimed it
+            or_(Document.status_updated_at.is_(None), Document.status_updated_at < stale_before)
+        ).all()
+        for document_id, vector_store_id, version, profile, params, lease in candidates:
+            if (
+                vector_store_id
+                and is_compatible_index(version, indexed_profile(profile, params).embedding_backend)
+                and storage.has_prefix(INDEXES, f"doc_{document_id}")
+            ):
+                continue
+            
+            # Another worker repairing it claimed the lease since it was read
+            if lease_keeper.is_held(document_id) or not claim_document(db, document_id, lease, count_attempt=False):
+                continue
+            
+            lease_keeper.hold([document_id])
+            try:
+                document = db.get(Document, document_id)
+                if not document.extracted_text or not storage.exists(UPLOADS, document.filename):
+                    tombstone_document(db, document)
+                    report["tombstoned"] += 1
+                    continue
+                
+                document.vector_store_id = None
+                if index_document(db, document):
+                    report["reindexed"] += 1
+                    MAINTENANCE_ACTIONS.labels("reindexed").inc()
+                else:
+                    db.commit()
+                    report["errors"] += 1
+            except Exception:
+                db.rollback()
+                report["errors"] += 1
+                logger.exception("Failed to reconcile document", extra={"document_id": document_id})
+            finally:
+                lease_keeper.release([document_id])
+                db.expunge_all()  # Don't keep extracted text of every repaired document in memory
+        
+        # Every row, tombstoned or not, still owns its storage until collected
+        known_files = {filename for (filename,) in db.query(Document.filename)}
+        known_ids = {document_id for (document_id,) in db.query(Document.id)}
+        building_ids = {
+            document_id
+            for (document_id,) in db.query(Document.id).filter(
+                Document.deleted_at.is_(None),
+                Document.status.in_((STATUS_EXTRACTED, STATUS_CHUNKED, STATUS_EMBEDDING))
+            )
+        }
+    finally:
+        db.close()
+    
+    now = time.time()
+    for key in storage.list_keys(UPLOADS):
+        if key in known_files:
+            continue
+        modified = storage.last_modified(UPLOADS, key)
+        if modified is not None and now - modified > grace:
+            storage.delete(UPLOADS, key)
+            report["orphan_uploads"] += 1
+            MAINTENANCE_ACTIONS.labels("orphan_upload_removed").inc()
+    
+    # Rows are inserted before their index is built, so an index without
+    # a row is always an orphan
+    index_names = {key.split("/", 1)[0] for key in storage.list_keys(INDEXES)}
+    for index_name in index_names:
+        match = _INDEX_NAME.match(index_name)
+        if match and int(match.group(1)) not in known_ids:
+            storage.delete_prefix(INDEXES, index_name)
+            report["orphan_indexes"] += 1
+            MAINTENANCE_ACTIONS.labels("orphan_index_removed").inc()
+        
+        # Searchable copies of a partial index outlive their build until now
+        match = _PARTIAL_INDEX_NAME.match(index_name)
+        if match and int(match.group(1)) not in building_ids:
+            storage.delete_prefix(INDEXES, index_name)
+            report["orphan_indexes"] += 1
+            MAINTENANCE_ACTIONS.labels("orphan_index_removed").inc()
+    
+    logger.info("Reconciled storage", extra=report)
+    return report
+
+
+def _sqlite_size(path: Path) -> int:
+    """Size of an SQLite database including its WAL file"""
+    return sum(
+        candidate.stat().st_size
+        for candidate in (path, path.with_name(path.name + "-wal"))
+        if candidate.exists()
+    )
+
+
+def _vacuum_sqlite_file(path: Path) -> Optional[int]:
+    """VACUUM one SQLite file, returning bytes reclaimed (None if it was busy)"""
+    before = _sqlite_size(path)
+    connection = sqlite3.connect(str(path), timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000)
+    try:
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        logger.warning("Skipped VACUUM", extra={"path": str(path), "error": str(e)})
+        return None
+    finally:
+        connection.close()
+    return before - _sqlite_size(path)
+
+
+def compact() -> Dict[str, Any]:
+    """
+    Reclaim space in the application database and local vector stores.
+    
+    SQLite databases are checkpointed and VACUUMed; PostgreSQL gets a
+    VACUUM ANALYZE. Indexes in S3 storage are immutable once published
+    (a rebuilt index replaces the old objects), so only local index
+    files are compacted.
+    
+    Returns:
+        Bytes reclaimed from the database and from indexes
+    """
+    report = {"database_bytes_reclaimed": None, "indexes_compacted": 0, "index_bytes_reclaimed": 0}
+    
+    url = settings.DATABASE_URL
+    if is_sqlite_url(url) and engine.url.database not in (None, "", ":memory:"):
+        report["database_bytes_reclaimed"] = _vacuum_sqlite_file(Path(engine.url.database))
+    elif url.startswith("postgresql"):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM ANALYZE")
+    
+    if settings.STORAGE_BACKEND == "local":
+        for index_db in Path(settings.CHROMA_DB_DIR).glob("*/chroma.sqlite3"):
+            reclaimed = _vacuum_sqlite_file(index_db)
+            if reclaimed is not None:
+                report["indexes_compacted"] += 1
+                report["index_bytes_reclaimed"] += reclaimed
+    
+    MAINTENANCE_ACTIONS.labels("compacted").inc()
+    logger.info("Compacted storage", extra=report)
+    return report
+
+
+async def run_maintenance_loop():
+    """
+    Background task running the collector, recovery, reconciler and compaction.
+    
+    Interrupted ingestion is recovered once right away, then every
+    INGESTION_RECOVERY_INTERVAL_SECONDS. The collector runs every
+    TOMBSTONE_COLLECT_INTERVAL_SECONDS; the reconciler and compaction run
+    on their own (longer) intervals. An interval of 0 disables that job.
+    Jobs run in the threadpool so the event loop stays responsive.
+    """
+    tick = min(
+        interval for interval in (
+            settings.TOMBSTONE_COLLECT_INTERVAL_SECONDS,
+            settings.INGESTION_RECOVERY_INTERVAL_SECONDS,
+            60,
+        ) if interval > 0
+    )
+    jobs = [
+        (collect_tombstones, settings.TOMBSTONE_COLLECT_INTERVAL_SECONDS),
+        (recover_documents, settings.INGESTION_RECOVERY_INTERVAL_SECONDS),
+        (reconcile, settings.RECONCILE_INTERVAL_SECONDS),
+        (compact, settings.COMPACTION_INTERVAL_SECONDS),
+    ]
+    last_run = {job: time.monotonic() for job, _ in jobs}
+    
+    # Resume documents a previous process left half-ingested
+    if settings.INGESTION_RECOVERY_INTERVAL_SECONDS > 0:
+        try:
+            await run_in_threadpool(recover_documents)
+        except Exception:
+            logger.exception("Maintenance job failed", extra={"job": recover_documents.__name__})
+    
+    while True:
+        await asyncio.sleep(tick)
+        for job, interval in jobs:
+            if interval <= 0 or time.monotonic() - last_run[job] < interval:
+                continue
+            last_run[job] = time.monotonic()
+            try:
+                await run_in_threadpool(job)
+            except Exception:
+                logger.exception("Maintenance job failed", extra={"job": job.__name__})
@@ -0,0 +1,262 @@
+"""
+Near-duplicate detection between document versions.
+
+Users often upload a revised version of a document they already have:
+the same contract with two clauses edited, a report with one page
+replaced. Every page of the revision used to be embedded again.
+
+Each document gets MinHash signatures (MINHASH_PERMUTATIONS hashes of
+its word MINHASH_SHINGLE_WORDS-shingles), one per page plus one for the
+whole text, and the whole-text signature is indexed with LSH: it is cut
+into LSH_BANDS bands and each band is stored as one bucket row. Earlier
+documents of the same user sharing a bucket are candidates; those whose
+estimated Jaccard similarity reaches NEAR_DUPLICATE_MIN_SIMILARITY are
+near-duplicates. Per-page content hashes then tell unchanged, modified,
+added and removed pages apart, and the ingestion pipeline copies the
+vectors of unchanged text from the closest indexed version instead of
+embedding it again.
+"""
+import hashlib
+import logging
+import re
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.document import Document, DocumentPage, DocumentBand, STATUS_READY
+from app.services.pdf_processor import split_pages
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+# Universal hashing modulo a Mersenne prime; a, b and x stay below 2**32 so a*x + b fits in uint64
+_PRIME = np.uint64((1 << 61) - 1)
+_MASK = np.uint64(0xFFFFFFFF)
+_SEED = 1337
+# Shingles hashed per step, bounding the (permutations x block) work matrix
+_BLOCK = 8192
+
+
+@lru_cache(maxsize=4)
+def _permutations(count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Fixed (a, b) coefficients, so signatures stay comparable across restarts"""
+    rng = np.random.default_rng(_SEED)
+    a = rng.integers(1, 1 << 32, size=count, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=count, dtype=np.uint64)
+    return a[:, None], b[:, None]
+
+
+def shingles(text: str, size: Optional[int] = None) -> np.ndarray:
+    """
+    Hash the word shingles of a text.
+    
+    Args:
+        text: Text to fingerprint (case and punctuation are ignored)
+        size: Words per shingle (default MINHASH_SHINGLE_WORDS)
+    
+    Returns:
+        Unique 32-bit shingle hashes as uint64
+    """
+    size = size or settings.MINHASH_SHINGLE_WORDS
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    spans = range(max(1, len(words) - size + 1))
+    hashes = {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in spans}
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def signature(hashes: np.ndarray, permutations: Optional[int] = None) -> np.ndarray:
+    """
+    MinHash signature of a set of shingle hashes.
+    
+    Args:
+        hashes: Shingle hashes from shingles()
+        permutations: Signature length (default MINHASH_PERMUTATIONS)
+    
+    Returns:
+        uint32 array; an empty set gives all-ones, which matches nothing real
+    """
+    a, b = _permutations(permutations or settings.MINHASH_PERMUTATIONS)
+    result = np.full(a.shape[0], 0xFFFFFFFF, dtype=np.uint64)
+    for start in range(0, len(hashes), _BLOCK):
+        block = hashes[None, start:start + _BLOCK]
+        values = ((a * block + b) % _PRIME) & _MASK
+        np.minimum(result, values.min(axis=1), out=result)
+    return result.astype(np.uint32)
+
+
+def similarity(first: bytes, second: bytes) -> float:
+    """Estimated Jaccard similarity of two stored signatures (0.0 if their lengths differ)"""
+    a = np.frombuffer(first, dtype=np.uint32)
+    b = np.frombuffer(second, dtype=np.uint32)
+    if len(a) != len(b) or not len(a):
+        return 0.0
+    return float(np.mean(a == b))
+
+
+def band_buckets(minhash: bytes) -> List[int]:
+    """LSH bucket of every band of a stored signature, as signed 64-bit integers"""
+    values = np.frombuffer(minhash, dtype=np.uint32)
+    bands = max(1, min(settings.LSH_BANDS, len(values)))
+    rows = len(values) // bands
+    return [
+        int.from_bytes(
+            hashlib.blake2b(band.to_bytes(2, "big") + values[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(),
+            "big",
+            signed=True
+        )
+        for band in range(bands)
+    ]
+
+
+def content_hash(page_text: str) -> str:
+    """SHA-256 of a page's text with whitespace normalized"""
+    return hashlib.sha256(" ".join(page_text.split()).encode("utf-8")).hexdigest()
+
+
+def register_document(db: Session, document: Document, text: str):
+    """
+    Store a document's page fingerprints, signature and LSH buckets (caller commits).
+    
+    Registering again replaces the earlier rows. The whole-text signature
+    is the element-wise minimum of the page signatures, i.e. the MinHash
+    of all page shingles together.
+    """
+    delete_document_signatures(db, document.id, keep_references=True)
+    
+    combined = np.full(settings.MINHASH_PERMUTATIONS, 0xFFFFFFFF, dtype=np.uint32)
+    for page_number, page_text in split_pages(text):
+        page_signature = signature(shingles(page_text))
+        np.minimum(combined, page_signature, out=combined)
+        db.add(DocumentPage(
+            document_id=document.id,
+            page_number=page_number,
+            content_hash=content_hash(page_text),
+            minhash=page_signature.tobytes()
+        ))
+    
+    document.minhash = combined.tobytes()
+    db.add_all(DocumentBand(document_id=document.id, bucket=bucket) for bucket in band_buckets(document.minhash))
+
+
+def find_near_duplicates(db: Session, document: Document) -> List[Tuple[Document, float]]:
+    """
+    Other documents of the same user that are near-duplicates of this one.
+    
+    Args:
+        db: Database session
+        document: Document registered with register_document()
+    
+    Returns:
+        (document, estimated similarity) pairs, most similar first
+    """
+    if not document.minhash:
+        return []
+    
+    candidate_ids = db.query(DocumentBand.document_id).filter(
+        DocumentBand.bucket.in_(band_buckets(document.minhash)),
+        DocumentBand.document_id != document.id
+    ).distinct()
+    candidates = db.query(Document).filter(
+        Document.id.in_(candidate_ids.scalar_subquery()),
+        Document.user_id == document.user_id,
+        Document.deleted_at.is_(None)
+    ).all()
+    
+    matches = []
+    for candidate in candidates:
+        score = similarity(document.minhash, candidate.minhash or b"")
+        if score >= settings.NEAR_DUPLICATE_MIN_SIMILARITY:
+            matches.append((candidate, round(score, 3)))
+    matches.sort(key=lambda match: (-match[1], -match[0].id))
+    return matches
+
+
+def compare_pages(db: Session, document_id: int, other_id: int) -> Dict[str, int]:
+    """
+    Count how the pages of a document differ from another version.
+    
+    Pages with identical text are "unchanged". Each remaining page is
+    paired with the most similar unpaired page of the other version:
+    "modified" if they reach NEAR_DUPLICATE_MIN_SIMILARITY, otherwise
+    "added". Pages of the other version left unpaired were "removed".
+    """
+    pages = db.query(DocumentPage).filter(DocumentPage.document_id == document_id).all()
+    others = db.query(DocumentPage).filter(DocumentPage.document_id == other_id).all()
+    
+    unmatched: Dict[str, List[DocumentPage]] = {}
+    for other in others:
+        unmatched.setdefault(other.content_hash, []).append(other)
+    
+    counts = {"unchanged": 0, "modified": 0, "added": 0, "removed": 0}
+    changed = []
+    for page in pages:
+        if unmatched.get(page.content_hash):
+            unmatched[page.content_hash].pop()
+            counts["unchanged"] += 1
+        else:
+            changed.append(page)
+    
+    remaining = [other for group in unmatched.values() for other in group]
+    for page in changed:
+        scores = [similarity(page.minhash, other.minhash) for other in remaining]
+        best = int(np.argmax(scores)) if scores else -1
+        if best >= 0 and scores[best] >= settings.NEAR_DUPLICATE_MIN_SIMILARITY:
+            remaining.pop(best)
+            counts["modified"] += 1
+        else:
+            counts["added"] += 1
+    counts["removed"] = len(remaining)
+    return counts
+
+
+def register_version(db: Session, document: Document, text: str, index_version: str) -> Optional[int]:
+    """
+    Fingerprint a document and link it to the earlier version it revises (caller commits).
+    
+    Sets `duplicate_of_id` to the most similar earlier near-duplicate.
+    
+    Args:
+        db: Database session
+        document: Document being indexed
+        text: Its extracted text
+        index_version: Embedding version of the index being built
+    
+    Returns:
+        Id of the most similar earlier version whose ready index was built
+        with the same embeddings (its vectors can be copied), or None
+    """
+    register_document(db, document, text)
+    db.flush()
+    
+    earlier = [(other, score) for other, score in find_near_duplicates(db, document) if other.id < document.id]
+    document.duplicate_of_id = earlier[0][0].id if earlier else None
+    for other, score in earlier:
+        if other.status == STATUS_READY and other.vector_store_id and other.embedding_version == index_version:
+            logger.info(
+                "Near-duplicate version found",
+                extra={"document_id": document.id, "source_id": other.id, "similarity": score}
+            )
+            return other.id
+    return None
+
+
+def delete_document_signatures(db: Session, document_id: int, keep_references: bool = False):
+    """
+    Delete a document's fingerprints (caller commits).
+    
+    Unless `keep_references` is set, later versions that point at the
+    document through `duplicate_of_id` are unlinked as well.
+    """
+    db.query(DocumentPage).filter(DocumentPage.document_id == document_id).delete(synchronize_session=False)
+    db.query(DocumentBand).filter(DocumentBand.document_id == document_id).delete(synchronize_session=False)
+    if not keep_references:
+        db.query(Document).filter(Document.duplicate_of_id == document_id).update(
+            {"duplicate_of_id": None},
+            synchronize_session=False
+        )
@@ -0,0 +1,252 @@
+"""
+ONNX Runtime embedding backend.
+
+Runs the configured sentence-transformers model as a dynamically
+int8-quantized ONNX graph, so CPU-only nodes skip PyTorch entirely at
+serving time: weights are about 4x smaller and the matmuls run on int8
+kernels. The pipeline mirrors sentence-transformers for MiniLM-style
+models (tokenize, transformer, mean pooling over the attention mask,
+L2 normalization), so vectors land in the same space as the torch
+backend's; benchmarks.embedding_backends measures how closely they agree.
+
+The quantized model is prepared once per model under ONNX_MODEL_DIR,
+on first use or ahead of time:
+
+    python -m app.services.onnx_embeddings
+
+Preparation uses the ONNX export published in the model repository when
+there is one, and otherwise exports the model with torch/transformers
+(needed only on the machine that prepares it). Quantization needs the
+`onnx` package; serving only needs `onnxruntime` and `tokenizers`.
+"""
+import json
+import logging
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+from app.services.resources import embedding_threads
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_MODEL = "model_int8.onnx"
+TOKENIZER = "tokenizer.json"
+EMBEDDING_CONFIG = "embedding_config.json"
+
+# Files fetched from the model repository (ONNX exports live under onnx/ when published)
+_HUB_PATTERNS = [
+    "onnx/model.onnx",
+    "model.onnx",
+    "tokenizer.json",
+    "config.json",
+    "modules.json",
+    "sentence_bert_config.json",
+    "1_Pooling/config.json",
+]
+
+
+def model_dir(model_name: str) -> Path:
+    """Directory holding the prepared ONNX model for `model_name`"""
+    return Path(settings.ONNX_MODEL_DIR) / model_name.replace("/", "__")
+
+
+def _read_json(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _sentence_transformers_config(source: Path) -> Dict[str, Any]:
+    """
+    Read the pooling and normalization steps of a sentence-transformers model.
+    
+    Raises:
+        ValueError: If the model uses pooling this backend does not implement
+    """
+    pooling = _read_json(source / "1_Pooling" / "config.json")
+    if pooling and not pooling.get("pooling_mode_mean_tokens", False):
+        raise ValueError("Only mean-pooling sentence-transformers models are supported")
+    
+    modules = _read_json(source / "modules.json") or []
+    normalize = any(module.get("type", "").endswith("Normalize") for module in modules)
+    max_seq_length = _read_json(source / "sentence_bert_config.json").get("max_seq_length", 256)
+    return {"max_seq_length": max_seq_length, "normalize": normalize or not modules}
+
+
+def _export_with_torch(source: str, output: Path):
+    """Export a transformers model to ONNX (preparation-time only dependency)"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModel.from_pretrained(source)
+    model.eval()
+    
+    sample = tokenizer(["export sample text"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(output),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(str(output.parent))
+
+
+def prepare_onnx_model(model_name: Optional[str] = None, output_dir: Optional[Path] = None) -> Path:
+    """
+    Export and int8-quantize a sentence-transformers model, once.
+    
+    Args:
+        model_name: Hub model id or local model directory (defaults to EMBEDDING_MODEL)
+        output_dir: Where to write the prepared model (defaults to model_dir())
+    
+    Returns:
+        Directory with the quantized model, tokenizer and embedding config
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    
+    model_name = model_name or settings.EMBEDDING_MODEL
+    output_dir = Path(output_dir or model_dir(model_name))
+    if (output_dir / QUANTIZED_MODEL).exists():
+        return output_dir
+    
+    work_dir = Path(tempfile.mkdtemp(prefix="onnx_export_"))
+    try:
+        if Path(model_name).is_dir():
+            source = Path(model_name)
+        else:
+            from huggingface_hub import snapshot_download
+            
+            source = Path(snapshot_download(model_name, allow_patterns=_HUB_PATTERNS))
+        
+        exported = next((path for path in (source / "onnx" / "model.onnx", source / "model.onnx") if path.exists()), None)
+        tokenizer = source / TOKENIZER
+        if exported is None:
+            logger.info("Exporting embedding model to ONNX", extra={"model": model_name})
+            exported = work_dir / "model.onnx"
+            _export_with_torch(str(source) if Path(model_name).is_dir() else model_name, exported)
+            tokenizer = work_dir / TOKENIZER
+        
+        config = _sentence_transformers_config(source)
+        
+        # Write to a scratch directory and rename, so a crash never leaves a half-prepared model
+        staging = work_dir / "prepared"
+        staging.mkdir()
+        quantize_dynamic(str(exported), str(staging / QUANTIZED_MODEL), weight_type=QuantType.QInt8)
+        shutil.copy(tokenizer, staging / TOKENIZER)
+        with open(staging / EMBEDDING_CONFIG, "w") as f:
+            json.dump({"model": model_name, **config}, f, indent=2)
+        
+        output_dir.parent.mkdir(parents=True, exist_ok=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        shutil.move(str(staging), str(output_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    logger.info("Prepared int8 ONNX embedding model", extra={"model": model_name, "path": str(output_dir)})
+    return output_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from a prepared int8 ONNX model.
+    
+    Texts are batched in length order to keep padding small; results come
+    back in input order. The session is thread-safe, so one instance
+    serves every request thread.
+    """
+    
+    def __init__(self, path: Path, threads: int = 0, batch_size: int = 32):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        
+        config = _read_json(path / EMBEDDING_CONFIG)
+        self.normalize = config.get("normalize", True)
+        self.batch_size = max(1, batch_size)
+        
+        self.tokenizer = Tokenizer.from_file(str(path / TOKENIZER))
+        self.tokenizer.enable_truncation(max_length=config.get("max_seq_length", 256))
+        self.tokenizer.enable_padding()
+        
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads  # 0 = one per physical core
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(path / QUANTIZED_MODEL), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+    
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+        
+        # Mean pooling over real (unpadded) tokens
+        weights = mask[:, :, None].astype(np.float32)
+        vectors = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for index, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[index] = vector
+        return [vector.tolist() for vector in vectors]
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+_prepare_lock = threading.Lock()
+
+
+def create_onnx_embeddings() -> OnnxEmbeddings:
+    """Load the int8 ONNX model for EMBEDDING_MODEL, preparing it first if needed"""
+    with _prepare_lock:
+        path = prepare_onnx_model()
+    threads = settings.ONNX_INTRA_OP_THREADS or embedding_threads()
+    embeddings = OnnxEmbeddings(
+        path,
+        threads=threads,
+        batch_size=settings.ONNX_BATCH_SIZE
+    )
+    logger.info(
+        "ONNX embedding model loaded",
+        extra={"model": settings.EMBEDDING_MODEL, "threads": threads}
+    )
+    return embeddings
+
+
+if __name__ == "__main__":
+    from app.logging_config import setup_logging
+    
+    setup_logging()
+    print(prepare_onnx_model())
@@ -1,19 +1,293 @@
+import logging
+import re
+import threading
 import PyPDF2
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.config import settings
+from app.metrics import PAGES_EXTRACTED, PDF_PAGE_FALLBACKS
 
-def extract_text_from_pdf(file_path: str) -> Dict[str, any]:
+logger = logging.getLogger(__name__)
+
+# Line put before each page's text by extract_text_from_pdf
+_PAGE_MARKER = re.compile(r"^--- Page (\d+) ---$", re.MULTILINE)
+
+
+class OpenPdf(ABC):
+    """An opened PDF that can return the text of individual pages"""
+    
+    page_count = 0
+    
+    @abstractmethod
+    def page_text(self, index: int) -> str:
+        """Text of page `index` (0-based)"""
+    
+    def close(self):
+        pass
+
+
+class PdfExtractor(ABC):
+    """
+    Text extraction engine.
+    
+    Engines wrap an optional library; `available()` reports whether it is
+    installed so the configured order can skip missing ones.
+    """
+    
+    name = ""
+    
+    @classmethod
+    @abstractmethod
+    def available(cls) -> bool:
+        """Whether the engine's library is installed"""
+    
+    @abstractmethod
+    def open(self, file_path: str) -> OpenPdf:
+        """Open a PDF for page-by-page extraction"""
+
+
+class _PyPDF2Pdf(OpenPdf):
+    def __init__(self, file_path: str):
+        self._file = open(file_path, 'rb')
+        try:
+            self._reader = PyPDF2.PdfReader(self._file)
+            self.page_count = len(self._reader.pages)
+        except Exception:
+            self._file.close()
+            raise
+    
+    def page_text(self, index: int) -> str:
+        return self._reader.pages[index].extract_text() or ""
+    
+    def close(self):
+        self._file.close()
+
+
+class PyPDF2Extractor(PdfExtractor):
+    """Pure-Python PyPDF2 (always installed, slowest)"""
+    
+    name = "pypdf2"
+    
+    @classmethod
+    def available(cls) -> bool:
+        return True
+    
+    def open(self, file_path: str) -> OpenPdf:
+        return _PyPDF2Pdf(file_path)
+
+
+# PDFium is not thread-safe; every call into it must hold this lock
+_pdfium_lock = threading.Lock()
+
+
+class _PdfiumPdf(OpenPdf):
+    def __init__(self, file_path: str):
+        import pypdfium2
+        
+        with _pdfium_lock:
+            self._document = pypdfium2.PdfDocument(file_path)
+            self.page_count = len(self._document)
+    
+    def page_text(self, index: int) -> str:
+        with _pdfium_lock:
+            page = self._document[index]
+            try:
+                text_page = page.get_textpage()
+                try:
+                    text = text_page.get_text_range()
+                finally:
+                    text_page.close()
+            finally:
+                page.close()
+        return text.replace("\r\n", "\n")
+    
+    def close(self):
+        with _pdfium_lock:
+            self._document.close()
+
+
+class PdfiumExtractor(PdfExtractor):
+    """Google's PDFium through pypdfium2 (native code, much faster)"""
+    
+    name = "pypdfium2"
+    
+    @classmethod
+    def available(cls) -> bool:
+        return _importable("pypdfium2")
+    
+    def open(self, file_path: str) -> OpenPdf:
+        return _PdfiumPdf(file_path)
+
+
+class _PdfminerPdf(OpenPdf):
+    def __init__(self, file_path: str):
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+        
+        self._file = open(file_path, 'rb')
+        try:
+            document = PDFDocument(PDFParser(self._file))
+            self._pages = list(PDFPage.create_pages(document))
+            self.page_count = len(self._pages)
+        except Exception:
+            self._file.close()
+            raise
+    
+    def page_text(self, index: int) -> str:
+        from io import StringIO
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        
+        output = StringIO()
+        resources = PDFResourceManager()
+        device = TextConverter(resources, output, laparams=LAParams())
+        try:
+            PDFPageInterpreter(resources, device).process_page(self._pages[index])
+        finally:
+            device.close()
+        return output.getvalue().replace("\x0c", "")
+    
+    def close(self):
+        self._file.close()
+
+
+class PdfminerExtractor(PdfExtractor):
+    """pdfminer.six (pure Python, best layout analysis)"""
+    
+    name = "pdfminer"
+    
+    @classmethod
+    def available(cls) -> bool:
+        return _importable("pdfminer")
+    
+    def open(self, file_path: str) -> OpenPdf:
+        return _PdfminerPdf(file_path)
+
+
+# Registered engines, fastest first (the order "auto" uses)
+EXTRACTORS = {
+    extractor.name: extractor
+    for extractor in (PdfiumExtractor, PyPDF2Extractor, PdfminerExtractor)
+}
+
+_extractors: Optional[List[PdfExtractor]] = None
+
+
+def _importable(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_extractors(names: str) -> List[PdfExtractor]:
+    """
+    Build the extraction chain from a comma-separated list of engine names.
+    
+    Args:
+        names: Engine names in order of preference, or "auto" for every
+            installed engine, fastest first
+    
+    Returns:
+        Installed engines in order; PyPDF2 if none of the named ones is usable
+    """
+    if names.strip().lower() == "auto":
+        wanted = list(EXTRACTORS)
+    else:
+        wanted = [name.strip().lower() for name in names.split(",") if name.strip()]
+    
+    chain = []
+    for name in wanted:
+        extractor = EXTRACTORS.get(name)
+        if extractor is None:
+            logger.warning("Unknown PDF extractor", extra={"extractor": name})
+        elif extractor.available():
+            chain.append(extractor())
+        elif names.strip().lower() != "auto":
+            logger.warning("PDF extractor is not installed", extra={"extractor": name})
+    return chain or [PyPDF2Extractor()]
+
+
+def get_extractors() -> List[PdfExtractor]:
+    """
+    Get the configured extraction chain (PDF_EXTRACTORS).
+    
+    The first engine extracts every page; the others are only used for
+    pages it fails on or returns no text for, and only when
+    PDF_EXTRACTOR_FALLBACK is enabled.
+    """
+    global _extractors
+    
+    if _extractors is None:
+        chain = resolve_extractors(settings.PDF_EXTRACTORS)
+        if not settings.PDF_EXTRACTOR_FALLBACK:
+            chain = chain[:1]
+        _extractors = chain
+        logger.info("PDF extractors selected", extra={"extractors": [e.name for e in chain]})
+    return _extractors
+
+
+def _open_with_chain(file_path: str, chain: List[PdfExtractor]):
+    """Open a PDF with the first engine that can parse it, returning (index, OpenPdf)"""
+    errors = []
+    for position, extractor in enumerate(chain):
+        try:
+            pdf = extractor.open(file_path)
+        except Exception as e:
+            errors.append(e)
+            continue
+        if errors:
+            logger.warning(
+                "PDF opened by a fallback extractor",
+                extra={"file_path": file_path, "extractor": extractor.name, "error": str(errors[0])}
+            )
+        return position, pdf
+    raise errors[0]
+
+
+def _page_text(pdfs: List[Optional[OpenPdf]], chain: List[PdfExtractor], file_path: str, page_num: int, start: int) -> Optional[str]:
+    """
+    Extract one page, trying each engine from `start` until one returns text.
+    
+    Fallback engines open the file lazily, the first time a page needs them.
+    """
+    for position in range(start, len(chain)):
+        extractor = chain[position]
+        try:
+            if pdfs[position] is None:
+                pdfs[position] = extractor.open(file_path)
+            page_text = pdfs[position].page_text(page_num)
+        except Exception as e:
+            logger.warning(
+                "Could not extract text from page",
+                extra={"file_path": file_path, "page": page_num + 1, "extractor": extractor.name, "error": str(e)}
+            )
+            continue
+        if page_text.strip():
+            if position != start:
+                PDF_PAGE_FALLBACKS.labels(extractor.name).inc()
+            return page_text
+    return None
+
+
+def extract_text_from_pdf(file_path: str, extractors: Optional[List[PdfExtractor]] = None) -> Dict[str, Any]:
     """
     Extract text content from a PDF file.
     
     Args:
         file_path: Path to the PDF file
+        extractors: Engine chain to use (defaults to get_extractors())
         
     Returns:
         Dictionary containing:
         - text: Extracted text content
         - page_count: Number of pages
+        - extractor: Engine that opened the file
         - success: Boolean indicating success
         - error: Error message if failed
     """
@@ -23,30 +297,36 @@ def extract_text_from_pdf(file_path: str) -> Dict[str, any]:
             return {
                 "text": "",
                 "page_count": 0,
+                "extractor": None,
                 "success": False,
                 "error": "File not found"
             }
         
-        # Open and read PDF
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            page_count = len(pdf_reader.pages)
-            
-            # Extract text from each page
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += f"\n--- Page {page_num + 1} ---\n"
-                        text += page_text
-                except Exception as e:
-                    print(f"Warning: Could not extract text from page {page_num + 1}: {e}")
-                    continue
+        chain = extractors or get_extractors()
+        start, primary = _open_with_chain(file_path, chain)
+        pdfs: List[Optional[OpenPdf]] = [None] * len(chain)
+        pdfs[start] = primary
+        
+        # Extract text from each page
+        parts = []
+        try:
+            page_count = primary.page_count
+            for page_num in range(page_count):
+                page_text = _page_text(pdfs, chain, file_path, page_num, start)
+                if page_text:
+                    parts.append(f"\n--- Page {page_num + 1} ---\n")
+                    parts.append(page_text)
+        finally:
+            for pdf in pdfs:
+                if pdf is not None:
+                    pdf.close()
+        
+        PAGES_EXTRACTED.inc(page_count)
         
         return {
-            "text": text.strip(),
+            "text": "".join(parts).strip(),
             "page_count": page_count,
+            "extractor": chain[start].name,
             "success": True,
             "error": None
         }
@@ -55,11 +335,36 @@ def extract_text_from_pdf(file_path: str) -> Dict[str, any]:
         return {
             "text": "",
             "page_count": 0,
+            "extractor": None,
             "success": False,
             "error": str(e)
         }
 
 
+def split_pages(text: str) -> List[Tuple[int, str]]:
+    """
+    Split extracted text back into its pages.
+    
+    Args:
+        text: Text from extract_text_from_pdf
+        
+    Returns:
+        (page_number, page_text) for every page with text, in order; text
+        without page markers comes back as a single page 1
+    """
+    markers = list(_PAGE_MARKER.finditer(text))
+    if not markers:
+        return [(1, text.strip())] if text.strip() else []
+    
+    pages = []
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        page_text = text[marker.end():end].strip()
+        if page_text:
+            pages.append((int(marker.group(1)), page_text))
+    return pages
+
+
 def get_file_size_mb(file_path: str) -> Optional[float]:
     """
     Get file size in megabytes.
@@ -75,11 +380,11 @@ def get_file_size_mb(file_path: str) -> Optional[float]:
         file_size_mb = file_size_bytes / (1024 * 1024)
         return round(file_size_mb, 2)
     except Exception as e:
-        print(f"Error getting file size: {e}")
+        logger.warning("Error getting file size", extra={"file_path": file_path, "error": str(e)})
         return None
 
 
-def validate_pdf(file_path: str) -> Dict[str, any]:
+def validate_pdf(file_path: str) -> Dict[str, Any]:
     """
     Validate if a file is a valid PDF.
     
@@ -90,15 +395,17 @@ def validate_pdf(file_path: str) -> Dict[str, any]:
         Dictionary with validation results
     """
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            page_count = len(pdf_reader.pages)
-            
-            return {
-                "valid": True,
-                "page_count": page_count,
-                "error": None
-            }
+        _, pdf = _open_with_chain(file_path, get_extractors())
+        try:
+            page_count = pdf.page_count
+        finally:
+            pdf.close()
+        
+        return {
+            "valid": True,
+            "page_count": page_count,
+            "error": None
+        }
     except Exception as e:
         return {
             "valid": False,
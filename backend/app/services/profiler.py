@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import anyio
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames that mean a thread is parked rather than doing work
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+PROFILE_NAME_PATTERN = re.compile(r"^[\w.-]+$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse_stack(frame, thread_name: str) -> Optional[str]:
+    """Fold a frame chain into "thread;outer;...;inner", or None for idle threads"""
+    innermost = frame.f_code
+    if (os.path.basename(innermost.co_filename), innermost.co_name) in _IDLE_FRAMES:
+        return None
+    
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(labels))
+
+
+class ProfileCapture:
+    """Stack samples collected while one request is in flight"""
+    
+    def __init__(self):
+        self.samples: Counter = Counter()
+        self.started_at = time.time()
+
+
+class StackSampler:
+    """
+    Wall-clock stack sampler.
+    
+    A single daemon thread samples every thread's stack at a fixed
+    interval, but only while at least one profiled request is active,
+    so an idle server pays nothing. Samples go to every active capture,
+    which shows contention from concurrent requests as well.
+    """
+    
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._captures: List[ProfileCapture] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start_capture(self) -> ProfileCapture:
+        capture = ProfileCapture()
+        with self._lock:
+            self._captures.append(capture)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return capture
+    
+    def stop_capture(self, capture: ProfileCapture):
+        with self._lock:
+            if capture in self._captures:
+                self._captures.remove(capture)
+    
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                captures = list(self._captures)
+            if not captures:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = _collapse_stack(frame, names.get(thread_id, str(thread_id)))
+                if stack is not None:
+                    stacks.append(stack)
+            
+            for capture in captures:
+                capture.samples.update(stacks)
+            
+            time.sleep(self.interval_seconds)
+
+
+def _prune_profiles(directory: Path):
+    """Keep only the newest PROFILE_MAX_FILES profiles"""
+    profiles = sorted(directory.glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in profiles[settings.PROFILE_MAX_FILES:]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix(".json").unlink(missing_ok=True)
+
+
+def save_profile(capture: ProfileCapture, metadata: Dict[str, Any]) -> str:
+    """
+    Write a capture as folded stacks plus a JSON metadata sidecar.
+    
+    The .folded file is the collapsed-stack format read by flamegraph.pl,
+    speedscope and inferno.
+    
+    Returns:
+        Profile name (file stem)
+    """
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    
+    stamp = datetime.fromtimestamp(capture.started_at, tz=timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    route = re.sub(r"[^\w]+", "_", metadata["path"]).strip("_") or "root"
+    name = f"{stamp}_{route}_{int(metadata['duration_ms'])}ms"
+    
+    with open(directory / f"{name}.folded", "w") as f:
+        for stack, count in capture.samples.most_common():
+            f.write(f"{stack} {count}\n")
+    
+    metadata = {
+        **metadata,
+        "name": name,
+        "started_at": datetime.fromtimestamp(capture.started_at, tz=timezone.utc).isoformat(),
+        "samples": sum(capture.samples.values()),
+        "sample_interval_ms": settings.PROFILE_SAMPLE_INTERVAL_MS,
+    }
+    with open(directory / f"{name}.json", "w") as f:
+        json.dump(metadata, f, indent=2)
+    
+    _prune_profiles(directory)
+    return name
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Return metadata of saved profiles, newest first"""
+    directory = Path(settings.PROFILE_DIR)
+    if not directory.is_dir():
+        return []
+    
+    profiles = []
+    for meta_path in directory.glob("*.json"):
+        try:
+            with open(meta_path) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda p: p.get("started_at", ""), reverse=True)
+
+
+def get_profile_path(name: str) -> Optional[Path]:
+    """Resolve a profile name to its .folded file, rejecting path tricks"""
+    if not PROFILE_NAME_PATTERN.match(name):
+        return None
+    path = Path(settings.PROFILE_DIR) / f"{name}.folded"
+    return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that samples stacks for chat and upload requests and
+    saves a profile when a request exceeds PROFILE_THRESHOLD_MS.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        self.paths = tuple(settings.get_profile_paths())
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        capture = self.sampler.start_capture()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.sampler.stop_capture(capture)
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= settings.PROFILE_THRESHOLD_MS:
+                metadata = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "status": status_code,
+                    "duration_ms": round(duration_ms, 1),
+                    "client": scope["client"][0] if scope.get("client") else None,
+                }
+                try:
+                    name = await anyio.to_thread.run_sync(save_profile, capture, metadata)
+                    logger.info("Saved slow-request profile", extra={"profile": name, **metadata})
+                except Exception:
+                    logger.exception("Failed to save profile")
@@ -0,0 +1,267 @@
+"""
+Progressive indexing of large uploads.
+
+A 1,000-page PDF used to be unanswerable until its last chunk was
+embedded, and its upload request waited for all of it. Uploads of at
+least PROGRESSIVE_MIN_PAGES pages are now built by a background pool in
+batches of PROGRESSIVE_BATCH_CHUNKS; the upload returns as soon as the
+first PROGRESSIVE_FIRST_SLICE_CHUNKS chunks are in the index, with the
+document still "embedding".
+
+Questions on a document that is still embedding search the partial
+index and are answered with its coverage. The pages they point at, a
+requested page range and the pages sharing the most words with the
+question, are stored on the document (index_priority_pages), and the
+build embeds those pages next, whichever worker runs it. The building
+worker searches the index as it grows; other workers search the copy it
+publishes every PROGRESSIVE_PUBLISH_SECONDS (partial_index), and answer
+409 until the first one is out.
+"""
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.metrics import TIME_TO_QUERYABLE
+from app.models.document import Document, STATUS_EMBEDDING, STATUS_READY
+from app.services.ingestion import (
+    build_index,
+    index_document,
+    lease_keeper,
+    request_priority_pages,
+    resume_point,
+    set_status
+)
+from app.services.pdf_processor import split_pages
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+# Question words that say nothing about where the answer is
+_STOPWORDS = frozenset(
+    "about above after again also and any are because been before being between both but can could did does doing "
+    "document during each few for from had has have how into its more most not off once only other our out over own "
+    "page pages same say says should some such than that the their them then there these they this those through "
+    "too under until very was were what when where which while who whom why will with would you your".split()
+)
+
+
+def question_terms(question: str) -> List[str]:
+    """Distinct lowercase words of a question worth looking up (3+ letters, no stopwords)"""
+    words = _WORD.findall(question.lower())
+    return list(dict.fromkeys(word for word in words if len(word) >= 3 and word not in _STOPWORDS))
+
+
+def lexical_pages(text: str, question: str, limit: int, page_range: Optional[Tuple[int, int]] = None) -> List[int]:
+    """
+    Pages that share the most words with a question.
+    
+    Args:
+        text: Extracted text with "--- Page N ---" markers
+        question: The user's question
+        limit: Most pages to return
+        page_range: Only consider these pages (first, last; inclusive)
+    
+    Returns:
+        Page numbers, best first: each question word found on a page
+        counts log(pages / pages containing it), so rare words decide
+        and words found everywhere add almost nothing
+    """
+    terms = question_terms(question)
+    if not terms or limit <= 0:
+        return []
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\b", re.IGNORECASE)
+    
+    pages = split_pages(text)
+    found = {}
+    for page_number, page_text in pages:
+        if page_range is not None and not page_range[0] <= page_number <= page_range[1]:
+            continue
+        hits = Counter(match.lower() for match in pattern.findall(page_text))
+        if hits:
+            found[page_number] = hits
+    
+    containing = Counter(term for hits in found.values() for term in hits)
+    weights = {term: math.log((len(pages) + 1) / count) for term, count in containing.items()}
+    scored = sorted(
+        found.items(),
+        key=lambda item: (-sum(weights[term] for term in item[1]), -sum(item[1].values()), item[0])
+    )
+    return [page_number for page_number, _ in scored[:limit]]
+
+
+def prioritize_for_question(
+    db: Session,
+    document: Document,
+    question: str,
+    page_range: Optional[Tuple[int, int]] = None
+) -> List[int]:
+    """
+    Move the pages a question points at to the front of a document's embedding queue (commits).
+    
+    With a page range, its pages sharing the most words with the question
+    go first, then the rest of the range in order; without one, the
+    PROGRESSIVE_PRIORITY_PAGES best lexical matches in the document.
+    
+    Returns:
+        The pages requested, most wanted first
+    """
+    pages = lexical_pages(document.extracted_text or "", question, settings.PROGRESSIVE_PRIORITY_PAGES, page_range)
+    if page_range is not None:
+        last = min(page_range[1], document.page_count or page_range[1])
+        pages += [page for page in range(page_range[0], last + 1) if page not in pages]
+    if pages:
+        request_priority_pages(db, document, pages)
+    return pages
+
+
+class ProgressiveIndexer:
+    """
+    Background pool for progressive builds.
+    
+    At most `workers` documents are embedded at once per process; later
+    uploads wait for a slot, holding their recovery lease meanwhile. A
+    build that dies with the process is resumed by recover_documents()
+    from its last checkpoint, like any other.
+    """
+    
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def start(
+        self,
+        document_id: int,
+        text: str,
+        resume_from: int,
+        profile: Optional[str],
+        params: Optional[str] = None
+    ) -> threading.Event:
+        """
+        Queue a document's build.
+        
+        Returns:
+            Event set once the first slice is searchable, or when the
+            build ends (check the row to tell success from failure)
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(1, self.workers),
+                    thread_name_prefix="progressive-index"
+                )
+        queryable = threading.Event()
+        lease_keeper.hold([document_id])
+        self._executor.submit(self._run, document_id, text, resume_from, profile, params, queryable, time.perf_counter())
+        return queryable
+    
+    def _run(
+        self,
+        document_id: int,
+        text: str,
+        resume_from: int,
+        profile: Optional[str],
+        params: Optional[str],
+        queryable: threading.Event,
+        started: float
+    ):
+        first_slice = max(1, settings.PROGRESSIVE_FIRST_SLICE_CHUNKS)
+        
+        def on_checkpoint(done: int, total: int):
+            if done and done >= min(first_slice, total) and not queryable.is_set():
+                TIME_TO_QUERYABLE.observe(time.perf_counter() - started)
+                logger.info(
+                    "Document queryable",
+                    extra={"document_id": document_id, "chunks_embedded": done, "chunks_total": total}
+                )
+                queryable.set()
+        
+        try:
+            success = build_index(
+                document_id,
+                text,
+                resume_from,
+                profile,
+                batch_size=settings.PROGRESSIVE_BATCH_CHUNKS,
+                on_checkpoint=on_checkpoint,
+                params=params
+            )
+            if success:
+                set_status(
+                    document_id,
+                    STATUS_READY,
+                    vector_store_id=f"doc_{document_id}",
+                    status_error=None,
+                    index_priority_pages=None,
+                    partial_index=None
+                )
+        except Exception:
+            # Left in its last state; recovery resumes it once the lease goes stale
+            logger.exception("Progressive build failed", extra={"document_id": document_id})
+        finally:
+            lease_keeper.release([document_id])
+            queryable.set()
+
+
+# Global pool of progressive builds (one per worker process)
+progressive_indexer = ProgressiveIndexer(workers=settings.PROGRESSIVE_WORKERS)
+
+
+def is_partial(document: Document) -> bool:
+    """True if a document still being embedded already has chunks to search"""
+    return not document.vector_store_id and document.status == STATUS_EMBEDDING and bool(document.chunks_embedded)
+
+
+def start_progressive(document: Document) -> Optional[threading.Event]:
+    """
+    Queue a document's build in the background pool if it is indexed progressively.
+    
+    Documents under PROGRESSIVE_MIN_PAGES pages, or every document with
+    PROGRESSIVE_INDEXING_ENABLED off, are left to index_document().
+    
+    Args:
+        document: Committed Document with extracted text
+    
+    Returns:
+        Event set once the first slice is searchable (see
+        ProgressiveIndexer.start()), or None to index the document in full
+    """
+    if not settings.PROGRESSIVE_INDEXING_ENABLED or (document.page_count or 0) < settings.PROGRESSIVE_MIN_PAGES:
+        return None
+    
+    return progressive_indexer.start(
+        document.id,
+        document.extracted_text,
+        resume_point(document),
+        document.ingestion_profile,
+        document.ingestion_params
+    )
+
+
+def wait_until_queryable(db: Session, document: Document, queryable: threading.Event) -> bool:
+    """
+    Wait for a background build's first slice, at most PROGRESSIVE_UPLOAD_WAIT_SECONDS.
+    
+    Builds queue behind PROGRESSIVE_WORKERS others, so the wait is
+    bounded; the build carries on either way.
+    
+    Args:
+        db: Database session
+        document: Document passed to start_progressive() (refreshed)
+        queryable: Event returned by start_progressive()
+    
+    Returns:
+        True if the document is ready or partially searchable, False if it
+        is still queued or embedding its first slice
+    """
+    queryable.wait(max(0.0, settings.PROGRESSIVE_UPLOAD_WAIT_SECONDS))
+    db.refresh(document)
+    return document.status == STATUS_READY or is_partial(document)
@@ -1,118 +1,1040 @@
-# from langchain.text_splitters import RecursiveCharacterTextSplitter
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from groq import Groq
 from app.config import settings
-from typing import Dict, List, Optional
-import os
+from app.metrics import (
+    CHAT_ANSWERS,
+    CHAT_FALLBACKS,
+    CHUNKS_EMBEDDED,
+    CHUNKS_REUSED,
+    LLM_TOKENS,
+    PROFILE_DOCUMENTS,
+    PROFILE_EMBEDDING_SECONDS,
+    RETRIEVED_CHUNKS,
+    track_stage
+)
+from app.services.storage import get_storage, INDEXES
+from app.services.conversation_cache import conversation_cache
+from app.services.conversations import estimate_tokens
+from app.services.ingestion_profiles import IngestionProfile, get_profile, make_splitter
+from app.services.pdf_processor import split_pages
+from app.services.llm_router import LARGE, LLMRoute, choose_route, get_route, question_type, route_recorder
+from app.services.resources import limit_torch_threads
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+import logging
+import re
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Most chunks written to Chroma per upsert() call
+VECTOR_WRITE_BATCH_SIZE = 1000
+
+# Sentence boundaries and the sentence lengths quoted in fallback answers
+# (longer "sentences", e.g. tables without punctuation, are split into lines)
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_MIN_SENTENCE_CHARS = 20
+_MAX_SENTENCE_CHARS = 400
+
+_FALLBACK_INTROS = {
+    "timeout": "The answer could not be generated in time. These passages from the document look most relevant:",
+    "error": "The answer could not be generated right now. These passages from the document look most relevant:",
+}
+
+
+def similarity_from_distance(distance: float, space: str) -> float:
+    """
+    Convert a Chroma distance into a similarity in [-1, 1].
+    
+    Chroma's "l2" is squared L2, which for unit-length embeddings (as
+    produced by sentence-transformers MiniLM) equals 2 - 2*cos.
+    """
+    if space == "l2":
+        return 1.0 - distance / 2.0
+    return 1.0 - distance
+
+
+def hnsw_metadata(max_k: Optional[int] = None) -> Dict[str, int]:
+    """HNSW parameters recorded on a new collection (each index keeps the ones it was built with)"""
+    return {
+        "hnsw:M": settings.HNSW_M,
+        "hnsw:construction_ef": settings.HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": max(settings.HNSW_SEARCH_EF, max_k or settings.RETRIEVAL_MAX_K),
+    }
+
+
+def select_chunks(
+    chunks: List[Dict[str, Any]],
+    min_k: Optional[int] = None,
+    max_k: Optional[int] = None,
+    score_floor: Optional[float] = None,
+    relative_drop: Optional[float] = None
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Choose how many of the best-scoring chunks go into the prompt.
+    
+    The first `min_k` chunks are always kept. After that, selection stops
+    at the first chunk scoring below `score_floor` or more than
+    `relative_drop` (a fraction of the best score) below the best chunk,
+    and never goes past `max_k`. Settings fill in any argument left out.
+    
+    Args:
+        chunks: Candidates ordered by score, best first
+    
+    Returns:
+        The selected chunks and why selection stopped: "score_floor",
+        "relative_drop", "max_k" or "exhausted" (every candidate kept)
+    """
+    min_k = settings.RETRIEVAL_MIN_K if min_k is None else min_k
+    max_k = settings.RETRIEVAL_MAX_K if max_k is None else max_k
+    score_floor = settings.RETRIEVAL_SCORE_FLOOR if score_floor is None else score_floor
+    relative_drop = settings.RETRIEVAL_RELATIVE_DROP if relative_drop is None else relative_drop
+    
+    if not chunks:
+        return [], "exhausted"
+    best = chunks[0]["score"]
+    cutoff = best - relative_drop * abs(best)
+    
+    for index, chunk in enumerate(chunks):
+        if index >= max_k:
+            return chunks[:index], "max_k"
+        if index < min_k:
+            continue
+        if chunk["score"] < score_floor:
+            return chunks[:index], "score_floor"
+        if relative_drop > 0 and chunk["score"] < cutoff:
+            return chunks[:index], "relative_drop"
+    return list(chunks), "max_k" if len(chunks) == max_k else "exhausted"
+
+
+def rank_sentences(
+    query_embedding: List[float],
+    chunks: List[Dict[str, Any]],
+    embed_documents: Callable[[List[str]], List[List[float]]],
+    count: int,
+    max_candidates: int
+) -> List[str]:
+    """
+    Pick the sentences of the retrieved chunks closest to the question.
+    
+    Sentences are taken from the chunks best first, up to `max_candidates`,
+    embedded in one batch and ranked by cosine similarity to the question.
+    
+    Args:
+        query_embedding: Embedded question
+        chunks: Retrieved chunks, best first
+        embed_documents: Embedding function for the sentence batch
+        count: Sentences to return
+        max_candidates: Most sentences to embed
+    
+    Returns:
+        Up to `count` sentences, most similar first
+    """
+    import numpy as np
+    
+    candidates: List[str] = []
+    seen = set()
+    for chunk in chunks:
+        pieces = []
+        for sentence in _SENTENCE_BREAK.split(chunk["text"]):
+            pieces.extend(sentence.splitlines() if len(sentence) > _MAX_SENTENCE_CHARS else [sentence])
+        for sentence in pieces:
+            sentence = " ".join(sentence.split())[:_MAX_SENTENCE_CHARS]
+            if len(sentence) >= _MIN_SENTENCE_CHARS and sentence not in seen:
+                seen.add(sentence)
+                candidates.append(sentence)
+        if len(candidates) >= max_candidates:
+            break
+    candidates = candidates[:max_candidates]
+    if not candidates:
+        return []
+    
+    vectors = np.asarray(embed_documents(candidates), dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+    scores = vectors @ query / np.where(norms > 0, norms, 1.0)
+    return [candidates[i] for i in np.argsort(-scores)[:count]]
+
+
+def _with_page(chunk: Dict[str, Any]) -> str:
+    """Chunk text for the prompt, headed by its page like the extracted text"""
+    page = chunk.get("metadata", {}).get("page")
+    return f"--- Page {page} ---\n{chunk['text']}" if page else chunk["text"]
+
+
+def _next_batch(pending: List[int], pages: List[int], wanted: Set[int], size: int) -> List[int]:
+    """Pick the next chunks to embed: pending chunks of wanted pages first, then in document order"""
+    batch = [index for index in pending if pages[index] in wanted][:size] if wanted else []
+    if len(batch) < size:
+        chosen = set(batch)
+        batch += [index for index in pending if index not in chosen][:size - len(batch)]
+    return batch
+
+
+def _page_filter(page_range: Tuple[int, int]) -> Dict[str, Any]:
+    """Chroma metadata filter for chunks of pages first..last"""
+    return {"$and": [{"page": {"$gte": page_range[0]}}, {"page": {"$lte": page_range[1]}}]}
+
+
+def release_index_clients(index_name: str, directory: Optional[Path] = None):
+    """
+    Stop Chroma's cached clients for an index directory.
+    
+    Chroma keeps one client per persist directory for the life of the
+    process. Once the directory is deleted, that client can no longer
+    write, so it has to be dropped before the index is removed or rebuilt.
+    
+    Args:
+        index_name: Directory name of the index ("doc_7")
+        directory: Only release the client of this exact directory
+    """
+    from chromadb.api.shared_system_client import SharedSystemClient
+    
+    systems = SharedSystemClient._identifier_to_system
+    for identifier in list(systems):
+        if directory is not None and Path(identifier) != Path(directory):
+            continue
+        if Path(identifier).name == index_name:
+            systems.pop(identifier).stop()
+
+
+def partial_index_prefix(document_id: int) -> str:
+    """Storage prefix under which a build publishes searchable copies of its partial index"""
+    return f"doc_{document_id}.partial"
+
+
+def partial_index_chunks(partial_index: str) -> int:
+    """Chunks held by a published partial copy ("doc_7.partial/640" -> 640)"""
+    return int(partial_index.rsplit("/", 1)[1])
+
+
+def _release_partial_clients(document_id: int, keep: Path):
+    """Stop Chroma's clients of a document's older partial copies"""
+    from chromadb.api.shared_system_client import SharedSystemClient
+    
+    marker = partial_index_prefix(document_id)
+    systems = SharedSystemClient._identifier_to_system
+    for identifier in list(systems):
+        if marker in identifier and Path(identifier) != keep:
+            systems.pop(identifier).stop()
+
+
+def embedding_version(backend: Optional[str] = None) -> str:
+    """Version tag recorded on every index: "<model>@<backend>" """
+    return f"{settings.EMBEDDING_MODEL}@{backend or settings.EMBEDDING_BACKEND}"
+
+
+def is_compatible_index(version: Optional[str], backend: Optional[str] = None) -> bool:
+    """
+    Check whether an index can be searched with the current embeddings.
+    
+    Indexes without a version predate version tracking and were built by
+    the torch backend. Backends of the same model share one vector space
+    (int8 quantization only perturbs it slightly), so they can search
+    each other's indexes unless EMBEDDING_STRICT_INDEX_VERSION is set. A
+    different model always needs a rebuild.
+    
+    Args:
+        version: embedding_version recorded on the document
+        backend: Backend the document's ingestion profile embeds with
+            (default EMBEDDING_BACKEND)
+    """
+    version = version or embedding_version("torch")
+    if settings.EMBEDDING_STRICT_INDEX_VERSION:
+        return version == embedding_version(backend)
+    return version.rsplit("@", 1)[0] == settings.EMBEDDING_MODEL
+
+
+def create_local_embeddings(backend: Optional[str] = None):
+    """Load an embedding backend (default EMBEDDING_BACKEND) in this process"""
+    if (backend or settings.EMBEDDING_BACKEND) == "onnx-int8":
+        from app.services.onnx_embeddings import create_onnx_embeddings
+        
+        return create_onnx_embeddings()
+    
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    
+    embeddings = HuggingFaceEmbeddings(
+        model_name=settings.EMBEDDING_MODEL,
+        model_kwargs={'device': 'cpu'}
+    )
+    limit_torch_threads()
+    logger.info("Embedding model loaded", extra={"model": settings.EMBEDDING_MODEL})
+    return embeddings
 
 
 class RAGService:
     """
     Retrieval-Augmented Generation Service
     Handles document embedding, vector storage, and AI-powered question answering
+    
+    Heavy components (sentence-transformers/torch, Chroma, the Groq client)
+    are loaded on first use or by warmup(), never at import time.
     """
     
     def __init__(self):
-        """Initialize RAG service with embeddings and Groq client"""
-        # Initialize embeddings model
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=settings.EMBEDDING_MODEL,
-            model_kwargs={'device': 'cpu'}
-        )
+        """Initialize RAG service without loading any models"""
+        self._embeddings = None
+        self._backend_embeddings: Dict[str, Any] = {}
+        self._building_dirs: Dict[int, str] = {}  # Document id -> directory of an index being built
+        self._groq_client = None
+        self._load_lock = threading.Lock()
+        self.vector_store_ready = False
+    
+    @property
+    def embeddings(self):
+        """
+        Embedding model, loaded on first access.
+        
+        Uses the shared embedding sidecar when EMBEDDING_SERVER_SOCKET is
+        set and reachable, otherwise loads the model in this process.
+        """
+        if self._embeddings is None:
+            with self._load_lock:
+                if self._embeddings is None:
+                    self._embeddings = self._create_embeddings()
+        return self._embeddings
+    
+    def embeddings_for(self, backend: Optional[str] = None):
+        """
+        Embeddings of a profile's backend.
+        
+        The configured backend (None or EMBEDDING_BACKEND) is the shared
+        `embeddings`; any other is loaded in this process on first use.
+        """
+        if not backend or backend == settings.EMBEDDING_BACKEND:
+            return self.embeddings
+        if backend not in self._backend_embeddings:
+            with self._load_lock:
+                if backend not in self._backend_embeddings:
+                    self._backend_embeddings[backend] = create_local_embeddings(backend)
+        return self._backend_embeddings[backend]
+    
+    def _create_embeddings(self):
+        if settings.EMBEDDING_SERVER_SOCKET:
+            from app.services.embedding_server import connect_embedding_server
+            
+            remote = connect_embedding_server(fallback=create_local_embeddings)
+            if remote is not None:
+                logger.info("Using shared embedding server", extra={"socket": settings.EMBEDDING_SERVER_SOCKET})
+                return remote
+        return create_local_embeddings()
+    
+    @property
+    def groq_client(self):
+        """Groq client, created on first access (without retries: calls are bounded by the chat deadline)"""
+        if self._groq_client is None:
+            with self._load_lock:
+                if self._groq_client is None:
+                    from groq import Groq
+                    
+                    self._groq_client = Groq(
+                        api_key=settings.GROQ_API_KEY,
+                        base_url=settings.GROQ_BASE_URL or None,
+                        max_retries=0
+                    )
+        return self._groq_client
+    
+    @property
+    def embeddings_loaded(self) -> bool:
+        return self._embeddings is not None
+    
+    # vector_store_ready turns true once Chroma has opened a collection,
+    # in warmup() or on the first build or search without it
+    
+    def warmup(self) -> Dict[str, float]:
+        """
+        Load the embedding model and open a vector store once.
+        
+        Runs one dummy embedding and opens an in-memory Chroma collection
+        so the first real request doesn't pay model load or import costs.
         
-        # Initialize Groq client
-        self.groq_client = Groq(api_key=settings.GROQ_API_KEY)
+        Returns:
+            Seconds spent on each warmup step
+        """
+        from langchain_community.vectorstores import Chroma
         
-        print("✅ RAG Service initialized")
+        timings = {}
+        
+        start = time.perf_counter()
+        self.embeddings.embed_query("warmup")
+        timings["embedding_model"] = round(time.perf_counter() - start, 3)
+        
+        start = time.perf_counter()
+        vectorstore = Chroma(
+            collection_name="warmup",
+            embedding_function=self.embeddings
+        )
+        vectorstore.similarity_search("warmup", k=1)
+        vectorstore.delete_collection()
+        timings["vector_store"] = round(time.perf_counter() - start, 3)
+        
+        self.groq_client
+        self.vector_store_ready = True
+        logger.info("RAG service warmed up", extra={"timings": timings})
+        return timings
     
-    def create_vector_store(self, text: str, document_id: int) -> bool:
+    def create_vector_store(
+        self,
+        text: str,
+        document_id: int,
+        resume_from: int = 0,
+        checkpoint: Optional[Callable[[int, int, int, float], None]] = None,
+        reuse_from: Optional[int] = None,
+        profile: Optional[IngestionProfile] = None,
+        priority: Optional[Callable[[], Iterable[int]]] = None,
+        batch_size: Optional[int] = None,
+        partial_every: Optional[float] = None,
+        on_partial: Optional[Callable[[str], None]] = None
+    ) -> bool:
         """
         Create vector store from document text.
         
+        Each page is split into chunks on its own with the profile's
+        splitter, so an edit on one page leaves the chunks of every other
+        page unchanged; chunks carry their page number as metadata. Chunks
+        are embedded with the profile's backend and upserted in batches of
+        INGESTION_CHECKPOINT_CHUNKS under deterministic ids
+        ("<document_id>-<n>"), so writing a batch twice is harmless. After
+        the split and after every batch, `checkpoint(chunks_done,
+        chunks_total, chunks_reused, embedding_seconds)` is called; with a
+        `resume_from` checkpoint, chunks already in the index are skipped.
+        If the partial index did not survive, the build starts over.
+        
+        Chunks are embedded in document order unless `priority` names
+        pages: it is asked before every batch, and pending chunks of the
+        pages it has returned so far go first. While the build runs, the
+        partial index can be searched from this process (see
+        _open_vector_store()), even when remote storage only receives it
+        at the end. Other processes cannot follow a Chroma directory that
+        is still being written, so with `partial_every` a copy of the
+        partial index is published every that many seconds, under
+        partial_index_prefix()/<chunks done>, and passed to `on_partial`.
+        The two newest copies are kept while building, and none once the
+        index is published.
+        
+        With `reuse_from`, chunks whose text also appears in that
+        document's index get its stored vector instead of being embedded
+        again, provided it was built with the same embeddings.
+        
         Args:
             text: Document text content
             document_id: Unique document identifier
-            
+            resume_from: Chunks already written by an interrupted build
+            checkpoint: Called with (chunks_done, chunks_total, chunks_reused,
+                embedding_seconds) as work is made durable
+            reuse_from: Earlier version of the document to copy vectors from
+            profile: Ingestion profile (default "standard")
+            priority: Returns page numbers to embed before the rest
+            batch_size: Chunks per batch (default INGESTION_CHECKPOINT_CHUNKS)
+            partial_every: Seconds between published copies of the partial index
+            on_partial: Called with the name of each published copy
+        
         Returns:
             True if successful, False otherwise
         """
+        from langchain_community.vectorstores import Chroma
+        
+        profile = profile or get_profile()
+        version = embedding_version(profile.embedding_backend)
         try:
-            # Split text into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=settings.CHUNK_SIZE,
-                chunk_overlap=settings.CHUNK_OVERLAP,
-                length_function=len,
-            )
-            chunks = text_splitter.split_text(text)
+            embeddings = self.embeddings_for(profile.embedding_backend)
             
-            print(f"📄 Split document into {len(chunks)} chunks")
+            # Split text into chunks (deterministic, so a resumed build sees the same chunks)
+            with track_stage("ingestion", "split"):
+                text_splitter = make_splitter(profile)
+                chunks, pages = [], []
+                for page_number, page_text in split_pages(text):
+                    page_chunks = text_splitter.split_text(page_text)
+                    chunks.extend(page_chunks)
+                    pages.extend([page_number] * len(page_chunks))
             
-            # Create vector store directory
-            persist_directory = os.path.join(settings.CHROMA_DB_DIR, f"doc_{document_id}")
+            logger.info("Split document", extra={"document_id": document_id, "chunks": len(chunks)})
+            if resume_from > len(chunks):
+                resume_from = 0  # Chunking settings changed since the checkpoint
+            collection_metadata = {
+                "embedding_version": version,
+                "ingestion_profile": profile.name,
+                "chunking": profile.chunking,
+                **hnsw_metadata(profile.retrieval_k)
+            }
+            
+            reusable = self._reusable_vectors(reuse_from, version) if reuse_from else {}
             
-            # Create and persist vector store
-            vectorstore = Chroma.from_texts(
-                texts=chunks,
-                embedding=self.embeddings,
+            # Create vector store directory (local build location for remote storage)
+            storage = get_storage()
+            index_name = f"doc_{document_id}"
+            release_index_clients(index_name)  # Drop clients of a removed earlier index
+            if not resume_from and storage.has_prefix(INDEXES, index_name):
+                storage.delete_prefix(INDEXES, index_name)  # Leftovers of an earlier build
+            if not resume_from and storage.has_prefix(INDEXES, partial_index_prefix(document_id)):
+                storage.delete_prefix(INDEXES, partial_index_prefix(document_id))
+            persist_directory = str(storage.build_dir(INDEXES, index_name, resume=resume_from > 0))
+            self._building_dirs[document_id] = persist_directory
+            
+            vectorstore = Chroma(
                 persist_directory=persist_directory,
-                collection_name=f"doc_{document_id}"
+                embedding_function=embeddings,
+                collection_name=f"doc_{document_id}",
+                collection_metadata=collection_metadata
             )
+            if resume_from and (vectorstore._collection.metadata or {}).get("chunking") != profile.chunking:
+                # The partial index was chunked differently (or before chunking was recorded): start over
+                logger.info("Restarting vector store with new chunking", extra={"document_id": document_id})
+                vectorstore.delete_collection()
+                vectorstore = Chroma(
+                    persist_directory=persist_directory,
+                    embedding_function=embeddings,
+                    collection_name=f"doc_{document_id}",
+                    collection_metadata=collection_metadata
+                )
+                resume_from = 0
+            collection = vectorstore._collection
+            self.vector_store_ready = True
             
-            print(f"✅ Vector store created for document {document_id}")
-            return True
+            # Batches may have been written in any order, so ask the collection which chunks it holds
+            written = set()
+            if resume_from:
+                for chunk_id in collection.get(include=[])["ids"]:
+                    index = int(chunk_id.rsplit("-", 1)[1])
+                    if index < len(chunks):
+                        written.add(index)
+            pending = [index for index in range(len(chunks)) if index not in written]
+            done = len(written)
+            if done:
+                logger.info("Resuming vector store", extra={"document_id": document_id, "chunks_done": done})
+            reused = 0
+            embedding_seconds = 0.0
+            if checkpoint is not None:
+                checkpoint(done, len(chunks), reused, embedding_seconds)
+            
+            # Embed and write one checkpoint batch at a time
+            batch_size = min(VECTOR_WRITE_BATCH_SIZE, max(1, batch_size or settings.INGESTION_CHECKPOINT_CHUNKS))
+            wanted: Set[int] = set()
+            next_partial = time.monotonic() + partial_every if partial_every else None
+            partials: List[str] = []
+            while pending:
+                if priority is not None:
+                    wanted.update(priority())
+                indices = _next_batch(pending, pages, wanted, batch_size)
+                chosen = set(indices)
+                pending = [index for index in pending if index not in chosen]
+                batch = [chunks[index] for index in indices]
+                missing = [chunk for chunk in batch if chunk not in reusable]
+                started = time.perf_counter()
+                with track_stage("ingestion", "embed"):
+                    embedded = dict(zip(missing, embeddings.embed_documents(missing))) if missing else {}
+                embedding_seconds += time.perf_counter() - started
+                with track_stage("ingestion", "vector_write"):
+                    collection.upsert(
+                        ids=[f"{document_id}-{index}" for index in indices],
+                        embeddings=[reusable[chunk] if chunk in reusable else embedded[chunk] for chunk in batch],
+                        documents=batch,
+                        metadatas=[{"page": pages[index]} for index in indices],
+                    )
+                CHUNKS_EMBEDDED.inc(len(missing))
+                CHUNKS_REUSED.inc(len(batch) - len(missing))
+                reused += len(batch) - len(missing)
+                done += len(batch)
+                if checkpoint is not None:
+                    checkpoint(done, len(chunks), reused, embedding_seconds)
+                
+                if next_partial is not None and pending and time.monotonic() >= next_partial:
+                    with track_stage("ingestion", "partial_publish"):
+                        partials.append(self._publish_partial(document_id, Path(persist_directory), done))
+                    if on_partial is not None:
+                        on_partial(partials[-1])
+                    if len(partials) > 2:
+                        # Readers that looked up the previous copy may still be opening it
+                        storage.delete_prefix(INDEXES, partials.pop(0))
+                    next_partial = time.monotonic() + partial_every
+            
+            with track_stage("ingestion", "vector_write"):
+                storage.publish_dir(INDEXES, index_name, Path(persist_directory))
+            if storage.has_prefix(INDEXES, partial_index_prefix(document_id)):
+                # Readers still pointed at a copy fall back to the published index
+                storage.delete_prefix(INDEXES, partial_index_prefix(document_id))
             
+            PROFILE_DOCUMENTS.labels(profile.name).inc()
+            PROFILE_EMBEDDING_SECONDS.labels(profile.name).inc(embedding_seconds)
+            logger.info(
+                "Vector store created",
+                extra={"document_id": document_id, "profile": profile.name, "chunks_reused": reused}
+            )
+            return True
+        
         except Exception as e:
-            print(f"❌ Error creating vector store: {e}")
+            logger.exception("Error creating vector store", extra={"document_id": document_id})
+            return False
+        finally:
+            self._building_dirs.pop(document_id, None)
+    
+    def _reusable_vectors(self, document_id: int, version: str) -> Dict[str, List[float]]:
+        """Stored vector of every chunk text in a document's index, if built with embeddings of `version`"""
+        try:
+            index = self.read_vector_store(document_id)
+        except Exception:
+            logger.warning("Could not read index to reuse", extra={"document_id": document_id}, exc_info=True)
+            return {}
+        if index is None or index["metadata"].get("embedding_version") != version:
+            return {}
+        return {text: vector.tolist() for text, vector in zip(index["texts"], index["embeddings"])}
+    
+    def read_vector_store(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Read every chunk of a document's index, in chunk order.
+        
+        Returns:
+            Dictionary with "ids", "texts", "metadatas", "embeddings" (a
+            float32 matrix) and the collection "metadata", or None if the
+            document has no index
+        """
+        import numpy as np
+        
+        vectorstore = self._open_vector_store(document_id, {})
+        if vectorstore is None:
+            return None
+        
+        collection = vectorstore._collection
+        stored = collection.get(include=["documents", "metadatas", "embeddings"])
+        
+        def position(index: int) -> tuple:
+            # Ids are "<document_id>-<n>"; older indexes used random ids
+            suffix = stored["ids"][index].rsplit("-", 1)[-1]
+            return (0, int(suffix), "") if suffix.isdigit() else (1, 0, stored["ids"][index])
+        
+        order = sorted(range(len(stored["ids"])), key=position)
+        return {
+            "ids": [stored["ids"][i] for i in order],
+            "texts": [stored["documents"][i] for i in order],
+            "metadatas": [stored["metadatas"][i] for i in order],
+            "embeddings": np.asarray(stored["embeddings"], dtype=np.float32)[order],
+            "metadata": dict(collection.metadata or {}),
+        }
+    
+    def restore_vector_store(
+        self,
+        document_id: int,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Optional[Dict[str, Any]]],
+        embeddings,
+        metadata: Dict[str, Any]
+    ) -> bool:
+        """
+        Build a document's index from stored chunks and vectors.
+        
+        Nothing is embedded, so this runs at the speed of the vector
+        store writes. An existing index is replaced.
+        
+        Args:
+            document_id: Document identifier
+            ids: Chunk ids
+            texts: Chunk texts
+            metadatas: Chunk metadata (None entries allowed)
+            embeddings: Vectors, one row per chunk
+            metadata: Collection metadata to recreate (embedding version, HNSW parameters)
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        
+        try:
+            storage = get_storage()
+            index_name = f"doc_{document_id}"
+            release_index_clients(index_name)
+            if storage.has_prefix(INDEXES, index_name):
+                storage.delete_prefix(INDEXES, index_name)
+            persist_directory = storage.build_dir(INDEXES, index_name)
+            
+            client = chromadb.PersistentClient(
+                path=str(persist_directory),
+                settings=ChromaSettings(anonymized_telemetry=False)
+            )
+            collection = client.get_or_create_collection(index_name, metadata=metadata or None)
+            for start in range(0, len(ids), VECTOR_WRITE_BATCH_SIZE):
+                end = start + VECTOR_WRITE_BATCH_SIZE
+                with track_stage("ingestion", "vector_write"):
+                    collection.upsert(
+                        ids=ids[start:end],
+                        embeddings=embeddings[start:end],
+                        documents=texts[start:end],
+                        metadatas=[chunk_metadata or None for chunk_metadata in metadatas[start:end]],
+                    )
+            
+            storage.publish_dir(INDEXES, index_name, persist_directory)
+            return True
+        
+        except Exception:
+            logger.exception("Error restoring vector store", extra={"document_id": document_id})
             return False
     
-    def query_document(self, question: str, document_id: int) -> Dict[str, any]:
+    def query_document(
+        self,
+        question: str,
+        document_id: int,
+        history: Optional[List[Dict[str, str]]] = None,
+        conversation_id: Optional[int] = None,
+        deadline: Optional[float] = None,
+        profile: Optional[Union[str, IngestionProfile]] = None,
+        page_range: Optional[Tuple[int, int]] = None,
+        partial_index: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Query a document using RAG.
         
+        Up to the profile's retrieval_k candidates are retrieved and
+        select_chunks() decides how many go into the prompt, so questions
+        with one clear answer send a few chunks and broad ones send more.
+        The question is embedded with the profile's embedding backend.
+        
+        Within a conversation, chunks retrieved for earlier questions are
+        scored against the new question first. When enough of them are
+        still relevant the vector store is skipped ("reused"); otherwise a
+        smaller search tops them up ("extended"). Without usable cached
+        chunks a full search runs ("fresh"). A `page_range` restricts the
+        search to chunks of those pages and always searches fresh.
+        
+        The answer comes from the model picked by llm_router.choose_route();
+        if the fast route fails, the question is retried on the large model.
+        The LLM gets whatever is left of the deadline minus
+        CHAT_FALLBACK_RESERVE_SECONDS. When it runs out of time or fails,
+        the answer falls back to the retrieved sentences most similar to
+        the question ("fallback" says why) instead of an error.
+        
         Args:
             question: User's question
             document_id: Document to query
-            
+            history: Earlier turns as {"role", "content"} dicts, oldest first
+            conversation_id: Conversation whose retrieved chunks may be reused
+            deadline: time.monotonic() by which to answer (default
+                CHAT_DEADLINE_SECONDS from now)
+            profile: Ingestion profile the document was indexed with (see
+                indexed_profile()), or its name to resolve from settings
+            page_range: (first, last) page numbers to search, inclusive
+            partial_index: Published partial copy to search while another
+                process builds the index (Document.partial_index)
+        
         Returns:
-            Dictionary with answer and metadata
+            Dictionary with answer and metadata, including per-stage
+            "timings" in seconds (context_reuse, collection_open, embed,
+            search, context_build, llm_call), the "retrieved" chunk ids and
+            scores, the "retrieval" mode, why retrieval stopped
+            ("retrieval_cutoff"), "llm" usage with the model route taken
+            ("route", "route_reason") and "fallback" ("timeout", "error" or
+            None for a generated answer)
         """
+        if deadline is None:
+            deadline = time.monotonic() + settings.CHAT_DEADLINE_SECONDS
+        ingestion_profile = profile if isinstance(profile, IngestionProfile) else get_profile(profile)
+        max_k = ingestion_profile.retrieval_k
+        timings = {}
         try:
-            # Load vector store
-            persist_directory = os.path.join(settings.CHROMA_DB_DIR, f"doc_{document_id}")
-            
-            if not os.path.exists(persist_directory):
-                return {
-                    "answer": "Document not found or not processed yet.",
-                    "success": False,
-                    "sources": []
+            embeddings = self.embeddings_for(ingestion_profile.embedding_backend)
+            
+            # Embed the question, then search by vector
+            with track_stage("chat", "embed", timings):
+                query_embedding = embeddings.embed_query(question)
+            
+            # Chunks from earlier turns that are still relevant to this question
+            reusable = []
+            if conversation_id is not None and page_range is None:
+                with track_stage("chat", "context_reuse", timings):
+                    reusable = [
+                        chunk for chunk in conversation_cache.score(conversation_id, document_id, query_embedding)
+                        if chunk["score"] >= settings.CONVERSATION_REUSE_MIN_SCORE
+                    ][:max_k]
+            
+            if len(reusable) >= min(settings.CONVERSATION_REUSE_MIN_CHUNKS, max_k):
+                retrieval = "reused"
+                candidates = reusable
+            else:
+                retrieval = "extended" if reusable else "fresh"
+                vectorstore = self._open_vector_store(document_id, timings, partial_index)
+                if vectorstore is None:
+                    return {
+                        "answer": "Document not found or not processed yet.",
+                        "success": False,
+                        "sources": []
+                    }
+                
+                with track_stage("chat", "search", timings):
+                    found = self._search(
+                        vectorstore,
+                        query_embedding,
+                        k=max_k - len(reusable),
+                        include_embeddings=conversation_id is not None,
+                        page_range=page_range
+                    )
+                reused_ids = {chunk["id"] for chunk in reusable}
+                candidates = reusable + [chunk for chunk in found if chunk["id"] not in reused_ids]
+                candidates.sort(key=lambda chunk: chunk["score"], reverse=True)
+            
+            if conversation_id is not None:
+                conversation_cache.remember(conversation_id, document_id, candidates)
+            
+            retrieved, cutoff = select_chunks(candidates, max_k=max_k)
+            RETRIEVED_CHUNKS.observe(len(retrieved))
+            
+            # Prepare context from retrieved chunks
+            with track_stage("chat", "context_build", timings):
+                context = "\n\n".join([_with_page(chunk) for chunk in retrieved])
+                prompt = self._build_prompt(context, question, history)
+            
+            # Small model for confident lookups, large model for the rest
+            prompt_tokens = estimate_tokens(prompt)
+            top_score = retrieved[0]["score"] if retrieved else None
+            route, route_reason = choose_route(question, prompt_tokens, top_score)
+            route_recorder.decision(
+                route,
+                route_reason,
+                question_type=question_type(question),
+                question_words=len(question.split()),
+                prompt_tokens=prompt_tokens,
+                top_score=top_score,
+            )
+            
+            # Query Groq AI
+            chat_completion, fallback = None, None
+            while chat_completion is None and fallback is None:
+                try:
+                    chat_completion = self._complete(prompt, route, timings, deadline)
+                except TimeoutError:
+                    logger.warning("LLM missed the chat deadline", extra={"document_id": document_id, "route": route.name})
+                    fallback = "timeout"
+                except Exception:
+                    if route.name == LARGE:
+                        logger.exception("LLM call failed", extra={"document_id": document_id})
+                        fallback = "error"
+                    else:
+                        # The small model is an optimization; never fail a question because of it
+                        logger.warning("Fast LLM route failed, retrying on the large model", exc_info=True)
+                        route, route_reason = get_route(LARGE), "fast_failed"
+                        route_recorder.decision(route, route_reason)
+            
+            usage = None
+            if fallback is None:
+                answer = chat_completion.choices[0].message.content
+                usage = chat_completion.usage
+                if usage is not None:
+                    LLM_TOKENS.labels("prompt").inc(usage.prompt_tokens)
+                    LLM_TOKENS.labels("completion").inc(usage.completion_tokens)
+                CHAT_ANSWERS.labels("generated").inc()
+            else:
+                with track_stage("chat", "fallback", timings):
+                    answer = self._fallback_answer(query_embedding, retrieved, fallback, embeddings)
+                CHAT_ANSWERS.labels("fallback").inc()
+                CHAT_FALLBACKS.labels(fallback).inc()
+            
+            # Extract source information
+            sources = [f"Chunk {i+1}" for i in range(len(retrieved))]
+            
+            return {
+                "answer": answer,
+                "success": True,
+                "sources": sources,
+                "context_used": len(retrieved),
+                "timings": timings,
+                "retrieval": retrieval,
+                "retrieval_cutoff": cutoff,
+                "fallback": fallback,
+                "retrieved": [
+                    {"id": chunk["id"], "score": chunk["score"]} for chunk in retrieved
+                ],
+                "llm": {
+                    "model": route.model,
+                    "route": route.name,
+                    "route_reason": route_reason,
+                    "latency_ms": round(timings.get("llm_call", 0.0) * 1000, 2),
+                    "prompt_tokens": usage.prompt_tokens if usage is not None else None,
+                    "completion_tokens": usage.completion_tokens if usage is not None else None,
                 }
+            }
+        
+        except Exception:
+            # The exception is logged here and not returned: answers reach clients
+            logger.exception("Error querying document", extra={"document_id": document_id})
+            return {
+                "answer": "Error processing question. Please try again later.",
+                "success": False,
+                "sources": [],
+                "timings": timings
+            }
+    
+    def _complete(self, prompt: str, route: LLMRoute, timings: Dict[str, float], deadline: float):
+        """
+        Send the prompt to the route's model and record the call's latency.
+        
+        The call may run until CHAT_FALLBACK_RESERVE_SECONDS before the
+        deadline.
+        
+        Raises:
+            TimeoutError: If the deadline leaves no time or the call times out
+        """
+        from groq import APITimeoutError
+        
+        timeout = deadline - time.monotonic() - settings.CHAT_FALLBACK_RESERVE_SECONDS
+        if timeout <= 0:
+            raise TimeoutError("No time left for the LLM call")
+        
+        try:
+            with track_stage("chat", "llm_call", timings):
+                chat_completion = self.groq_client.chat.completions.create(
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": prompt,
+                        }
+                    ],
+                    model=route.model,
+                    temperature=route.temperature,
+                    max_tokens=route.max_tokens,
+                    timeout=timeout,
+                )
+        except APITimeoutError as e:
+            raise TimeoutError(f"LLM call exceeded {timeout:.1f}s") from e
+        route_recorder.latency(route, timings["llm_call"])
+        return chat_completion
+    
+    def _fallback_answer(
+        self,
+        query_embedding: List[float],
+        retrieved: List[Dict[str, Any]],
+        reason: str,
+        embeddings
+    ) -> str:
+        """Extractive answer: the retrieved sentences most similar to the question"""
+        sentences = rank_sentences(
+            query_embedding,
+            retrieved,
+            embeddings.embed_documents,
+            settings.CHAT_FALLBACK_SENTENCES,
+            settings.CHAT_FALLBACK_MAX_CANDIDATES
+        )
+        if not sentences:
+            return "The answer could not be generated, and no relevant passages were found in the document."
+        return _FALLBACK_INTROS[reason] + "\n\n" + "\n".join(f"- {sentence}" for sentence in sentences)
+    
+    def _publish_partial(self, document_id: int, persist_directory: Path, done: int) -> str:
+        """Publish a copy of a partial index for other processes, returning its name"""
+        storage = get_storage()
+        name = f"{partial_index_prefix(document_id)}/{done}"
+        directory = storage.build_dir(INDEXES, name)
+        # Taken between batches, when the builder writes nothing
+        shutil.copytree(persist_directory, directory, dirs_exist_ok=True)
+        storage.publish_dir(INDEXES, name, directory)
+        return name
+    
+    def _open_vector_store(self, document_id: int, timings: Dict[str, float], partial_index: Optional[str] = None):
+        """
+        Open a document's Chroma collection.
+        
+        Args:
+            document_id: Document to open
+            timings: Stage timings to add the open to
+            partial_index: The document's partial_index while it is still
+                being built (searched unless this process builds it)
+        
+        Returns:
+            Chroma vector store, or None if the document has no index
+        """
+        from langchain_community.vectorstores import Chroma
+        
+        # Load vector store (fetched into the local cache for remote storage)
+        with track_stage("chat", "collection_open", timings):
+            storage = get_storage()
+            persist_directory = self._building_dirs.get(document_id)
+            if persist_directory is None and partial_index:
+                # Built by another process: search its latest published copy
+                persist_directory = storage.local_dir(INDEXES, partial_index)
+                if persist_directory is not None:
+                    _release_partial_clients(document_id, keep=Path(persist_directory))
+            if persist_directory is None:
+                # Published (the build may have just finished and removed its copies)
+                persist_directory = storage.local_dir(INDEXES, f"doc_{document_id}")
+                if persist_directory is not None and partial_index:
+                    _release_partial_clients(document_id, keep=Path(persist_directory))
+            if persist_directory is None:
+                return None
             
             vectorstore = Chroma(
-                persist_directory=persist_directory,
+                persist_directory=str(persist_directory),
                 embedding_function=self.embeddings,
                 collection_name=f"doc_{document_id}"
             )
-            
-            # # Retrieve relevant chunks
-            # retriever = vectorstore.as_retriever(
-            #     search_type="similarity",
-            #     search_kwargs={"k": 3}  # Get top 3 most relevant chunks
-            # )
-            
-            # relevant_docs = retriever.get_relevant_documents(question)
-            relevant_docs = vectorstore.similarity_search(question, k=8)
+            self.vector_store_ready = True
+            return vectorstore
+    
+    def _search(
+        self,
+        vectorstore,
+        query_embedding: List[float],
+        k: int,
+        include_embeddings: bool = False,
+        page_range: Optional[Tuple[int, int]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Nearest-neighbour search on a Chroma collection.
+        
+        Args:
+            vectorstore: Chroma vector store to search
+            query_embedding: Embedded question
+            k: Number of chunks to return
+            include_embeddings: Also return each chunk's stored embedding
+            page_range: Only chunks of these pages (first, last; inclusive)
+        
+        Returns:
+            Chunks ordered by relevance, each with id, text, metadata,
+            raw distance and a similarity score (higher is better)
+        """
+        collection = vectorstore._collection
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        result = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=k,
+            where=_page_filter(page_range) if page_range is not None else None,
+            include=include,
+        )
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        embeddings = result["embeddings"][0] if include_embeddings else [None] * len(result["ids"][0])
+        
+        return [
+            {
+                "id": chunk_id,
+                "text": text,
+                "metadata": metadata or {},
+                "distance": distance,
+                "score": round(similarity_from_distance(distance, space), 4),
+                "embedding": embedding,
+            }
+            for chunk_id, text, metadata, distance, embedding in zip(
+                result["ids"][0],
+                result["documents"][0],
+                result["metadatas"][0],
+                result["distances"][0],
+                embeddings,
+            )
+        ]
+    
+    def _build_prompt(self, context: str, question: str, history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Build the grounded-answer prompt sent to the LLM"""
+        conversation = ""
+        if history:
+            turns = "\n".join(
+                f"{'User' if message['role'] == 'user' else 'Assistant'}: {message['content']}"
+                for message in history
+            )
+            conversation = f"""Conversation so far (use it to resolve follow-up questions):
+{turns}
 
-            
-            # Prepare context from retrieved documents
-            context = "\n\n".join([doc.page_content for doc in relevant_docs])
-            
-            # Create prompt for Groq
-            prompt = f"""You are a helpful AI assistant. Answer the question based on the provided context from the document.
+"""
+        return f"""You are a helpful AI assistant. Answer the question based on the provided context from the document.
 
-Context from document:
+{conversation}Context from document:
 {context}
 
 Question: {question}
@@ -125,38 +1047,38 @@ Instructions:
 
 Answer:"""
 
-            # Query Groq AI
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model=settings.GROQ_MODEL,
-                temperature=0.9,
-                max_tokens=1000,
-            )
-            
-            answer = chat_completion.choices[0].message.content
-            
-            # Extract source information
-            sources = [f"Chunk {i+1}" for i in range(len(relevant_docs))]
-            
-            return {
-                "answer": answer,
-                "success": True,
-                "sources": sources,
-                "context_used": len(relevant_docs)
-            }
-            
-        except Exception as e:
-            print(f"❌ Error querying document: {e}")
-            return {
-                "answer": f"Error processing question: {str(e)}",
-                "success": False,
-                "sources": []
-            }
+    def is_building(self, document_id: int) -> bool:
+        """
+        True while this process builds a document's index.
+        
+        Only the building process can search a partial index: Chroma
+        clients of other processes would load it once and never see the
+        chunks written after that.
+        """
+        return document_id in self._building_dirs
+    
+    def wait_for_pages(self, document_id: int, page_range: Tuple[int, int], timeout: float) -> bool:
+        """
+        Wait until the index this process is building holds chunks of a page range.
+        
+        Args:
+            document_id: Document being indexed
+            page_range: (first, last) page numbers, inclusive
+            timeout: Most seconds to wait
+        
+        Returns:
+            True once chunks of those pages are searchable or the build has
+            ended, False if the timeout passed first
+        """
+        vectorstore = self._open_vector_store(document_id, {})
+        stop = time.monotonic() + timeout
+        while vectorstore is not None and self.is_building(document_id):
+            if vectorstore._collection.get(where=_page_filter(page_range), limit=1, include=[])["ids"]:
+                return True
+            if time.monotonic() >= stop:
+                return False
+            time.sleep(0.1)
+        return True
     
     def delete_vector_store(self, document_id: int) -> bool:
         """
@@ -164,27 +1086,47 @@ Answer:"""
         
         Args:
             document_id: Document identifier
-            
+        
         Returns:
             True if successful, False otherwise
         """
         try:
-            import shutil
-            persist_directory = os.path.join(settings.CHROMA_DB_DIR, f"doc_{document_id}")
+            storage = get_storage()
+            index_name = f"doc_{document_id}"
+            release_index_clients(index_name)
+            if storage.has_prefix(INDEXES, partial_index_prefix(document_id)):
+                storage.delete_prefix(INDEXES, partial_index_prefix(document_id))
             
-            if os.path.exists(persist_directory):
-                shutil.rmtree(persist_directory)
-                print(f"✅ Deleted vector store for document {document_id}")
+            if storage.has_prefix(INDEXES, index_name):
+                storage.delete_prefix(INDEXES, index_name)
+                logger.info("Deleted vector store", extra={"document_id": document_id})
                 return True
             return False
-            
+        
         except Exception as e:
-            print(f"❌ Error deleting vector store: {e}")
+            logger.exception("Error deleting vector store", extra={"document_id": document_id})
             return False
 
 
-# Global RAG service instance
-rag_service = RAGService()
+# Global RAG service instance, created on first use
+_rag_service: Optional[RAGService] = None
+_rag_service_lock = threading.Lock()
+
+
+def get_rag_service() -> RAGService:
+    """
+    Get the global RAG service instance.
+    
+    Returns:
+        Shared RAGService (created lazily; models load on first use)
+    """
+    global _rag_service
+    
+    if _rag_service is None:
+        with _rag_service_lock:
+            if _rag_service is None:
+                _rag_service = RAGService()
+    return _rag_service
 
 
 # # Test the RAG service
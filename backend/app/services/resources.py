@@ -0,0 +1,226 @@
+"""
+CPU budgets per workload class.
+
+Embedding (torch / ONNX Runtime intra-op threads), PDF extraction,
+password hashing and request handling all compete for the same cores.
+Left alone, each library sizes itself to the whole machine: torch starts
+one thread per core for every calling thread, the request threadpool
+allows 40 threads, and an ingestion burst can run that many extractions
+at once. The budgets below give each class an explicit share, derived
+from CPU_BUDGET_CORES unless set individually, and apply_resource_budgets()
+enforces them at startup.
+
+Budgets are per worker process: with several uvicorn workers on a node,
+set CPU_BUDGET_CORES to that node's cores divided by the worker count.
+"""
+import logging
+import os
+import sys
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.metrics import RESOURCE_BUDGET, RESOURCE_IN_USE
+
+logger = logging.getLogger(__name__)
+
+# Thread-count variables read by OpenMP/BLAS runtimes when they are loaded
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+@dataclass(frozen=True)
+class CpuBudget:
+    """Thread and process budgets of one worker process"""
+    cores: int
+    embedding_threads: int
+    extraction_slots: int
+    hashing_processes: int
+    request_threads: int
+
+
+def available_cores() -> int:
+    """CPUs this process may run on (respects affinity masks and cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def compute_budget(cores: Optional[int] = None) -> CpuBudget:
+    """
+    Work out the budget of each workload class.
+    
+    Explicit settings win; otherwise embedding gets half the cores,
+    extraction a quarter, and the request threadpool two threads per core
+    (at least 16, since most request threads wait on the LLM or the
+    database rather than burn CPU). Hashing processes never exceed the cores.
+    
+    Args:
+        cores: Cores to divide up (defaults to CPU_BUDGET_CORES, then available_cores())
+    
+    Returns:
+        CpuBudget for this process
+    """
+    cores = max(1, cores or settings.CPU_BUDGET_CORES or available_cores())
+    return CpuBudget(
+        cores=cores,
+        embedding_threads=settings.EMBEDDING_THREADS or max(1, cores // 2),
+        extraction_slots=settings.EXTRACTION_SLOTS or max(1, cores // 4),
+        hashing_processes=min(max(0, settings.BCRYPT_POOL_SIZE), cores),
+        request_threads=settings.REQUEST_THREADS or max(16, cores * 2),
+    )
+
+
+class WorkloadSlots:
+    """
+    Bounded number of concurrent jobs of one workload class.
+    
+    Used as a context manager around CPU-heavy work that runs on request
+    or worker threads; callers beyond the budget block until a slot frees up.
+    """
+    
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+    
+    def __enter__(self):
+        with self._lock:
+            self._waiting += 1
+        self._semaphore.acquire()
+        with self._lock:
+            self._waiting -= 1
+            self._active += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self._active -= 1
+        self._semaphore.release()
+    
+    @property
+    def active(self) -> int:
+        return self._active
+    
+    def stats(self) -> dict:
+        """Current occupancy of the slots"""
+        with self._lock:
+            return {"limit": self.limit, "in_use": self._active, "waiting": self._waiting}
+
+
+_budget: Optional[CpuBudget] = None
+_budget_lock = threading.Lock()
+
+
+def cpu_budget() -> CpuBudget:
+    """Get (lazily computing) the budget of this process"""
+    global _budget
+    
+    if _budget is None:
+        with _budget_lock:
+            if _budget is None:
+                _budget = compute_budget()
+    return _budget
+
+
+# Global extraction slots (one set per worker process)
+extraction_slots = WorkloadSlots("extraction", cpu_budget().extraction_slots)
+
+
+def embedding_threads() -> int:
+    """Intra-op threads for the embedding model"""
+    return cpu_budget().embedding_threads
+
+
+def limit_torch_threads(threads: Optional[int] = None):
+    """Apply the embedding budget (or `threads`) to torch if it has been imported"""
+    threads = threads or embedding_threads()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.get_num_threads() != threads:
+        torch.set_num_threads(threads)
+
+
+def _request_limiter():
+    """The threadpool limiter sync routes and run_in_threadpool draw from (event loop only)"""
+    from anyio.to_thread import current_default_thread_limiter
+    
+    return current_default_thread_limiter()
+
+
+def apply_resource_budgets():
+    """
+    Apply the CPU budgets to this process.
+    Call this from the event loop on application startup, before the
+    embedding model is loaded.
+    
+    - OpenMP/BLAS thread variables are set to the embedding budget unless
+      already set, so torch picks them up when it is imported
+    - torch, if already imported, is limited right away
+    - the request threadpool is resized to the request budget
+    """
+    from app.services.auth import password_pool_stats
+    
+    budget = cpu_budget()
+    for name in _THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(budget.embedding_threads))
+    limit_torch_threads()
+    limiter = _request_limiter()
+    limiter.total_tokens = budget.request_threads
+    
+    for workload, limit in (
+        ("embedding", budget.embedding_threads),
+        ("extraction", budget.extraction_slots),
+        ("hashing", budget.hashing_processes),
+        ("request", budget.request_threads),
+    ):
+        RESOURCE_BUDGET.labels(workload).set(limit)
+    RESOURCE_IN_USE.labels("extraction").set_function(lambda: extraction_slots.active)
+    RESOURCE_IN_USE.labels("hashing").set_function(lambda: password_pool_stats()["in_flight"])
+    RESOURCE_IN_USE.labels("request").set_function(lambda: limiter.borrowed_tokens)
+    
+    logger.info("Applied CPU budgets", extra=asdict(budget))
+
+
+def _os_thread_count() -> Optional[int]:
+    """Threads of this process as seen by the kernel (Linux only)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def resource_stats() -> Dict[str, Any]:
+    """
+    Budgets and current usage of each workload class for health reporting.
+    Call this from the event loop (it reads the request threadpool limiter).
+    """
+    from app.services.auth import password_pool_stats
+    
+    budget = cpu_budget()
+    limiter = _request_limiter()
+    torch = sys.modules.get("torch")
+    hashing = password_pool_stats()
+    
+    return {
+        "cores": budget.cores,
+        "embedding": {
+            "limit": budget.embedding_threads,
+            "torch_threads": torch.get_num_threads() if torch is not None else None,
+        },
+        "extraction": extraction_slots.stats(),
+        "hashing": {"limit": budget.hashing_processes, "in_use": hashing["in_flight"]},
+        "request": {
+            "limit": int(limiter.total_tokens),
+            "in_use": limiter.borrowed_tokens,
+            "waiting": limiter.statistics().tasks_waiting,
+        },
+        "process_threads": _os_thread_count() or threading.active_count(),
+    }
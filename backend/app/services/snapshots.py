@@ -0,0 +1,500 @@
+"""
+Portable vector index snapshots.
+
+A snapshot holds every indexed document's chunk texts, chunk metadata
+and embedding vectors, so a new node (or one that lost its disk) can
+rebuild its indexes without running the embedding model:
+
+    python -m app.services.snapshots export /backups/snap-2024-06-01
+    python -m app.services.snapshots verify /backups/snap-2024-06-01
+    python -m app.services.snapshots import /backups/snap-2024-06-01 --workers 8
+
+Layout (format version 1):
+
+    manifest.json       format, version, vector dtype and dimension, totals,
+                        and per shard its file name, size, SHA-256 and counts
+    shard-00000.zip     one ZIP per shard (about --shard-mb of data each):
+        documents.json      document id, filename, embedding version,
+                            collection metadata, first chunk and chunk count
+        vectors.npy         (chunks, dimension) float32 or float16, stored
+        ids.bin             chunk ids, UTF-8, concatenated (deflated)
+        texts.bin           chunk texts, UTF-8, concatenated (deflated)
+        metadatas.bin       chunk metadata as JSON, concatenated (deflated)
+        *.offsets.npy       int64 offsets into the matching .bin column
+
+Export and import handle one shard at a time, so memory stays bounded by
+the shard size whatever the corpus size. Import checks each shard's
+checksum before use, then restores documents in parallel straight into
+Chroma. Only documents whose row exists on this node (same id and
+filename, not deleted) are restored; database rows themselves are not
+part of the snapshot.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import or_
+
+from app.database import SessionLocal
+from app.models.document import Document, STATUS_READY
+from app.services.ingestion import set_status
+from app.services.rag_service import get_rag_service, is_compatible_index
+from app.services.resources import cpu_budget
+from app.services.storage import get_storage, INDEXES
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "docassist-index-snapshot"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+
+# Bytes hashed per read when verifying shards
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class SnapshotError(Exception):
+    """The snapshot is missing, unreadable or from an unsupported format"""
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_array(archive: zipfile.ZipFile, name: str, array: np.ndarray):
+    """Write an .npy member without compression (vectors barely compress)"""
+    with archive.open(zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0)), "w", force_zip64=True) as f:
+        np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+
+
+def _write_strings(archive: zipfile.ZipFile, name: str, values: List[str]):
+    """Write a string column as one deflated UTF-8 blob plus int64 offsets"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    archive.writestr(f"{name}.bin", b"".join(encoded), compress_type=zipfile.ZIP_DEFLATED)
+    _write_array(archive, f"{name}.offsets.npy", offsets)
+
+
+def _read_array(archive: zipfile.ZipFile, name: str) -> np.ndarray:
+    return np.lib.format.read_array(io.BytesIO(archive.read(name)), allow_pickle=False)
+
+
+def _read_strings(archive: zipfile.ZipFile, name: str) -> List[str]:
+    blob = archive.read(f"{name}.bin")
+    offsets = _read_array(archive, f"{name}.offsets.npy")
+    return [blob[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+class _ShardWriter:
+    """Buffers documents and writes them out as shards of about `shard_bytes`"""
+    
+    def __init__(self, directory: Path, shard_bytes: int, dtype: np.dtype):
+        self.directory = directory
+        self.shard_bytes = shard_bytes
+        self.dtype = dtype
+        self.dimension: Optional[int] = None
+        self.shards: List[Dict[str, Any]] = []
+        self._reset()
+    
+    def _reset(self):
+        self._documents: List[Dict[str, Any]] = []
+        self._vectors: List[np.ndarray] = []
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[str] = []
+        self._buffered = 0
+    
+    def add(self, entry: Dict[str, Any], index: Dict[str, Any]):
+        """Buffer one document's chunks, writing a shard once enough has accumulated"""
+        vectors = index["embeddings"]
+        if len(vectors):
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+            elif vectors.shape[1] != self.dimension:
+                raise SnapshotError(
+                    f"Document {entry['document_id']} has {vectors.shape[1]}-dimensional vectors, "
+                    f"expected {self.dimension}"
+                )
+        
+        self._documents.append({**entry, "start": len(self._ids), "count": len(index["ids"])})
+        self._vectors.append(vectors.astype(self.dtype, copy=False))
+        self._ids.extend(index["ids"])
+        self._texts.extend(index["texts"])
+        self._metadatas.extend(json.dumps(metadata or {}) for metadata in index["metadatas"])
+        self._buffered += vectors.nbytes + sum(len(text) for text in index["texts"])
+        if self._buffered >= self.shard_bytes:
+            self.flush()
+    
+    def flush(self):
+        """Write buffered documents as the next shard"""
+        if not self._documents:
+            return
+        
+        name = f"shard-{len(self.shards):05d}.zip"
+        path = self.directory / name
+        vectors = (
+            np.concatenate([v for v in self._vectors if len(v)])
+            if any(len(v) for v in self._vectors)
+            else np.zeros((0, self.dimension or 0), dtype=self.dtype)
+        )
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            archive.writestr("documents.json", json.dumps(self._documents), compress_type=zipfile.ZIP_DEFLATED)
+            _write_array(archive, "vectors.npy", vectors)
+            _write_strings(archive, "ids", self._ids)
+            _write_strings(archive, "texts", self._texts)
+            _write_strings(archive, "metadatas", self._metadatas)
+        
+        self.shards.append({
+            "file": name,
+            "bytes": path.stat().st_size,
+            "sha256": _sha256(path),
+            "documents": len(self._documents),
+            "chunks": len(self._ids),
+        })
+        logger.info("Wrote snapshot shard", extra=self.shards[-1])
+        self._reset()
+
+
+def export_snapshot(
+    output_dir: str,
+    document_ids: Optional[List[int]] = None,
+    shard_bytes: int = DEFAULT_SHARD_BYTES,
+    float16: bool = False
+) -> Dict[str, Any]:
+    """
+    Write the indexes of all ready documents to a snapshot directory.
+    
+    Args:
+        output_dir: Directory to create (must not already hold a snapshot)
+        document_ids: Only export these documents
+        shard_bytes: Approximate uncompressed bytes per shard
+        float16: Store vectors as float16 (half the size, tiny loss of precision)
+    
+    Returns:
+        Counts of "documents", "chunks", "shards", total "bytes", documents
+        "skipped" for lack of an index, and "seconds"
+    
+    Raises:
+        SnapshotError: If the directory already holds a snapshot
+    """
+    started = time.perf_counter()
+    directory = Path(output_dir)
+    if (directory / MANIFEST).exists():
+        raise SnapshotError(f"{directory} already contains a snapshot")
+    directory.mkdir(parents=True, exist_ok=True)
+    
+    dtype = np.dtype(np.float16 if float16 else np.float32)
+    writer = _ShardWriter(directory, max(1, shard_bytes), dtype)
+    rag_service = get_rag_service()
+    skipped = 0
+    
+    db = SessionLocal()
+    try:
+        query = db.query(Document.id, Document.filename, Document.embedding_version).filter(
+            Document.deleted_at.is_(None),
+            Document.vector_store_id.isnot(None),
+            or_(Document.status.is_(None), Document.status == STATUS_READY)
+        )
+        if document_ids:
+            query = query.filter(Document.id.in_(document_ids))
+        rows = query.order_by(Document.id).all()
+    finally:
+        db.close()
+    
+    for document_id, filename, version in rows:
+        index = rag_service.read_vector_store(document_id)
+        if index is None:
+            skipped += 1
+            logger.warning("Document has no index, not exported", extra={"document_id": document_id})
+            continue
+        writer.add(
+            {
+                "document_id": document_id,
+                "filename": filename,
+                "embedding_version": index["metadata"].get("embedding_version", version),
+                "metadata": index["metadata"],
+            },
+            index
+        )
+    writer.flush()
+    
+    manifest = {
+        "format": FORMAT,
+        "version": FORMAT_VERSION,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "dtype": dtype.name,
+        "dimension": writer.dimension,
+        "documents": sum(shard["documents"] for shard in writer.shards),
+        "chunks": sum(shard["chunks"] for shard in writer.shards),
+        "shards": writer.shards,
+    }
+    # Manifest last, so a partial export is never mistaken for a snapshot
+    staging = directory / (MANIFEST + ".tmp")
+    with open(staging, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging, directory / MANIFEST)
+    
+    report = {
+        "documents": manifest["documents"],
+        "chunks": manifest["chunks"],
+        "shards": len(writer.shards),
+        "bytes": sum(shard["bytes"] for shard in writer.shards),
+        "skipped": skipped,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    logger.info("Exported snapshot", extra=report)
+    return report
+
+
+def read_manifest(snapshot_dir: str) -> Dict[str, Any]:
+    """
+    Load and check a snapshot's manifest.
+    
+    Raises:
+        SnapshotError: If there is no manifest or its format is not supported
+    """
+    path = Path(snapshot_dir) / MANIFEST
+    if not path.exists():
+        raise SnapshotError(f"No snapshot manifest in {snapshot_dir}")
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT or manifest.get("version") != FORMAT_VERSION:
+        raise SnapshotError(
+            f"Unsupported snapshot format {manifest.get('format')} v{manifest.get('version')}"
+        )
+    return manifest
+
+
+def _load_shard(snapshot_dir: Path, shard: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Read one shard into memory after checking its size and checksum.
+    
+    Raises:
+        SnapshotError: If the shard is missing or corrupt
+    """
+    path = snapshot_dir / shard["file"]
+    try:
+        data = path.read_bytes()
+    except OSError as e:
+        raise SnapshotError(f"Cannot read {shard['file']}: {e}")
+    if len(data) != shard["bytes"] or hashlib.sha256(data).hexdigest() != shard["sha256"]:
+        raise SnapshotError(f"Checksum mismatch in {shard['file']}")
+    
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        documents = json.loads(archive.read("documents.json"))
+        columns = {
+            "vectors": _read_array(archive, "vectors.npy"),
+            "ids": _read_strings(archive, "ids"),
+            "texts": _read_strings(archive, "texts"),
+            "metadatas": [json.loads(value) for value in _read_strings(archive, "metadatas")],
+        }
+    return documents, columns
+
+
+def _iter_shards(snapshot_dir: str, manifest: Dict[str, Any], report: Dict[str, Any]) -> Iterator[tuple]:
+    """Yield (documents, columns) per readable shard, counting corrupt ones in `report`"""
+    for shard in manifest["shards"]:
+        try:
+            yield _load_shard(Path(snapshot_dir), shard)
+        except (SnapshotError, zipfile.BadZipFile, ValueError, KeyError) as e:
+            report["corrupt_shards"] += 1
+            logger.error("Skipping unreadable snapshot shard", extra={"shard": shard["file"], "error": str(e)})
+
+
+def verify_snapshot(snapshot_dir: str) -> Dict[str, Any]:
+    """
+    Check every shard's checksum and columns without touching the database.
+    
+    Returns:
+        Counts of "shards", "documents", "chunks" and "corrupt_shards"
+    """
+    manifest = read_manifest(snapshot_dir)
+    report = {"shards": len(manifest["shards"]), "documents": 0, "chunks": 0, "corrupt_shards": 0}
+    for documents, columns in _iter_shards(snapshot_dir, manifest, report):
+        lengths = {len(columns["vectors"]), len(columns["ids"]), len(columns["texts"]), len(columns["metadatas"])}
+        if len(lengths) != 1:
+            report["corrupt_shards"] += 1
+            continue
+        report["documents"] += len(documents)
+        report["chunks"] += len(columns["ids"])
+    return report
+
+
+def _restore_document(entry: Dict[str, Any], columns: Dict[str, Any]) -> bool:
+    """Worker: write one document's chunks into a fresh index and mark it ready"""
+    start, end = entry["start"], entry["start"] + entry["count"]
+    document_id = entry["document_id"]
+    restored = get_rag_service().restore_vector_store(
+        document_id,
+        columns["ids"][start:end],
+        columns["texts"][start:end],
+        columns["metadatas"][start:end],
+        columns["vectors"][start:end].astype(np.float32, copy=False),
+        entry["metadata"],
+    )
+    if restored:
+        set_status(
+            document_id,
+            STATUS_READY,
+            vector_store_id=f"doc_{document_id}",
+            embedding_version=entry["embedding_version"],
+            chunks_total=entry["count"],
+            chunks_embedded=entry["count"],
+            status_error=None,
+        )
+    return restored
+
+
+def _restorable_documents(overwrite: bool) -> Tuple[Dict[int, str], Set[int]]:
+    """Filenames of live documents on this node, and the ids that already have an index"""
+    storage = get_storage()
+    db = SessionLocal()
+    try:
+        rows = db.query(Document.id, Document.filename, Document.vector_store_id).filter(
+            Document.deleted_at.is_(None)
+        ).all()
+    finally:
+        db.close()
+    
+    filenames = {document_id: filename for document_id, filename, _ in rows}
+    indexed = set() if overwrite else {
+        document_id for document_id, _, vector_store_id in rows
+        if vector_store_id and storage.has_prefix(INDEXES, f"doc_{document_id}")
+    }
+    return filenames, indexed
+
+
+def import_snapshot(snapshot_dir: str, workers: Optional[int] = None, overwrite: bool = False) -> Dict[str, Any]:
+    """
+    Restore document indexes from a snapshot, without the embedding model.
+    
+    Shards are verified and read one at a time; their documents are
+    restored by `workers` threads. A document is restored when its row
+    exists here with the same filename and is not deleted, its index was
+    built with a compatible embedding model, and (unless `overwrite`) it
+    has no index yet.
+    
+    Args:
+        snapshot_dir: Directory written by export_snapshot()
+        workers: Parallel restores (defaults to the CPU budget's cores)
+        overwrite: Replace indexes that already exist
+    
+    Returns:
+        Counts of "restored", "skipped_existing", "skipped_missing"
+        (no matching row), "incompatible", "errors", "corrupt_shards",
+        "chunks" restored and "seconds"
+    
+    Raises:
+        SnapshotError: If the manifest is missing or unsupported
+    """
+    started = time.perf_counter()
+    manifest = read_manifest(snapshot_dir)
+    workers = max(1, workers or cpu_budget().cores)
+    filenames, indexed = _restorable_documents(overwrite)
+    report = {
+        "restored": 0, "skipped_existing": 0, "skipped_missing": 0, "incompatible": 0,
+        "errors": 0, "corrupt_shards": 0, "chunks": 0, "seconds": 0.0,
+    }
+    
+    def collect(done: Set[Future]):
+        for future in done:
+            entry = pending.pop(future)
+            try:
+                restored = future.result()
+            except Exception:
+                logger.exception("Failed to restore document", extra={"document_id": entry["document_id"]})
+                restored = False
+            if restored:
+                report["restored"] += 1
+                report["chunks"] += entry["count"]
+            else:
+                report["errors"] += 1
+    
+    pending: Dict[Future, Dict[str, Any]] = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot-import") as executor:
+        for documents, columns in _iter_shards(snapshot_dir, manifest, report):
+            for entry in documents:
+                document_id = entry["document_id"]
+                if filenames.get(document_id) != entry["filename"]:
+                    report["skipped_missing"] += 1
+                    continue
+                if document_id in indexed:
+                    report["skipped_existing"] += 1
+                    continue
+                if not is_compatible_index(entry["embedding_version"]):
+                    report["incompatible"] += 1
+                    continue
+                
+                # Bounded in-flight work keeps at most about two shards in memory
+                while len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(_restore_document, entry, columns)] = entry
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info("Imported snapshot", extra=report)
+    return report
+
+
+def main():
+    import argparse
+    
+    from app.logging_config import setup_logging
+    
+    parser = argparse.ArgumentParser(prog="python -m app.services.snapshots", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    export_parser = subparsers.add_parser("export", help="Write all document indexes to a snapshot")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--documents", help="Comma-separated document ids (default: all ready documents)")
+    export_parser.add_argument("--shard-mb", type=int, default=DEFAULT_SHARD_BYTES // (1024 * 1024))
+    export_parser.add_argument("--float16", action="store_true", help="Store vectors as float16")
+    
+    import_parser = subparsers.add_parser("import", help="Restore document indexes from a snapshot")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--workers", type=int, help="Parallel restores (default: CPU budget cores)")
+    import_parser.add_argument("--overwrite", action="store_true", help="Replace existing indexes")
+    
+    verify_parser = subparsers.add_parser("verify", help="Check a snapshot's checksums")
+    verify_parser.add_argument("directory")
+    
+    args = parser.parse_args()
+    setup_logging()
+    
+    try:
+        if args.command == "export":
+            document_ids = [int(value) for value in args.documents.split(",")] if args.documents else None
+            report = export_snapshot(args.directory, document_ids, args.shard_mb * 1024 * 1024, args.float16)
+        elif args.command == "import":
+            report = import_snapshot(args.directory, args.workers, args.overwrite)
+        else:
+            report = verify_snapshot(args.directory)
+    except SnapshotError as e:
+        raise SystemExit(str(e))
+    
+    print(json.dumps(report, indent=2))
+    if report.get("corrupt_shards") or report.get("errors"):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,534 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Namespaces: "uploads" holds original PDFs, "indexes" holds one Chroma directory per document
+UPLOADS = "uploads"
+INDEXES = "indexes"
+
+# Bytes per read when streaming between file objects
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Written last when a directory is published: lists its files, and its ETag versions the directory
+MANIFEST_NAME = ".manifest"
+# ETag of the manifest a cached directory was fetched from
+VERSION_MARKER_NAME = ".manifest_etag"
+
+
+def _remove(path: Path):
+    """Delete a file or directory tree if it exists"""
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _as_directory(prefix: str) -> str:
+    """Treat a prefix as a directory so "doc_1" never matches "doc_10/..." """
+    return prefix.rstrip("/") + "/"
+
+
+class BlobStorage(ABC):
+    """
+    Storage interface shared by upload handling and the vector indexes.
+    
+    Keys are relative paths inside a namespace. Local code always works on
+    a local path (local_path / local_dir); remote backends serve those
+    from a size-bounded read-through cache.
+    """
+    
+    @abstractmethod
+    def put_stream(self, namespace: str, key: str, stream: BinaryIO) -> int:
+        """Write a stream to `key`, returning the number of bytes written"""
+    
+    @abstractmethod
+    def open_read(self, namespace: str, key: str) -> BinaryIO:
+        """Open `key` for streaming reads"""
+    
+    @abstractmethod
+    def exists(self, namespace: str, key: str) -> bool:
+        """Check whether `key` exists"""
+    
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        """Delete `key` (a missing key is not an error)"""
+    
+    @abstractmethod
+    def last_modified(self, namespace: str, key: str) -> Optional[float]:
+        """Unix time `key` was last written, or None if it doesn't exist"""
+    
+    @abstractmethod
+    def has_prefix(self, namespace: str, prefix: str) -> bool:
+        """Check whether any object exists under `prefix`"""
+    
+    @abstractmethod
+    def delete_prefix(self, namespace: str, prefix: str):
+        """Delete every key under `prefix` (e.g. a whole index directory)"""
+    
+    @abstractmethod
+    def list_keys(self, namespace: str, prefix: str = "") -> Iterator[str]:
+        """Keys under `prefix`, relative to the namespace"""
+    
+    @abstractmethod
+    def uri(self, namespace: str, key: str) -> str:
+        """Human-readable location stored on the Document row"""
+    
+    @abstractmethod
+    def local_path(self, namespace: str, key: str) -> Path:
+        """Local readable copy of a file"""
+    
+    @abstractmethod
+    def build_dir(self, namespace: str, prefix: str, resume: bool = False) -> Path:
+        """
+        Local directory to build a new directory-shaped object (index) in.
+        With `resume`, a partial build left on this node is kept.
+        """
+    
+    @abstractmethod
+    def publish_dir(self, namespace: str, prefix: str, local_dir: Path):
+        """Make a directory built in build_dir() visible to every node"""
+    
+    @abstractmethod
+    def local_dir(self, namespace: str, prefix: str, refresh: bool = False) -> Optional[Path]:
+        """Local copy of a directory-shaped object, or None if it doesn't exist"""
+
+
+class LocalStorage(BlobStorage):
+    """Filesystem backend: namespaces map to UPLOAD_DIR and CHROMA_DB_DIR"""
+    
+    def __init__(self, roots: Dict[str, str]):
+        self.roots = {namespace: Path(root) for namespace, root in roots.items()}
+    
+    def _path(self, namespace: str, key: str) -> Path:
+        root = self.roots[namespace].resolve()
+        path = (root / key).resolve()
+        if root != path and root not in path.parents:
+            raise ValueError(f"Key escapes storage root: {key}")
+        return path
+    
+    def put_stream(self, namespace: str, key: str, stream: BinaryIO) -> int:
+        path = self._path(namespace, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(stream, f, STREAM_CHUNK_SIZE)
+            return f.tell()
+    
+    def open_read(self, namespace: str, key: str) -> BinaryIO:
+        return open(self._path(namespace, key), "rb")
+    
+    def exists(self, namespace: str, key: str) -> bool:
+        return self._path(namespace, key).exists()
+    
+    def delete(self, namespace: str, key: str):
+        self._path(namespace, key).unlink(missing_ok=True)
+    
+    def last_modified(self, namespace: str, key: str) -> Optional[float]:
+        try:
+            return self._path(namespace, key).stat().st_mtime
+        except FileNotFoundError:
+            return None
+    
+    def has_prefix(self, namespace: str, prefix: str) -> bool:
+        return self._path(namespace, prefix).exists()
+    
+    def delete_prefix(self, namespace: str, prefix: str):
+        path = self._path(namespace, prefix)
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink(missing_ok=True)
+    
+    def list_keys(self, namespace: str, prefix: str = "") -> Iterator[str]:
+        root = self.roots[namespace]
+        if not root.is_dir():
+            return
+        for path in root.rglob("*"):
+            if path.is_file():
+                key = path.relative_to(root).as_posix()
+                if key.startswith(prefix):
+                    yield key
+    
+    def uri(self, namespace: str, key: str) -> str:
+        return os.path.join(str(self.roots[namespace]), key)
+    
+    def local_path(self, namespace: str, key: str) -> Path:
+        return self._path(namespace, key)
+    
+    def build_dir(self, namespace: str, prefix: str, resume: bool = False) -> Path:
+        return self._path(namespace, prefix)
+    
+    def publish_dir(self, namespace: str, prefix: str, local_dir: Path):
+        pass  # Built in place
+    
+    def local_dir(self, namespace: str, prefix: str, refresh: bool = False) -> Optional[Path]:
+        path = self._path(namespace, prefix)
+        return path if path.is_dir() else None
+
+
+class LocalCache:
+    """
+    Size-bounded read-through cache of remote files and directories.
+    
+    Each cached object is one entry under <root>/<namespace>/; the least
+    recently used entries are evicted once the total exceeds max_bytes.
+    `before_remove(namespace, path)` is called before an entry is evicted
+    or invalidated, to close anything still holding it open.
+    """
+    
+    def __init__(self, root: str, max_bytes: int, before_remove: Optional[Callable[[str, Path], None]] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.before_remove = before_remove
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[Tuple[str, str], threading.Lock] = defaultdict(threading.Lock)
+        self._entries: Dict[Path, Tuple[int, float]] = {}  # path -> (bytes, last access)
+        self._total = 0
+        self._scan()
+    
+    @staticmethod
+    def _size(path: Path) -> int:
+        if path.is_file():
+            return path.stat().st_size
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    
+    def _scan(self):
+        if not self.root.is_dir():
+            return
+        for namespace_dir in self.root.iterdir():
+            if not namespace_dir.is_dir():
+                continue
+            for entry in namespace_dir.iterdir():
+                if entry.name.endswith(".part"):
+                    _remove(entry)
+                    continue
+                size = self._size(entry)
+                self._entries[entry] = (size, entry.stat().st_mtime)
+                self._total += size
+    
+    def path_for(self, namespace: str, key: str) -> Path:
+        return self.root / namespace / key.replace("/", "__")
+    
+    def get(self, namespace: str, key: str, fetch: Callable[[Path], None], refresh: bool = False) -> Path:
+        """
+        Return the cached path for an object, fetching it on a miss.
+        
+        Args:
+            fetch: Callable that writes the object (file or directory) to the given path
+            refresh: Re-fetch even if cached
+        """
+        path = self.path_for(namespace, key)
+        with self._fetch_locks[(namespace, key)]:
+            if refresh:
+                self.invalidate(namespace, key)
+            if not path.exists():
+                partial = path.with_name(path.name + ".part")
+                partial.parent.mkdir(parents=True, exist_ok=True)
+                fetch(partial)
+                partial.rename(path)
+                self._track(path)
+        self.touch(path)
+        return path
+    
+    def adopt(self, namespace: str, key: str) -> Path:
+        """Track an object written directly into its cache path"""
+        path = self.path_for(namespace, key)
+        self._track(path)
+        return path
+    
+    def touch(self, path: Path):
+        with self._lock:
+            if path in self._entries:
+                self._entries[path] = (self._entries[path][0], time.time())
+    
+    def invalidate(self, namespace: str, key: str):
+        self._invalidate_path(self.path_for(namespace, key))
+    
+    def invalidate_prefix(self, namespace: str, prefix: str):
+        """Invalidate an entry and every entry cached under it ("doc_7.partial/640")"""
+        path = self.path_for(namespace, prefix)
+        nested = path.name + "__"
+        self._invalidate_path(path)
+        if path.parent.is_dir():
+            for entry in list(path.parent.iterdir()):
+                if entry.name.startswith(nested) and not entry.name.endswith(".part"):
+                    self._invalidate_path(entry)
+    
+    def _invalidate_path(self, path: Path):
+        with self._lock:
+            size, _ = self._entries.pop(path, (0, 0))
+            self._total -= size
+        self._discard(path)
+    
+    def _discard(self, path: Path):
+        if self.before_remove is not None and path.exists():
+            self.before_remove(path.parent.name, path)
+        _remove(path)
+    
+    def _track(self, path: Path):
+        size = self._size(path)
+        with self._lock:
+            previous, _ = self._entries.get(path, (0, 0))
+            self._entries[path] = (size, time.time())
+            self._total += size - previous
+            evict = []
+            if self._total > self.max_bytes:
+                for candidate, (candidate_size, _) in sorted(self._entries.items(), key=lambda e: e[1][1]):
+                    if self._total <= self.max_bytes:
+                        break
+                    if candidate == path:
+                        continue
+                    evict.append(candidate)
+                    self._total -= candidate_size
+                for candidate in evict:
+                    del self._entries[candidate]
+        for candidate in evict:
+            logger.info("Evicting cached object", extra={"path": str(candidate)})
+            self._discard(candidate)
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+class S3Storage(BlobStorage):
+    """
+    S3-compatible object storage backend (AWS S3, MinIO, Ceph RGW...).
+    
+    Objects live at s3://<bucket>/<S3_PREFIX><namespace>/<key>. Directory
+    objects are stored as one object per file under the prefix, plus a
+    manifest uploaded last. A cached directory is served without any
+    request for STORAGE_CACHE_REVALIDATE_SECONDS, then checked against
+    the manifest's ETag (one HEAD) and re-fetched when another node has
+    published it again.
+    """
+    
+    def __init__(self, cache: LocalCache):
+        import boto3
+        
+        self.cache = cache
+        self.bucket = settings.S3_BUCKET
+        self.key_prefix = settings.S3_PREFIX
+        self._validated: Dict[Tuple[str, str], float] = {}  # (namespace, prefix) -> monotonic time of last check
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+        )
+    
+    def _object_key(self, namespace: str, key: str) -> str:
+        return f"{self.key_prefix}{namespace}/{key}"
+    
+    def put_stream(self, namespace: str, key: str, stream: BinaryIO) -> int:
+        # Spool into the cache (the caller almost always reads it back right away),
+        # then upload from disk; upload_file sends large files as multipart chunks
+        def spool(target: Path):
+            with open(target, "wb") as f:
+                shutil.copyfileobj(stream, f, STREAM_CHUNK_SIZE)
+            self.client.upload_file(str(target), self.bucket, self._object_key(namespace, key))
+        
+        path = self.cache.get(namespace, key, spool, refresh=True)
+        return path.stat().st_size
+    
+    def open_read(self, namespace: str, key: str) -> BinaryIO:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(namespace, key))
+        return response["Body"]
+    
+    def exists(self, namespace: str, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(namespace, key))
+            return True
+        except ClientError:
+            return False
+    
+    def delete(self, namespace: str, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(namespace, key))
+        self.cache.invalidate(namespace, key)
+    
+    def last_modified(self, namespace: str, key: str) -> Optional[float]:
+        from botocore.exceptions import ClientError
+        
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(namespace, key))
+        except ClientError:
+            return None
+        return response["LastModified"].timestamp()
+    
+    def has_prefix(self, namespace: str, prefix: str) -> bool:
+        response = self.client.list_objects_v2(
+            Bucket=self.bucket, Prefix=self._object_key(namespace, _as_directory(prefix)), MaxKeys=1
+        )
+        return response.get("KeyCount", 0) > 0
+    
+    def delete_prefix(self, namespace: str, prefix: str):
+        for validated in list(self._validated):
+            if validated[0] == namespace and (validated[1] + "/").startswith(_as_directory(prefix)):
+                self._validated.pop(validated, None)
+        keys = [
+            {"Key": self._object_key(namespace, key)}
+            for key in self.list_keys(namespace, _as_directory(prefix))
+        ]
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys[start:start + 1000]})
+        self.cache.invalidate_prefix(namespace, prefix)
+    
+    def list_keys(self, namespace: str, prefix: str = "") -> Iterator[str]:
+        base = self._object_key(namespace, "")
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=base + prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(base):]
+    
+    def uri(self, namespace: str, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(namespace, key)}"
+    
+    def local_path(self, namespace: str, key: str) -> Path:
+        def fetch(target: Path):
+            with open(target, "wb") as f:
+                self.client.download_fileobj(self.bucket, self._object_key(namespace, key), f)
+        
+        return self.cache.get(namespace, key, fetch)
+    
+    def build_dir(self, namespace: str, prefix: str, resume: bool = False) -> Path:
+        path = self.cache.path_for(namespace, prefix)
+        self._validated.pop((namespace, prefix), None)
+        if not (resume and path.is_dir()):
+            self.cache.invalidate(namespace, prefix)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    
+    def publish_dir(self, namespace: str, prefix: str, local_dir: Path):
+        files = []
+        for path in local_dir.rglob("*"):
+            relative = path.relative_to(local_dir).as_posix()
+            if path.is_file() and relative not in (MANIFEST_NAME, VERSION_MARKER_NAME):
+                self.client.upload_file(str(path), self.bucket, self._object_key(namespace, f"{prefix}/{relative}"))
+                files.append(relative)
+        
+        # The manifest goes last, so readers never see a half-uploaded directory as a new version
+        response = self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(namespace, f"{prefix}/{MANIFEST_NAME}"),
+            Body=json.dumps({"version": uuid.uuid4().hex, "files": sorted(files)}).encode("utf-8")
+        )
+        (local_dir / VERSION_MARKER_NAME).write_text(response["ETag"])
+        self.cache.adopt(namespace, prefix)
+        self._validated[(namespace, prefix)] = time.monotonic()
+    
+    def _published_version(self, namespace: str, prefix: str) -> Optional[str]:
+        """ETag of a directory's manifest, or None if it has none"""
+        from botocore.exceptions import ClientError
+        
+        try:
+            response = self.client.head_object(
+                Bucket=self.bucket, Key=self._object_key(namespace, f"{prefix}/{MANIFEST_NAME}")
+            )
+        except ClientError:
+            return None
+        return response["ETag"]
+    
+    def local_dir(self, namespace: str, prefix: str, refresh: bool = False) -> Optional[Path]:
+        path = self.cache.path_for(namespace, prefix)
+        validated = self._validated.get((namespace, prefix))
+        if (
+            not refresh
+            and validated is not None
+            and time.monotonic() - validated < settings.STORAGE_CACHE_REVALIDATE_SECONDS
+            and path.is_dir()
+        ):
+            self.cache.touch(path)
+            return path
+        
+        marker = path / VERSION_MARKER_NAME
+        version = self._published_version(namespace, prefix)
+        if version is None:
+            if marker.is_file():
+                return None  # Deleted, or being rebuilt by another node
+            # Being built, or published before manifests existed
+            return self._legacy_local_dir(namespace, prefix, refresh)
+        
+        stale = refresh or not (marker.is_file() and marker.read_text() == version)
+        
+        def fetch(target: Path):
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self._object_key(namespace, f"{prefix}/{MANIFEST_NAME}")
+            )
+            manifest = json.loads(response["Body"].read())
+            for relative in manifest["files"]:
+                destination = target / relative
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                with open(destination, "wb") as f:
+                    self.client.download_fileobj(self.bucket, self._object_key(namespace, f"{prefix}/{relative}"), f)
+            (target / VERSION_MARKER_NAME).write_text(response["ETag"])
+        
+        if stale and path.is_dir():
+            logger.info("Refreshing cached directory", extra={"namespace": namespace, "prefix": prefix})
+        path = self.cache.get(namespace, prefix, fetch, refresh=stale)
+        self._validated[(namespace, prefix)] = time.monotonic()
+        return path
+    
+    def _legacy_local_dir(self, namespace: str, prefix: str, refresh: bool) -> Optional[Path]:
+        """local_dir() for directories without a manifest: list their files"""
+        keys = list(self.list_keys(namespace, _as_directory(prefix)))
+        if not keys:
+            return None
+        
+        def fetch(target: Path):
+            for key in keys:
+                destination = target / key[len(prefix) + 1:]
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                with open(destination, "wb") as f:
+                    self.client.download_fileobj(self.bucket, self._object_key(namespace, key), f)
+        
+        return self.cache.get(namespace, prefix, fetch, refresh=refresh)
+
+
+def _release_cached_index(namespace: str, path: Path):
+    """Stop Chroma's clients of a cached index before its directory is removed"""
+    if namespace == INDEXES:
+        from app.services.rag_service import release_index_clients
+        
+        release_index_clients(path.name, directory=path)
+
+
+_storage: Optional[BlobStorage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> BlobStorage:
+    """
+    Get the configured storage backend (STORAGE_BACKEND = "local" or "s3").
+    
+    Returns:
+        Shared BlobStorage instance
+    """
+    global _storage
+    
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if settings.STORAGE_BACKEND == "s3":
+                    cache = LocalCache(
+                        settings.STORAGE_CACHE_DIR,
+                        settings.STORAGE_CACHE_MAX_BYTES,
+                        before_remove=_release_cached_index
+                    )
+                    _storage = S3Storage(cache)
+                else:
+                    _storage = LocalStorage({UPLOADS: settings.UPLOAD_DIR, INDEXES: settings.CHROMA_DB_DIR})
+    return _storage
@@ -0,0 +1,325 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, object_session
+
+from app.config import settings
+from app.models.user import User, UserChange
+
+logger = logging.getLogger(__name__)
+
+# Change log entries re-read on every sync, so a change whose id was
+# assigned before, but committed after, a later one is still applied
+_REORDER_WINDOW = 100
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Lightweight, immutable copy of the User fields routes need.
+    Safe to share between requests because it is detached from any session.
+    """
+    id: int
+    username: str
+    email: str
+    full_name: Optional[str]
+    is_active: bool
+    is_superuser: bool
+    created_at: datetime
+    
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        """Build a snapshot from a User model instance"""
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            is_active=bool(user.is_active),
+            is_superuser=bool(user.is_superuser),
+            created_at=user.created_at,
+        )
+
+
+def token_digest(token: str) -> str:
+    """Hash a bearer token so raw credentials are never kept in memory"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class UserSnapshotCache:
+    """
+    Bounded TTL cache mapping verified token digests to user snapshots.
+    
+    Entries expire after the configured TTL or when the token itself
+    expires, whichever comes first. The least recently used entry is
+    evicted when the cache is full.
+    
+    A change to a user drops their entries in the process that made it
+    at once. Other processes learn about it from the user_changes log
+    through sync(), at most `sync_seconds` later. Either way the time of
+    the invalidation is kept, and a snapshot read from the database
+    before it is not cached, so a request that read the old row while
+    the change was being committed cannot put it back. Log entries older
+    than any entry they could still invalidate are pruned by sync().
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float, sync_seconds: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sync_seconds = sync_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._digests_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._last_change_id: Optional[int] = None  # None until the log was first read
+        self._applied_changes: Set[int] = set()
+        self._invalidated_at: Dict[int, float] = {}  # user id -> monotonic time of their last invalidation
+        self._next_sync = 0.0
+        self._next_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+    
+    def get(self, token: str) -> Optional[UserSnapshot]:
+        """
+        Look up the snapshot cached for a token.
+        
+        Args:
+            token: Raw bearer token
+        
+        Returns:
+            Cached snapshot, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        
+        digest = token_digest(token)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, snapshot = entry
+            if expires_at <= now:
+                self._remove(digest)
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return snapshot
+    
+    def put(
+        self,
+        token: str,
+        snapshot: UserSnapshot,
+        token_exp: Optional[float] = None,
+        read_at: Optional[float] = None
+    ):
+        """
+        Cache a snapshot for a verified token.
+        
+        Args:
+            token: Raw bearer token
+            snapshot: User snapshot to cache
+            token_exp: Token "exp" claim (unix seconds), caps the entry lifetime
+            read_at: time.monotonic() taken before the user row was read;
+                the snapshot is not cached if the user was invalidated since
+        """
+        if not self.enabled:
+            return
+        
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, float(token_exp) - time.time())
+            if ttl <= 0:
+                return
+        
+        digest = token_digest(token)
+        with self._lock:
+            if read_at is not None and self._invalidated_at.get(snapshot.id, float("-inf")) >= read_at:
+                return  # Read before a change this process has since seen
+            self._remove(digest)
+            self._entries[digest] = (time.monotonic() + ttl, snapshot)
+            self._digests_by_user.setdefault(snapshot.id, set()).add(digest)
+            
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+    
+    def invalidate_user(self, user_id: int):
+        """Drop every cached token belonging to a user"""
+        with self._lock:
+            self._invalidate(user_id)
+    
+    def sync(self, db: Session):
+        """
+        Drop cached tokens of users changed by other processes.
+        
+        Reads the user_changes log written since the last sync, at most
+        once per `sync_seconds` (every call when 0), and prunes the log
+        about once per TTL.
+        
+        Args:
+            db: Database session
+        """
+        self._prune(db)
+        if not self.enabled:
+            return
+        
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_sync:
+                return
+            self._next_sync = now + self.sync_seconds
+            last_change_id = self._last_change_id
+        
+        if last_change_id is None:
+            # Nothing can be cached yet for changes made before the first sync
+            latest = db.query(func.max(UserChange.id)).scalar() or 0
+            with self._lock:
+                self._last_change_id = max(latest, self._last_change_id or 0)
+            return
+        
+        changes = db.query(UserChange.id, UserChange.user_id).filter(
+            UserChange.id > last_change_id - _REORDER_WINDOW
+        ).all()
+        with self._lock:
+            for change_id, user_id in changes:
+                if change_id not in self._applied_changes:
+                    self._invalidate(user_id)
+            self._applied_changes = {change_id for change_id, _ in changes}
+            if changes:
+                self._last_change_id = max(self._last_change_id, max(change_id for change_id, _ in changes))
+    
+    def _prune(self, db: Session):
+        """
+        Delete log entries no cache can still be holding a stale entry for.
+        
+        An entry cached before a change expires within the TTL, and every
+        process applies the change within `sync_seconds`, so older log
+        entries have done their job. Each process prunes about once per
+        TTL (and at least once a minute).
+        """
+        retention = self.ttl_seconds + self.sync_seconds
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_prune:
+                return
+            self._next_prune = now + max(retention, 60.0)
+            # Invalidation times only matter to reads still in flight
+            self._invalidated_at = {
+                user_id: at for user_id, at in self._invalidated_at.items() if now - at < retention
+            }
+        
+        try:
+            db.query(UserChange).filter(
+                UserChange.changed_at < datetime.utcnow() - timedelta(seconds=retention)
+            ).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.warning("Failed to prune user change log", exc_info=True)
+    
+    def clear(self):
+        """Drop all entries and reset counters"""
+        with self._lock:
+            self._entries.clear()
+            self._digests_by_user.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return cache size and hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+    
+    def _invalidate(self, user_id: int):
+        """Drop a user's entries and remember when; caller must hold the lock"""
+        self._invalidated_at[user_id] = time.monotonic()
+        for digest in list(self._digests_by_user.get(user_id, ())):
+            self._remove(digest)
+    
+    def _remove(self, digest: str):
+        """Remove an entry; caller must hold the lock"""
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        user_id = entry[1].id
+        digests = self._digests_by_user.get(user_id)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._digests_by_user[user_id]
+
+
+# Global user snapshot cache instance
+user_cache = UserSnapshotCache(
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+    sync_seconds=settings.AUTH_CACHE_SYNC_SECONDS,
+)
+
+
+def sync_user_changes(db: Session):
+    """Apply user changes made by other worker processes to the global cache"""
+    user_cache.sync(db)
+
+
+def record_user_change(db: Session, user_id: int):
+    """
+    Log a user change for other processes and drop it from this one's cache.
+    
+    ORM changes are logged automatically; bulk query.update() calls
+    bypass the hooks below and must call this (the caller commits).
+    """
+    db.add(UserChange(user_id=user_id))
+    user_cache.invalidate_user(user_id)
+
+
+# Invalidate on any ORM change to a user (deactivation, password change, rename,
+# deletion). The entry is dropped at flush time and again after commit, so a
+# request that re-reads the old row between the two cannot leave a stale
+# snapshot behind. The change is logged in the same transaction for the other
+# worker processes.
+_PENDING_KEY = "user_cache_invalidations"
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    connection.execute(UserChange.__table__.insert().values(user_id=target.id, changed_at=datetime.utcnow()))
+    user_cache.invalidate_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        user_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,4 @@
+"""
+Benchmarks Package - Performance and Load Tests
+Run modules from the backend directory, e.g. `python -m benchmarks.db_concurrency`.
+"""
@@ -0,0 +1,67 @@
+"""
+Benchmark command line.
+
+    python -m benchmarks run --docs 20 --pages 10 --questions 60 --output results/new.json
+    python -m benchmarks compare results/base.json results/new.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    run_parser = subparsers.add_parser("run", help="Run the end-to-end benchmark")
+    run_parser.add_argument("--docs", type=int, default=20, help="Synthetic PDFs to upload")
+    run_parser.add_argument("--pages", type=int, default=10, help="Pages per synthetic PDF")
+    run_parser.add_argument("--questions", type=int, default=60, help="Chat requests to send")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--embeddings", choices=["fake", "real"], default="fake",
+                            help="Offline deterministic stand-in or the configured model")
+    run_parser.add_argument("--embed-cost-ms", type=float, default=0.0,
+                            help="Simulated per-chunk cost for fake embeddings")
+    run_parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    run_parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    run_parser.add_argument("--login-storm", type=int, default=0,
+                            help="Concurrent logins to run alongside the chat phase")
+    run_parser.add_argument("--output", help="Write results JSON here")
+    
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Relative change tolerated before flagging (default 0.10)")
+    
+    args = parser.parse_args()
+    
+    if args.command == "run":
+        from benchmarks.harness import run
+        
+        document = run(args)
+        output = json.dumps(document, indent=2, default=str)
+        if args.output:
+            os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+            with open(args.output, "w") as f:
+                f.write(output)
+            print(f"Results written to {args.output}")
+        for name, value in document["metrics"].items():
+            print(f"{name}: {value}")
+        return 0
+    
+    from benchmarks.compare import compare, load_metrics, print_report
+    
+    rows = compare(load_metrics(args.baseline), load_metrics(args.candidate), args.threshold)
+    print_report(rows)
+    regressions = [row for row in rows if row["status"] == "REGRESSION"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold * 100:.0f}%")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Adaptive retrieval depth benchmark.
+
+Indexes a synthetic document made of topics of very different breadth
+(some covered by one chunk, some by a dozen), then asks questions about
+each topic twice through RAGService.query_document: once with the old
+fixed k=8 and once with the configured adaptive selection
+(RETRIEVAL_MIN_K / RETRIEVAL_MAX_K / RETRIEVAL_SCORE_FLOOR /
+RETRIEVAL_RELATIVE_DROP). The mock LLM charges latency per prompt token,
+so shorter prompts show up as faster answers. Reports, per mode, the
+average chunks used, prompt tokens, LLM and end-to-end latency, and
+recall/precision of the chunks that actually belong to the question's
+topic, plus the savings of adaptive over fixed.
+
+Usage:
+    python -m benchmarks.adaptive_retrieval --topics 12 --questions 5
+    python -m benchmarks.adaptive_retrieval --embeddings real --score-floor 0.3 --relative-drop 0.25
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.fake_embeddings import DeterministicEmbeddings
+from benchmarks.harness import _configure_environment
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.synthetic_pdf import WORDS
+
+DOCUMENT_ID = 1
+FIXED_K = 8
+
+
+def make_document(topics: int, seed: int = 0) -> Tuple[str, Dict[int, List[str]]]:
+    """
+    Build document text of topic paragraphs, each about one chunk long.
+    
+    Returns:
+        The text and each topic's vocabulary
+    """
+    rng = random.Random(seed)
+    vocabulary = {topic: [f"topic{topic}term{i}" for i in range(25)] for topic in range(topics)}
+    paragraphs = []
+    for topic in range(topics):
+        # Mostly narrow topics, a few broad ones
+        span = rng.choice([1, 1, 2, 2, 3, 4, 6, 10, 14])
+        for _ in range(span):
+            words = [
+                rng.choice(vocabulary[topic]) if rng.random() < 0.6 else rng.choice(WORDS)
+                for _ in range(110)
+            ]
+            paragraphs.append(" ".join(words))
+    rng.shuffle(paragraphs)
+    return "\n\n".join(paragraphs), vocabulary
+
+
+def chunk_topics(collection, vocabulary: Dict[int, List[str]]) -> Dict[str, int]:
+    """Label every stored chunk with the topic most of its words come from"""
+    stored = collection.get(include=["documents"])
+    owners = {term: topic for topic, terms in vocabulary.items() for term in terms}
+    labels = {}
+    for chunk_id, text in zip(stored["ids"], stored["documents"]):
+        counts: Dict[int, int] = {}
+        for word in text.split():
+            if word in owners:
+                counts[owners[word]] = counts.get(owners[word], 0) + 1
+        labels[chunk_id] = max(counts, key=counts.get) if counts else -1
+    return labels
+
+
+def run_mode(rag_service, questions: List[Tuple[int, str]], labels: Dict[str, int], adaptive: bool) -> dict:
+    """Ask every question in one retrieval mode and aggregate the results"""
+    from app.config import settings
+    
+    configured = (settings.RETRIEVAL_MIN_K, settings.RETRIEVAL_MAX_K)
+    if not adaptive:
+        settings.RETRIEVAL_MIN_K = settings.RETRIEVAL_MAX_K = FIXED_K
+    
+    rows = []
+    try:
+        for topic, question in questions:
+            started = time.perf_counter()
+            result = rag_service.query_document(question, DOCUMENT_ID)
+            elapsed = time.perf_counter() - started
+            if not result["success"]:
+                raise RuntimeError(result["answer"])
+            
+            chosen = [labels.get(chunk["id"]) for chunk in result["retrieved"]]
+            relevant = sum(1 for label in labels.values() if label == topic)
+            hits = sum(1 for label in chosen if label == topic)
+            rows.append({
+                "k": len(chosen),
+                "prompt_tokens": result["llm"]["prompt_tokens"],
+                "llm_ms": result["llm"]["latency_ms"],
+                "total_ms": elapsed * 1000,
+                "recall": hits / min(relevant, FIXED_K) if relevant else 1.0,
+                "precision": hits / len(chosen) if chosen else 0.0,
+                "cutoff": result["retrieval_cutoff"],
+            })
+    finally:
+        settings.RETRIEVAL_MIN_K, settings.RETRIEVAL_MAX_K = configured
+    
+    cutoffs: Dict[str, int] = {}
+    for row in rows:
+        cutoffs[row["cutoff"]] = cutoffs.get(row["cutoff"], 0) + 1
+    return {
+        "questions": len(rows),
+        "k_mean": round(statistics.fmean(row["k"] for row in rows), 2),
+        "k_max": max(row["k"] for row in rows),
+        "prompt_tokens_mean": round(statistics.fmean(row["prompt_tokens"] for row in rows), 1),
+        "llm_ms_mean": round(statistics.fmean(row["llm_ms"] for row in rows), 1),
+        "total_ms_mean": round(statistics.fmean(row["total_ms"] for row in rows), 1),
+        "recall_mean": round(statistics.fmean(row["recall"] for row in rows), 3),
+        "precision_mean": round(statistics.fmean(row["precision"] for row in rows), 3),
+        "cutoffs": cutoffs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=12)
+    parser.add_argument("--questions", type=int, default=5, help="Questions per topic")
+    parser.add_argument("--embeddings", choices=["fake", "real"], default="fake",
+                        help="Offline deterministic stand-in or the configured model")
+    parser.add_argument("--min-k", type=int, help="Override RETRIEVAL_MIN_K")
+    parser.add_argument("--max-k", type=int, help="Override RETRIEVAL_MAX_K")
+    parser.add_argument("--score-floor", type=float, help="Override RETRIEVAL_SCORE_FLOOR")
+    parser.add_argument("--relative-drop", type=float, help="Override RETRIEVAL_RELATIVE_DROP")
+    parser.add_argument("--llm-latency-ms", type=float, default=150.0)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=60.0,
+                        help="Simulated LLM latency per 1000 prompt tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="retrievalbench_")
+    mock = MockGroqServer(
+        latency_ms=args.llm_latency_ms, jitter_ms=0, prefill_ms_per_1k_tokens=args.prefill_ms_per_1k
+    ).start()
+    _configure_environment(workdir, mock.base_url)
+    for name, value in (
+        ("RETRIEVAL_MIN_K", args.min_k),
+        ("RETRIEVAL_MAX_K", args.max_k),
+        ("RETRIEVAL_SCORE_FLOOR", args.score_floor),
+        ("RETRIEVAL_RELATIVE_DROP", args.relative_drop),
+    ):
+        if value is not None:
+            os.environ[name] = str(value)
+    
+    try:
+        from app.config import settings
+        from app.services.rag_service import get_rag_service
+        
+        rag_service = get_rag_service()
+        if args.embeddings == "fake":
+            rag_service._embeddings = DeterministicEmbeddings()
+        
+        text, vocabulary = make_document(args.topics, seed=args.seed)
+        if not rag_service.create_vector_store(text, DOCUMENT_ID):
+            raise SystemExit("Failed to build the benchmark index")
+        labels = chunk_topics(rag_service._open_vector_store(DOCUMENT_ID, {})._collection, vocabulary)
+        
+        rng = random.Random(args.seed)
+        questions = [
+            (topic, "What does the document say about " + " ".join(rng.sample(vocabulary[topic], 6)) + "?")
+            for topic in range(args.topics)
+            for _ in range(args.questions)
+        ]
+        
+        fixed = run_mode(rag_service, questions, labels, adaptive=False)
+        adaptive = run_mode(rag_service, questions, labels, adaptive=True)
+    finally:
+        mock.stop()
+    
+    def saving(key: str) -> float:
+        return round(1 - adaptive[key] / fixed[key], 3) if fixed[key] else 0.0
+    
+    results = {
+        "config": {
+            "chunks": len(labels),
+            "min_k": settings.RETRIEVAL_MIN_K,
+            "max_k": settings.RETRIEVAL_MAX_K,
+            "score_floor": settings.RETRIEVAL_SCORE_FLOOR,
+            "relative_drop": settings.RETRIEVAL_RELATIVE_DROP,
+        },
+        "fixed_k8": fixed,
+        "adaptive": adaptive,
+        "savings": {
+            "prompt_tokens": saving("prompt_tokens_mean"),
+            "llm_latency": saving("llm_ms_mean"),
+            "total_latency": saving("total_ms_mean"),
+        },
+    }
+    
+    print(f"{len(questions)} questions over {len(labels)} chunks ({json.dumps(results['config'])})")
+    for name in ("fixed_k8", "adaptive"):
+        mode = results[name]
+        print(
+            f"{name:>9}: k={mode['k_mean']} (max {mode['k_max']})  prompt tokens={mode['prompt_tokens_mean']}  "
+            f"llm={mode['llm_ms_mean']}ms  total={mode['total_ms_mean']}ms  "
+            f"recall={mode['recall_mean']} precision={mode['precision_mean']}  cutoffs={mode['cutoffs']}"
+        )
+    savings = results["savings"]
+    print(
+        f"  savings: prompt tokens {savings['prompt_tokens']:.1%}, LLM latency {savings['llm_latency']:.1%}, "
+        f"end-to-end {savings['total_latency']:.1%}"
+    )
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Chat deadline benchmark.
+
+Asks questions through RAGService.query_document against a mock LLM
+with a long latency tail (--llm-ms plus up to --jitter-ms), once
+without a practical deadline and once per --deadlines value. Reports,
+per run, end-to-end latency percentiles, the fallback rate and the
+fallback build time, showing how the deadline trades generated answers
+for a bounded worst case.
+
+Usage:
+    python -m benchmarks.chat_deadline --questions 40 --deadlines 1000,2000
+    python -m benchmarks.chat_deadline --llm-ms 300 --jitter-ms 5000 --output results/deadline.json
+"""
+import argparse
+import json
+import logging
+import random
+import tempfile
+import time
+from typing import List, Optional
+
+from benchmarks.fake_embeddings import DeterministicEmbeddings
+from benchmarks.harness import _configure_environment
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.stats import summarize_ms
+from benchmarks.synthetic_pdf import make_page_texts
+
+DOCUMENT_ID = 1
+# Stand-in for "no deadline"
+UNBOUNDED_MS = 600000
+
+
+def run(rag_service, questions: List[str], deadline_ms: Optional[int]) -> dict:
+    """Ask every question with one deadline and aggregate the results"""
+    totals: List[float] = []
+    fallback_builds: List[float] = []
+    fallbacks = 0
+    for question in questions:
+        started = time.perf_counter()
+        result = rag_service.query_document(
+            question, DOCUMENT_ID, deadline=time.monotonic() + (deadline_ms or UNBOUNDED_MS) / 1000
+        )
+        totals.append(time.perf_counter() - started)
+        if not result["success"]:
+            raise RuntimeError(result["answer"])
+        if result["fallback"]:
+            fallbacks += 1
+            fallback_builds.append(result["timings"]["fallback"])
+    
+    return {
+        "deadline_ms": deadline_ms,
+        "total": summarize_ms(totals),
+        "fallback_rate": round(fallbacks / len(questions), 3),
+        "fallback_build": summarize_ms(fallback_builds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--deadlines", default="1500,3000", help="Comma-separated deadlines in ms")
+    parser.add_argument("--llm-ms", type=float, default=400.0, help="Mock LLM base latency")
+    parser.add_argument("--jitter-ms", type=float, default=4000.0, help="Mock LLM extra latency (uniform)")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="deadlinebench_")
+    # Every missed deadline logs a warning
+    logging.getLogger("app").setLevel(logging.ERROR)
+    mock = MockGroqServer(latency_ms=args.llm_ms, jitter_ms=args.jitter_ms, seed=args.seed).start()
+    _configure_environment(workdir, mock.base_url)
+    
+    try:
+        from app.config import settings
+        from app.services.rag_service import get_rag_service
+        
+        rag_service = get_rag_service()
+        rag_service._embeddings = DeterministicEmbeddings()
+        text = "\n\n".join(make_page_texts(args.pages, seed=args.seed))
+        if not rag_service.create_vector_store(text, DOCUMENT_ID):
+            raise SystemExit("Failed to build the benchmark index")
+        
+        rng = random.Random(args.seed)
+        words = text.split()
+        questions = [f"What does the document say about {' '.join(rng.sample(words, 5))}?" for _ in range(args.questions)]
+        
+        deadlines = [int(value) for value in args.deadlines.split(",") if value.strip()]
+        results = [run(rag_service, questions, deadline) for deadline in [None] + deadlines]
+    finally:
+        mock.stop()
+    
+    print(
+        f"{args.questions} questions, LLM {args.llm_ms}+U(0,{args.jitter_ms})ms, "
+        f"fallback reserve {settings.CHAT_FALLBACK_RESERVE_SECONDS}s"
+    )
+    for result in results:
+        total = result["total"]
+        label = f"{result['deadline_ms']}ms" if result["deadline_ms"] else "none"
+        print(
+            f"deadline {label:>7}: p50={total['p50_ms']}ms p95={total['p95_ms']}ms p99={total['p99_ms']}ms  "
+            f"fallback rate={result['fallback_rate']:.0%}  fallback build p95={result['fallback_build']['p95_ms']}ms"
+        )
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
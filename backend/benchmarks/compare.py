@@ -0,0 +1,59 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+Metric direction is inferred from the name: "*_per_sec" is higher-is-
+better, "*_ms" and "*failures" are lower-is-better; other metrics are
+reported but never flagged.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+
+def metric_direction(name: str) -> Optional[int]:
+    """+1 if higher is better, -1 if lower is better, None if neutral"""
+    if name.endswith("_per_sec"):
+        return 1
+    if name.endswith("_ms") or name.endswith("failures"):
+        return -1
+    return None
+
+
+def compare(baseline: Dict[str, float], candidate: Dict[str, float],
+            threshold: float) -> List[Dict[str, Any]]:
+    """
+    Compare flat metric dictionaries.
+    
+    Args:
+        baseline: Metrics from the reference run
+        candidate: Metrics from the new run
+        threshold: Relative change (0.1 = 10%) tolerated before flagging
+        
+    Returns:
+        One row per shared metric with change and status
+    """
+    rows = []
+    for name in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[name], candidate[name]
+        direction = metric_direction(name)
+        change = (after - before) / before if before else (0.0 if after == before else float("inf"))
+        status = "ok"
+        if direction is not None and change * direction < -threshold:
+            status = "REGRESSION"
+        elif direction is not None and change * direction > threshold:
+            status = "improved"
+        rows.append({"metric": name, "baseline": before, "candidate": after,
+                     "change": change, "status": status})
+    return rows
+
+
+def load_metrics(path: str) -> Dict[str, float]:
+    with open(path) as f:
+        return json.load(f)["metrics"]
+
+
+def print_report(rows: List[Dict[str, Any]]):
+    width = max((len(row["metric"]) for row in rows), default=10)
+    for row in rows:
+        change = "n/a" if row["change"] == float("inf") else f"{row['change'] * 100:+.1f}%"
+        print(f"{row['metric']:<{width}}  {row['baseline']:>12}  {row['candidate']:>12}  "
+              f"{change:>8}  {row['status']}")
@@ -0,0 +1,223 @@
+"""
+CPU budget benchmark.
+
+Runs a mixed load that mirrors what one worker process sees in
+production: many concurrent requests, each on the request threadpool,
+doing one of
+
+- chat: embed a question, then hold the thread while the LLM answers
+  (simulated with a sleep of --llm-ms)
+- extract: extract text from a synthetic PDF (behind the extraction slots)
+- ingest: embed a batch of chunks
+- login: verify a bcrypt password (in the hashing process pool)
+
+once with library defaults (embedding threads = all cores, a 40-thread
+request pool, no cap on concurrent extractions) and once with the
+budgets from app.services.resources. Each profile runs in a fresh
+process and reports throughput, per-class latency, peak thread count and
+involuntary context switches (a sign of oversubscribed cores).
+
+Uses the embedding backend from EMBEDDING_BACKEND, so the model must be
+available locally.
+
+Usage:
+    python -m benchmarks.cpu_governor --clients 64 --duration 20
+    python -m benchmarks.cpu_governor --cores 4 --llm-ms 100 --output results/cpu.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict
+from typing import Dict, List
+
+from benchmarks.stats import summarize_ms
+
+PROFILES = ("defaults", "governed")
+KINDS = ("chat", "extract", "ingest", "login")
+
+# Budget settings the profiles control; inherited values would skew the comparison
+_BUDGET_VARS = (
+    "EMBEDDING_THREADS", "EXTRACTION_SLOTS", "REQUEST_THREADS", "ONNX_INTRA_OP_THREADS",
+    "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+)
+
+
+def _parse_mix(mix: str) -> Dict[str, float]:
+    """Parse "chat=50,extract=15,..." into weights per request kind"""
+    weights = {kind: 0.0 for kind in KINDS}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in weights:
+            raise SystemExit(f"Unknown request kind in --mix: {kind}")
+        weights[kind.strip()] = float(weight)
+    return weights
+
+
+def _sample_threads(stop: threading.Event, samples: List[int]):
+    """Record the process thread count every 100ms"""
+    from app.services.resources import _os_thread_count
+    
+    while not stop.wait(0.1):
+        samples.append(_os_thread_count() or threading.active_count())
+
+
+async def _run_load(args) -> dict:
+    """Worker side: apply the budgets, then drive the mixed load through the request threadpool"""
+    from anyio import to_thread
+    
+    from app.services.auth import hash_password, shutdown_password_pool, start_password_pool, verify_password
+    from app.services.pdf_processor import extract_text_from_pdf
+    from app.services.rag_service import create_local_embeddings
+    from app.services.resources import apply_resource_budgets, cpu_budget, extraction_slots
+    from benchmarks.embedding_backends import make_chunks
+    from benchmarks.synthetic_pdf import write_pdf
+    
+    apply_resource_budgets()
+    embeddings = await to_thread.run_sync(create_local_embeddings)
+    embeddings.embed_query("warmup")
+    start_password_pool()
+    
+    pdf_path = os.path.join(tempfile.mkdtemp(prefix="cpubench_"), "doc.pdf")
+    write_pdf(pdf_path, pages=args.pages)
+    chunks = make_chunks(args.batch)
+    hashed = hash_password("benchmark-password")
+    
+    def chat():
+        embeddings.embed_query("What does the report say about quarterly revenue?")
+        time.sleep(args.llm_ms / 1000)
+    
+    def extract():
+        with extraction_slots:
+            extract_text_from_pdf(pdf_path)
+    
+    def ingest():
+        embeddings.embed_documents(chunks)
+    
+    def login():
+        verify_password("benchmark-password", hashed)
+    
+    operations = {"chat": chat, "extract": extract, "ingest": ingest, "login": login}
+    weights = _parse_mix(args.mix)
+    kinds = [kind for kind in KINDS if weights[kind] > 0]
+    latencies: Dict[str, List[float]] = {kind: [] for kind in kinds}
+    
+    async def client(seed: int, stop_at: float):
+        rng = random.Random(seed)
+        while time.perf_counter() < stop_at:
+            kind = rng.choices(kinds, weights=[weights[k] for k in kinds])[0]
+            start = time.perf_counter()
+            await to_thread.run_sync(operations[kind])
+            latencies[kind].append(time.perf_counter() - start)
+    
+    thread_samples: List[int] = []
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_threads, args=(stop, thread_samples), daemon=True)
+    sampler.start()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i, started + args.duration) for i in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    stop.set()
+    sampler.join()
+    shutdown_password_pool()
+    
+    total = sum(len(values) for values in latencies.values())
+    cpu_seconds = (usage_after.ru_utime + usage_after.ru_stime) - (usage_before.ru_utime + usage_before.ru_stime)
+    return {
+        "budget": asdict(cpu_budget()),
+        "ops": total,
+        "ops_per_sec": round(total / elapsed, 1),
+        "kinds": {
+            kind: {"ops_per_sec": round(len(values) / elapsed, 2), **summarize_ms(values)}
+            for kind, values in latencies.items()
+        },
+        "threads_peak": max(thread_samples, default=0),
+        "threads_mean": round(sum(thread_samples) / len(thread_samples), 1) if thread_samples else 0,
+        "cpu_utilization": round(cpu_seconds / elapsed, 2),
+        "involuntary_switches_per_sec": round((usage_after.ru_nivcsw - usage_before.ru_nivcsw) / elapsed, 1),
+    }
+
+
+def _profile_env(profile: str, cores: int, clients: int) -> Dict[str, str]:
+    """Environment for one profile's worker process"""
+    from app.services.resources import available_cores
+    
+    env = {name: value for name, value in os.environ.items() if name not in _BUDGET_VARS}
+    env["LOG_LEVEL"] = env.get("LOG_LEVEL", "WARNING")
+    if cores:
+        env["CPU_BUDGET_CORES"] = str(cores)
+    if profile == "defaults":
+        # What the libraries pick on their own
+        env.update(
+            EMBEDDING_THREADS=str(cores or available_cores()),
+            EXTRACTION_SLOTS=str(max(clients, 40)),
+            REQUEST_THREADS="40",
+        )
+    return env
+
+
+def run_profile(profile: str, args) -> dict:
+    """Run one profile in a fresh interpreter"""
+    command = [
+        sys.executable, "-m", "benchmarks.cpu_governor", "--worker", profile,
+        "--clients", str(args.clients), "--duration", str(args.duration), "--mix", args.mix,
+        "--llm-ms", str(args.llm_ms), "--pages", str(args.pages), "--batch", str(args.batch),
+    ]
+    completed = subprocess.run(
+        command, env=_profile_env(profile, args.cores, args.clients), capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {"profile": profile, "error": completed.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return {"profile": profile, **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent requests")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per profile")
+    parser.add_argument("--cores", type=int, default=0, help="CPU_BUDGET_CORES (0 = available cores)")
+    parser.add_argument("--mix", default="chat=50,extract=15,ingest=15,login=20", help="Request kind weights")
+    parser.add_argument("--llm-ms", type=float, default=200, help="Simulated LLM latency per chat")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per extracted PDF")
+    parser.add_argument("--batch", type=int, default=32, help="Chunks per ingest request")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--worker", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        print(json.dumps(asyncio.run(_run_load(args))))
+        return
+    
+    results = [run_profile(profile, args) for profile in PROFILES]
+    
+    print(f"{args.clients} clients, {args.duration}s per profile, mix {args.mix}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['profile']:>9}: failed - {result['error'][0]}")
+            continue
+        budget = result["budget"]
+        print(
+            f"{result['profile']:>9}: {result['ops_per_sec']:>8} ops/s  threads peak={result['threads_peak']}  "
+            f"cpu={result['cpu_utilization']}  involuntary switches/s={result['involuntary_switches_per_sec']}  "
+            f"(embedding={budget['embedding_threads']} extraction={budget['extraction_slots']} "
+            f"hashing={budget['hashing_processes']} request={budget['request_threads']})"
+        )
+        for kind, stats in result["kinds"].items():
+            print(f"{'':>11}{kind:>8}: {stats['ops_per_sec']:>7} ops/s  p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
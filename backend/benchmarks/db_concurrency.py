@@ -0,0 +1,165 @@
+"""
+Database concurrency benchmark.
+
+Runs a mixed read/write workload that mirrors the document routes
+(list + count for reads, insert + commit for writes) from many threads
+against a fresh SQLite file, once with the old engine setup (rollback
+journal, no pragmas) and once with the production profile from
+app.database (WAL, synchronous=NORMAL, busy_timeout).
+
+Usage:
+    python -m benchmarks.db_concurrency --threads 16 --duration 10 --write-ratio 0.2
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, create_db_engine
+from app.models.user import User
+from app.models.document import Document
+from benchmarks.stats import percentile, summarize_ms
+
+
+def _seed(session_factory, users: int, docs_per_user: int):
+    db = session_factory()
+    try:
+        for u in range(users):
+            user = User(username=f"bench{u}", email=f"bench{u}@example.com", password_hash="x")
+            db.add(user)
+            db.flush()
+            for d in range(docs_per_user):
+                db.add(Document(
+                    user_id=user.id,
+                    filename=f"{u}_{d}.pdf",
+                    original_filename=f"{u}_{d}.pdf",
+                    file_path=f"uploads/{u}_{d}.pdf",
+                    extracted_text="lorem ipsum " * 200,
+                    page_count=3,
+                ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _read(db, user_id: int):
+    db.query(Document).filter(Document.user_id == user_id).order_by(
+        Document.uploaded_at.desc()
+    ).limit(100).all()
+    db.query(Document).filter(Document.user_id == user_id).count()
+
+
+def _write(db, user_id: int):
+    name = f"{user_id}_{time.perf_counter_ns()}.pdf"
+    db.add(Document(
+        user_id=user_id,
+        filename=name,
+        original_filename=name,
+        file_path=f"uploads/{name}",
+        extracted_text="lorem ipsum " * 200,
+        page_count=3,
+        processed_at=datetime.utcnow(),
+    ))
+    db.commit()
+
+
+def run_profile(name: str, sqlite_pragmas: bool, threads: int, duration: float,
+                write_ratio: float, users: int) -> dict:
+    """Run the mixed workload against a fresh database and return throughput stats"""
+    workdir = tempfile.mkdtemp(prefix=f"dbbench_{name}_")
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    engine = create_db_engine(url, sqlite_pragmas=sqlite_pragmas)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    _seed(session_factory, users, docs_per_user=20)
+    
+    latencies = {"read": [], "write": []}
+    errors = []
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    
+    def worker(seed: int):
+        rng = random.Random(seed)
+        local = {"read": [], "write": []}
+        local_errors = 0
+        while time.perf_counter() < stop_at:
+            kind = "write" if rng.random() < write_ratio else "read"
+            user_id = rng.randint(1, users)
+            db = session_factory()
+            start = time.perf_counter()
+            try:
+                if kind == "write":
+                    _write(db, user_id)
+                else:
+                    _read(db, user_id)
+                local[kind].append(time.perf_counter() - start)
+            except Exception:
+                db.rollback()
+                local_errors += 1
+            finally:
+                db.close()
+        with lock:
+            latencies["read"].extend(local["read"])
+            latencies["write"].extend(local["write"])
+            errors.append(local_errors)
+    
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    
+    all_latencies = latencies["read"] + latencies["write"]
+    summary = summarize_ms(all_latencies)
+    return {
+        "profile": name,
+        "ops": summary["count"],
+        "ops_per_sec": round(len(all_latencies) / elapsed, 1),
+        "reads": len(latencies["read"]),
+        "writes": len(latencies["write"]),
+        "errors": sum(errors),
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+        "p99_ms": summary["p99_ms"],
+        "write_p99_ms": round(percentile(latencies["write"], 99) * 1000, 2),
+        "mean_ms": summary["mean_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per profile")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    results = [
+        run_profile("before", False, args.threads, args.duration, args.write_ratio, args.users),
+        run_profile("after", True, args.threads, args.duration, args.write_ratio, args.users),
+    ]
+    
+    for result in results:
+        print(
+            f"{result['profile']:>7}: {result['ops_per_sec']:>9} ops/s  "
+            f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms  "
+            f"write p99={result['write_p99_ms']}ms  errors={result['errors']}"
+        )
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
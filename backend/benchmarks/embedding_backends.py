@@ -0,0 +1,190 @@
+"""
+Embedding backend benchmark.
+
+Embeds the same synthetic chunk corpus with each backend, each in a
+fresh subprocess so cold start and memory are measured in isolation,
+and reports:
+
+- cold start: seconds from import to the first embedding (model load,
+  plus ONNX export/quantization if the model was not prepared yet)
+- chunks/sec: steady-state throughput over the corpus
+- peak RSS of the worker process
+- agreement with the torch backend: mean and minimum cosine between
+  the two vectors of each chunk, and top-k overlap when the torch index
+  is searched with the other backend's query vectors
+
+Usage:
+    python -m benchmarks.embedding_backends --chunks 500 --threads 4
+    python -m benchmarks.embedding_backends --backends onnx-int8 --skip-agreement
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from benchmarks.synthetic_pdf import make_page_texts
+
+BACKENDS = ("torch", "onnx-int8")
+
+
+def make_chunks(count: int, seed: int = 0) -> List[str]:
+    """Chunk synthetic page text the way ingestion does"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    
+    from app.config import settings
+    
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP,
+        length_function=len,
+    )
+    chunks: List[str] = []
+    pages = max(1, count // 3)
+    while len(chunks) < count:
+        for text in make_page_texts(pages, seed=seed):
+            chunks.extend(splitter.split_text(text))
+        seed += 1
+    return chunks[:count]
+
+
+def _worker(backend: str, chunks_path: str, output_path: str, batch_size: int):
+    """Subprocess entry point: load the backend chosen by EMBEDDING_BACKEND and embed the corpus"""
+    started = time.perf_counter()
+    
+    from app.services.rag_service import create_local_embeddings
+    
+    embeddings = create_local_embeddings()
+    embeddings.embed_query("warmup")
+    cold_start = time.perf_counter() - started
+    
+    with open(chunks_path) as f:
+        chunks = json.load(f)
+    
+    started = time.perf_counter()
+    vectors = []
+    for start in range(0, len(chunks), batch_size):
+        vectors.extend(embeddings.embed_documents(chunks[start:start + batch_size]))
+    elapsed = time.perf_counter() - started
+    
+    np.save(output_path, np.asarray(vectors, dtype=np.float32))
+    print(json.dumps({
+        "backend": backend,
+        "cold_start_seconds": round(cold_start, 3),
+        "chunks": len(chunks),
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(len(chunks) / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+def run_backend(backend: str, chunks_path: str, workdir: str, threads: int, batch_size: int) -> dict:
+    """Run one backend in a fresh interpreter and collect its report and vectors"""
+    output_path = os.path.join(workdir, f"{backend}.npy")
+    env = dict(os.environ, EMBEDDING_BACKEND=backend)
+    if threads:
+        # Same thread budget for both backends
+        env.update(ONNX_INTRA_OP_THREADS=str(threads), OMP_NUM_THREADS=str(threads))
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.embedding_backends", "--worker", backend,
+         "--chunks-file", chunks_path, "--vectors-file", output_path, "--batch-size", str(batch_size)],
+        env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        return {"backend": backend, "error": completed.stderr.strip().splitlines()[-1:] or ["failed"]}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["_vectors"] = output_path
+    return result
+
+
+def agreement(reference: np.ndarray, candidate: np.ndarray, queries: int, k: int) -> dict:
+    """Cosine agreement of paired vectors and top-k overlap of searches on the reference index"""
+    def unit(matrix: np.ndarray) -> np.ndarray:
+        return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+    
+    reference, candidate = unit(reference), unit(candidate)
+    cosines = (reference * candidate).sum(axis=1)
+    
+    # Use chunks as queries: rank the reference index with each backend's query vector
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(reference), size=min(queries, len(reference)), replace=False)
+    overlaps = []
+    for index in picks:
+        expected = set(np.argsort(-(reference @ reference[index]))[:k])
+        found = set(np.argsort(-(reference @ candidate[index]))[:k])
+        overlaps.append(len(expected & found) / k)
+    
+    return {
+        "cosine_mean": round(float(cosines.mean()), 5),
+        "cosine_min": round(float(cosines.min()), 5),
+        f"top{k}_overlap": round(float(np.mean(overlaps)), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=500, help="Chunks to embed")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--threads", type=int, default=0, help="Threads per backend (0 = library default)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embed_documents() call")
+    parser.add_argument("--queries", type=int, default=50, help="Searches for the top-k overlap")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--skip-agreement", action="store_true", help="Don't compare against torch")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--chunks-file", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        _worker(args.worker, args.chunks_file, args.vectors_file, args.batch_size)
+        return
+    
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    if not args.skip_agreement and "torch" not in backends:
+        backends.insert(0, "torch")
+    
+    workdir = tempfile.mkdtemp(prefix="embedbench_")
+    chunks_path = os.path.join(workdir, "chunks.json")
+    with open(chunks_path, "w") as f:
+        json.dump(make_chunks(args.chunks), f)
+    
+    results = [run_backend(name, chunks_path, workdir, args.threads, args.batch_size) for name in backends]
+    
+    reference = next((r for r in results if r["backend"] == "torch" and "error" not in r), None)
+    for result in results:
+        if "error" in result:
+            continue
+        if reference is not None and not args.skip_agreement and result is not reference:
+            result["agreement_vs_torch"] = agreement(
+                np.load(reference["_vectors"]), np.load(result["_vectors"]), args.queries, args.k
+            )
+    
+    print(f"{args.chunks} chunks, threads={args.threads or 'default'}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:>10}: failed - {result['error'][0]}")
+            continue
+        line = (
+            f"{result['backend']:>10}: {result['chunks_per_sec']:>8} chunks/s  "
+            f"cold start={result['cold_start_seconds']}s  peak RSS={result['peak_rss_mb']}MB"
+        )
+        if "agreement_vs_torch" in result:
+            line += "  " + " ".join(f"{key}={value}" for key, value in result["agreement_vs_torch"].items())
+        print(line)
+    
+    if args.output:
+        for result in results:
+            result.pop("_vectors", None)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
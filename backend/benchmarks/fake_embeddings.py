@@ -0,0 +1,40 @@
+"""
+Deterministic offline embedding stand-in.
+
+Hashes tokens into a fixed-size vector (the "hashing trick") and L2
+normalizes it, so similar texts get similar vectors and results are
+reproducible without downloading or running a model. An optional
+per-text delay simulates model cost.
+"""
+import hashlib
+import math
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+class DeterministicEmbeddings(Embeddings):
+    """Drop-in replacement for HuggingFaceEmbeddings in benchmarks"""
+    
+    def __init__(self, dimension: int = 384, cost_per_text_ms: float = 0.0):
+        self.dimension = dimension
+        self.cost_per_text_ms = cost_per_text_ms
+    
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for token in text.lower().split():
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dimension] += sign
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.cost_per_text_ms:
+            time.sleep(self.cost_per_text_ms * len(texts) / 1000)
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
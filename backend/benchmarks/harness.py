@@ -0,0 +1,277 @@
+"""
+End-to-end benchmark harness.
+
+Generates a synthetic PDF corpus, points the app at throwaway storage
+and a mock Groq server, swaps in the offline embedding stand-in (unless
+--embeddings real), then drives the real FastAPI app in-process over
+ASGI under concurrency. Reports:
+
+- extraction pages/sec and embedding chunks/sec (isolated micro-benchmarks)
+- upload throughput and latency through /api/documents/upload
+- chat latency p50/p95/p99 through /api/chat/, broken down by stage
+- optionally, login success/rejection counts for a concurrent login storm
+
+The app is imported only after the environment is configured, because
+Settings reads its values at import time.
+"""
+import asyncio
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from benchmarks.fake_embeddings import DeterministicEmbeddings
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.stats import summarize_ms
+from benchmarks.synthetic_pdf import write_pdf
+
+QUESTIONS = [
+    "What is the payment schedule?",
+    "Summarize the liability clause.",
+    "Who approves the budget?",
+    "What does the warranty section say about delivery?",
+    "List the confidential data obligations.",
+    "What is the total contract amount?",
+]
+
+
+def _configure_environment(workdir: str, mock_url: str):
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "CHROMA_DB_DIR": os.path.join(workdir, "chroma_db"),
+        "GROQ_API_KEY": "benchmark",
+        "GROQ_BASE_URL": mock_url,
+        "MAX_UPLOAD_SIZE": str(1024 * 1024 * 1024),
+        "WARMUP_ON_STARTUP": "False",
+        "SQL_ECHO": "False",
+        "ANONYMIZED_TELEMETRY": "False",
+        # One benchmark user sends everything: no per-user rate limits, and
+        # let requests queue behind the concurrency gates instead of failing
+        "CHAT_RATE_PER_MINUTE": "0",
+        "UPLOAD_RATE_PER_MINUTE": "0",
+        "ADMISSION_MAX_QUEUE": "100000",
+        "ADMISSION_QUEUE_TIMEOUT_SECONDS": "600",
+    })
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def _bench_extraction(paths: List[str]) -> Dict[str, float]:
+    from app.services.pdf_processor import extract_text_from_pdf
+    
+    pages = 0
+    start = time.perf_counter()
+    for path in paths:
+        pages += extract_text_from_pdf(path)["page_count"]
+    elapsed = time.perf_counter() - start
+    return {"pages": pages, "seconds": round(elapsed, 3), "pages_per_sec": round(pages / elapsed, 1)}
+
+
+def _bench_embedding(paths: List[str], embeddings) -> Dict[str, float]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from app.config import settings
+    from app.services.pdf_processor import extract_text_from_pdf
+    
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP,
+        length_function=len,
+    )
+    chunks = []
+    for path in paths:
+        chunks.extend(splitter.split_text(extract_text_from_pdf(path)["text"]))
+    
+    start = time.perf_counter()
+    embeddings.embed_documents(chunks)
+    elapsed = time.perf_counter() - start
+    return {"chunks": len(chunks), "seconds": round(elapsed, 3), "chunks_per_sec": round(len(chunks) / elapsed, 1)}
+
+
+async def _gather_limited(concurrency: int, factories):
+    """Run coroutine factories with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def limited(factory):
+        async with semaphore:
+            return await factory()
+    
+    return await asyncio.gather(*(limited(factory) for factory in factories))
+
+
+async def _drive_app(args, paths: List[str], page_counts: Dict[str, int]) -> Dict[str, Any]:
+    import httpx
+    from app.main import app
+    from app.services.rag_service import get_rag_service
+    
+    rag_service = get_rag_service()
+    stage_samples: List[Dict[str, float]] = []
+    original_query = rag_service.query_document
+    
+    def recording_query(*query_args, **query_kwargs):
+        result = original_query(*query_args, **query_kwargs)
+        stage_samples.append(result.get("timings", {}))
+        return result
+    
+    rag_service.query_document = recording_query
+    
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            response = await client.post("/api/auth/signup", json={
+                "username": "benchuser", "email": "bench@example.com", "password": "benchpass123"
+            })
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            
+            # Uploads
+            upload_latencies, document_ids, failures = [], [], 0
+            
+            def upload_factory(path):
+                async def upload():
+                    nonlocal failures
+                    with open(path, "rb") as f:
+                        content = f.read()
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/api/documents/upload",
+                        headers=headers,
+                        files={"file": (os.path.basename(path), content, "application/pdf")},
+                    )
+                    upload_latencies.append(time.perf_counter() - start)
+                    if response.status_code == 201:
+                        document_ids.append(response.json()["document"]["id"])
+                    else:
+                        failures += 1
+                return upload
+            
+            start = time.perf_counter()
+            await _gather_limited(args.concurrency, [upload_factory(p) for p in paths])
+            elapsed = time.perf_counter() - start
+            total_pages = sum(page_counts.values())
+            results["upload"] = {
+                "documents": len(document_ids),
+                "failures": failures,
+                "docs_per_sec": round(len(document_ids) / elapsed, 2),
+                "pages_per_sec": round(total_pages / elapsed, 1),
+                **summarize_ms(upload_latencies),
+            }
+            
+            # Chat, optionally alongside a login storm
+            chat_latencies, chat_failures = [], 0
+            
+            def chat_factory(index):
+                async def ask():
+                    nonlocal chat_failures
+                    start = time.perf_counter()
+                    response = await client.post("/api/chat/", headers=headers, json={
+                        "document_id": document_ids[index % len(document_ids)],
+                        "question": QUESTIONS[index % len(QUESTIONS)],
+                    })
+                    chat_latencies.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        chat_failures += 1
+                return ask
+            
+            login_statuses: Dict[int, int] = {}
+            
+            def login_factory():
+                async def login():
+                    response = await client.post("/api/auth/login", json={
+                        "username": "benchuser", "password": "benchpass123"
+                    })
+                    login_statuses[response.status_code] = login_statuses.get(response.status_code, 0) + 1
+                return login
+            
+            if not document_ids:
+                raise RuntimeError("No documents were uploaded; cannot run chat benchmark")
+            
+            chat_run = _gather_limited(args.concurrency, [chat_factory(i) for i in range(args.questions)])
+            if args.login_storm:
+                storm = _gather_limited(args.login_storm, [login_factory() for _ in range(args.login_storm * 4)])
+                await asyncio.gather(chat_run, storm)
+                results["login_storm"] = {str(code): count for code, count in sorted(login_statuses.items())}
+            else:
+                await chat_run
+            
+            results["chat"] = {"failures": chat_failures, **summarize_ms(chat_latencies)}
+            stages = sorted({stage for sample in stage_samples for stage in sample})
+            results["chat_stages"] = {
+                stage: summarize_ms(sample[stage] for sample in stage_samples if stage in sample)
+                for stage in stages
+            }
+    
+    rag_service.query_document = original_query
+    return results
+
+
+def flatten_metrics(results: Dict[str, Any]) -> Dict[str, float]:
+    """Flatten the nested results into "section.metric" keys used by compare"""
+    metrics = {}
+    
+    def walk(prefix, value):
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, inner)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[prefix] = value
+    
+    walk("", results)
+    return metrics
+
+
+def run(args) -> Dict[str, Any]:
+    """Run the end-to-end benchmark and return the results document"""
+    workdir = tempfile.mkdtemp(prefix="docassist_bench_")
+    mock = MockGroqServer(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms).start()
+    _configure_environment(workdir, mock.base_url)
+    
+    try:
+        corpus_dir = os.path.join(workdir, "corpus")
+        os.makedirs(corpus_dir)
+        paths, page_counts = [], {}
+        for index in range(args.docs):
+            path = os.path.join(corpus_dir, f"synthetic_{index:04d}.pdf")
+            write_pdf(path, pages=args.pages, seed=index)
+            paths.append(path)
+            page_counts[path] = args.pages
+        
+        from app.services.rag_service import get_rag_service
+        from app.database import init_db
+        
+        init_db()
+        rag_service = get_rag_service()
+        if args.embeddings == "fake":
+            rag_service._embeddings = DeterministicEmbeddings(cost_per_text_ms=args.embed_cost_ms)
+        
+        results = {
+            "extraction": _bench_extraction(paths),
+            "embedding": _bench_embedding(paths, rag_service.embeddings),
+        }
+        results.update(asyncio.run(_drive_app(args, paths, page_counts)))
+    finally:
+        mock.stop()
+    
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "workdir": workdir,
+            "config": vars(args).copy(),
+        },
+        "results": results,
+        "metrics": flatten_metrics(results),
+    }
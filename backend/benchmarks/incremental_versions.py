@@ -0,0 +1,142 @@
+"""
+Incremental indexing benchmark for revised document versions.
+
+Uploads an original PDF and then --revisions revised versions, each
+editing --changed-pages random pages of the previous one, through the
+API. Runs once with near-duplicate detection off (every revision is
+embedded in full) and once with it on (vectors of unchanged text are
+copied from the closest earlier version). Embedding cost is simulated
+with --embed-ms per chunk. Reports, per mode, revision upload latency,
+chunks embedded and reused, and the versions found for the last
+revision.
+
+Usage:
+    python -m benchmarks.incremental_versions --pages 40 --revisions 5 --changed-pages 2
+    python -m benchmarks.incremental_versions --embed-ms 20 --output results/versions.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from typing import List
+
+from benchmarks.fake_embeddings import DeterministicEmbeddings
+from benchmarks.harness import _configure_environment
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.stats import summarize_ms
+from benchmarks.synthetic_pdf import build_pdf, make_page_texts
+
+
+def make_versions(pages: int, revisions: int, changed_pages: int, seed: int = 0) -> List[List[str]]:
+    """Page texts of the original and of each revision"""
+    rng = random.Random(seed)
+    versions = [make_page_texts(pages, seed=seed)]
+    for revision in range(revisions):
+        texts = list(versions[-1])
+        for page in rng.sample(range(pages), changed_pages):
+            texts[page] = make_page_texts(1, seed=seed + 1000 * (revision + 1) + page)[0]
+        versions.append(texts)
+    return versions
+
+
+async def run_mode(client, headers: dict, versions: List[List[str]], enabled: bool) -> dict:
+    """Upload every version with near-duplicate detection on or off"""
+    from app.config import settings
+    
+    configured = settings.NEAR_DUPLICATE_ENABLED
+    settings.NEAR_DUPLICATE_ENABLED = enabled
+    latencies: List[float] = []
+    embedded = reused = 0
+    try:
+        for number, texts in enumerate(versions):
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/documents/upload",
+                headers=headers,
+                files={"file": (f"report_v{number + 1}.pdf", build_pdf(texts), "application/pdf")},
+            )
+            elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            document = response.json()["document"]
+            if number:
+                latencies.append(elapsed)
+                embedded += document["chunks_total"] - (document["chunks_reused"] or 0)
+                reused += document["chunks_reused"] or 0
+        
+        response = await client.get(f"/api/documents/{document['id']}/versions", headers=headers)
+        response.raise_for_status()
+    finally:
+        settings.NEAR_DUPLICATE_ENABLED = configured
+    
+    return {
+        "revision_upload": summarize_ms(latencies),
+        "chunks_embedded": embedded,
+        "chunks_reused": reused,
+        "versions_found": len(response.json()["versions"]),
+        "closest_version": (response.json()["versions"] or [None])[0],
+    }
+
+
+async def drive(versions: List[List[str]]) -> dict:
+    import httpx
+    from app.main import app
+    
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            response = await client.post("/api/auth/signup", json={
+                "username": "benchuser", "email": "bench@example.com", "password": "benchpass123"
+            })
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            
+            full = await run_mode(client, headers, versions, enabled=False)
+            incremental = await run_mode(client, headers, versions, enabled=True)
+    return {"full": full, "incremental": incremental}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--revisions", type=int, default=5)
+    parser.add_argument("--changed-pages", type=int, default=2, help="Pages replaced in each revision")
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="Simulated embedding cost per chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="versionsbench_")
+    mock = MockGroqServer(latency_ms=5, jitter_ms=0).start()
+    _configure_environment(workdir, mock.base_url)
+    
+    try:
+        from app.services.rag_service import get_rag_service
+        
+        get_rag_service()._embeddings = DeterministicEmbeddings(cost_per_text_ms=args.embed_ms)
+        versions = make_versions(args.pages, args.revisions, args.changed_pages, seed=args.seed)
+        results = asyncio.run(drive(versions))
+    finally:
+        mock.stop()
+    
+    print(f"{args.revisions} revisions of {args.pages} pages, {args.changed_pages} pages changed each, {args.embed_ms}ms/chunk")
+    for name in ("full", "incremental"):
+        mode = results[name]
+        upload = mode["revision_upload"]
+        print(
+            f"{name:>11}: revision upload p50={upload['p50_ms']}ms p95={upload['p95_ms']}ms  "
+            f"chunks embedded={mode['chunks_embedded']} reused={mode['chunks_reused']}  "
+            f"versions found={mode['versions_found']}"
+        )
+    closest = results["incremental"]["closest_version"]
+    if closest:
+        print(f"closest version of the last revision: {json.dumps(closest)}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
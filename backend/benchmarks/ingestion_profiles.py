@@ -0,0 +1,138 @@
+"""
+Ingestion profile benchmark.
+
+Indexes synthetic documents of several sizes (--sizes, in pages) under
+every ingestion profile through RAGService.create_vector_store, then
+asks questions quoting a passage of each document and checks whether
+the passage is in the retrieved chunks. Embedding cost is simulated
+with --embed-ms per chunk plus --embed-ms-per-kchar per 1000 characters.
+Reports, per document size and profile, chunks, embedding time, the
+hit rate and chunks sent per question, next to the profile "auto" would
+pick for that size. The offline hashing embeddings make the hit rate a
+rough comparison between profiles, not a measure of answer quality.
+
+Usage:
+    python -m benchmarks.ingestion_profiles --sizes 3,30,300 --questions 20
+    python -m benchmarks.ingestion_profiles --embed-ms 4 --output results/profiles.json
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from typing import List
+
+from benchmarks.fake_embeddings import DeterministicEmbeddings
+from benchmarks.harness import _configure_environment
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.synthetic_pdf import make_page_texts
+
+
+class CostedEmbeddings(DeterministicEmbeddings):
+    """Deterministic embeddings whose simulated cost also grows with text length"""
+    
+    def __init__(self, cost_per_text_ms: float, cost_per_kchar_ms: float):
+        super().__init__(cost_per_text_ms=cost_per_text_ms)
+        self.cost_per_kchar_ms = cost_per_kchar_ms
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.cost_per_kchar_ms:
+            time.sleep(self.cost_per_kchar_ms * sum(len(text) for text in texts) / 1_000_000)
+        return super().embed_documents(texts)
+
+
+def page_text(page: int, body: str) -> str:
+    """Page text as extract_text_from_pdf returns it"""
+    return f"\n--- Page {page} ---\n{body}"
+
+
+def run_profile(rag_service, document_id: int, text: str, profile_name: str, questions: int, seed: int) -> dict:
+    """Index one document under a profile and ask quoting questions"""
+    from app.services.ingestion_profiles import get_profile
+    
+    profile = get_profile(profile_name)
+    progress = {}
+    
+    def checkpoint(done: int, total: int, reused: int, embedding_seconds: float):
+        progress.update(chunks=total, embedding_seconds=embedding_seconds)
+    
+    started = time.perf_counter()
+    if not rag_service.create_vector_store(text, document_id, checkpoint=checkpoint, profile=profile):
+        raise RuntimeError(f"Failed to index document {document_id}")
+    build_seconds = time.perf_counter() - started
+    
+    stored = rag_service.read_vector_store(document_id)
+    by_id = {chunk_id: " ".join(chunk.split()) for chunk_id, chunk in zip(stored["ids"], stored["texts"])}
+    rng = random.Random(seed)
+    words = " ".join(line for line in text.splitlines() if not line.startswith("---")).split()
+    hits = sent = 0
+    for _ in range(questions):
+        start = rng.randrange(0, len(words) - 8)
+        passage = " ".join(words[start:start + 8])
+        result = rag_service.query_document(f"Where does it say {passage}?", document_id, profile=profile_name)
+        if not result["success"]:
+            raise RuntimeError(result["answer"])
+        retrieved = [by_id[chunk["id"]] for chunk in result["retrieved"]]
+        hits += any(passage in chunk for chunk in retrieved)
+        sent += len(retrieved)
+    
+    return {
+        "profile": profile_name,
+        "chunks": progress["chunks"],
+        "embedding_seconds": round(progress["embedding_seconds"], 3),
+        "build_seconds": round(build_seconds, 3),
+        "hit_rate": round(hits / questions, 3),
+        "chunks_per_question": round(sent / questions, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="3,30,300", help="Comma-separated document sizes in pages")
+    parser.add_argument("--questions", type=int, default=20, help="Questions per document and profile")
+    parser.add_argument("--embed-ms", type=float, default=2.0, help="Simulated embedding cost per chunk")
+    parser.add_argument("--embed-ms-per-kchar", type=float, default=2.0, help="Simulated embedding cost per 1000 characters")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="profilesbench_")
+    mock = MockGroqServer(latency_ms=5, jitter_ms=0).start()
+    _configure_environment(workdir, mock.base_url)
+    
+    try:
+        from app.services.ingestion_profiles import PROFILE_NAMES, choose_profile
+        from app.services.rag_service import get_rag_service
+        
+        rag_service = get_rag_service()
+        rag_service._embeddings = CostedEmbeddings(args.embed_ms, args.embed_ms_per_kchar)
+        
+        results = []
+        document_id = 0
+        for size in [int(value) for value in args.sizes.split(",") if value.strip()]:
+            text = "".join(
+                page_text(page + 1, body) for page, body in enumerate(make_page_texts(size, seed=args.seed + size))
+            ).strip()
+            runs = []
+            for profile_name in PROFILE_NAMES:
+                document_id += 1
+                runs.append(run_profile(rag_service, document_id, text, profile_name, args.questions, args.seed))
+            results.append({"pages": size, "auto_profile": choose_profile(size, "auto").name, "profiles": runs})
+    finally:
+        mock.stop()
+    
+    for result in results:
+        print(f"{result['pages']} pages (auto: {result['auto_profile']})")
+        for run in result["profiles"]:
+            print(
+                f"  {run['profile']:>8}: {run['chunks']:>5} chunks  embedding {run['embedding_seconds']:.3f}s  "
+                f"hit rate {run['hit_rate']:.0%}  {run['chunks_per_question']} chunks/question"
+            )
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
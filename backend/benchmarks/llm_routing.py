@@ -0,0 +1,194 @@
+"""
+LLM routing benchmark.
+
+Indexes a synthetic document and asks a mix of questions through
+RAGService.query_document, once with routing off (every question on the
+large model) and once with the configured routing:
+
+- lookups: short "what/when/how many" questions quoting one passage
+  (expected to go to the fast route)
+- vague lookups: short questions about things the document does not
+  cover, so retrieval confidence is low (expected: large)
+- synthesis: "summarize/compare/explain" questions (expected: large)
+
+The mock LLM gives each model its own base latency and per-prompt-token
+cost (--large-ms/--fast-ms, --large-prefill/--fast-prefill). Reports,
+per mode, end-to-end and LLM latency percentiles, questions and latency
+per route, routing reasons, and how many questions were routed as
+expected.
+
+Usage:
+    python -m benchmarks.llm_routing --questions 60
+    python -m benchmarks.llm_routing --fast-min-score 0.3 --fast-max-words 12 --output results/routing.json
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.fake_embeddings import DeterministicEmbeddings
+from benchmarks.harness import _configure_environment
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.stats import summarize_ms
+from benchmarks.synthetic_pdf import WORDS, make_page_texts
+
+DOCUMENT_ID = 1
+KINDS = ("lookup", "vague_lookup", "synthesis")
+EXPECTED_ROUTE = {"lookup": "fast", "vague_lookup": "large", "synthesis": "large"}
+
+_LOOKUP_STARTS = ("What is the", "When was the", "Who signed the", "How many", "Which section lists the")
+_SYNTHESIS_STARTS = (
+    "Summarize what the document says about",
+    "Compare the sections on",
+    "Explain the relationship between",
+    "Why does the document emphasize",
+)
+
+
+def make_questions(text: str, count: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """Questions of each kind, in shuffled order, as (kind, question)"""
+    rng = random.Random(seed)
+    # Body lines only: page headings read like overview requests
+    words = " ".join(line for line in text.splitlines() if not line.startswith("Section")).split()
+    questions = []
+    for i in range(count):
+        kind = KINDS[i % len(KINDS)]
+        if kind == "lookup":
+            start = rng.randrange(0, len(words) - 12)
+            question = f"{rng.choice(_LOOKUP_STARTS)} {' '.join(words[start:start + 12])}?"
+        elif kind == "vague_lookup":
+            question = f"{rng.choice(_LOOKUP_STARTS)} {' '.join(f'unrelated{rng.randrange(1000)}' for _ in range(4))}?"
+        else:
+            topics = " and ".join(" ".join(rng.sample(WORDS, 3)) for _ in range(2))
+            question = f"{rng.choice(_SYNTHESIS_STARTS)} {topics}?"
+        questions.append((kind, question))
+    rng.shuffle(questions)
+    return questions
+
+
+def run_mode(rag_service, questions: List[Tuple[str, str]], routing: bool) -> dict:
+    """Ask every question with routing on or off and aggregate the results"""
+    from app.config import settings
+    
+    configured = settings.LLM_ROUTING_ENABLED
+    settings.LLM_ROUTING_ENABLED = routing
+    totals: List[float] = []
+    llm: List[float] = []
+    by_route: Dict[str, List[float]] = {}
+    reasons: Dict[str, int] = {}
+    as_expected = 0
+    try:
+        for kind, question in questions:
+            started = time.perf_counter()
+            result = rag_service.query_document(question, DOCUMENT_ID)
+            totals.append(time.perf_counter() - started)
+            if not result["success"]:
+                raise RuntimeError(result["answer"])
+            
+            route = result["llm"]["route"]
+            seconds = result["llm"]["latency_ms"] / 1000
+            llm.append(seconds)
+            by_route.setdefault(route, []).append(seconds)
+            reasons[result["llm"]["route_reason"]] = reasons.get(result["llm"]["route_reason"], 0) + 1
+            as_expected += route == EXPECTED_ROUTE[kind]
+    finally:
+        settings.LLM_ROUTING_ENABLED = configured
+    
+    return {
+        "questions": len(questions),
+        "total": summarize_ms(totals),
+        "llm": summarize_ms(llm),
+        "routes": {route: {"questions": len(values), **summarize_ms(values)} for route, values in by_route.items()},
+        "reasons": reasons,
+        "routed_as_expected": round(as_expected / len(questions), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=60)
+    parser.add_argument("--pages", type=int, default=20, help="Pages of synthetic document text")
+    parser.add_argument("--large-ms", type=float, default=600.0, help="Large model base latency")
+    parser.add_argument("--large-prefill", type=float, default=80.0, help="Large model ms per 1000 prompt tokens")
+    parser.add_argument("--fast-ms", type=float, default=120.0, help="Fast model base latency")
+    parser.add_argument("--fast-prefill", type=float, default=15.0, help="Fast model ms per 1000 prompt tokens")
+    parser.add_argument("--fast-max-words", type=int, help="Override LLM_FAST_MAX_QUESTION_WORDS")
+    parser.add_argument("--fast-max-prompt-tokens", type=int, help="Override LLM_FAST_MAX_PROMPT_TOKENS")
+    parser.add_argument("--fast-min-score", type=float, help="Override LLM_FAST_MIN_SCORE")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="routingbench_")
+    for name, value in (
+        ("LLM_FAST_MAX_QUESTION_WORDS", args.fast_max_words),
+        ("LLM_FAST_MAX_PROMPT_TOKENS", args.fast_max_prompt_tokens),
+        ("LLM_FAST_MIN_SCORE", args.fast_min_score),
+    ):
+        if value is not None:
+            os.environ[name] = str(value)
+    
+    mock = MockGroqServer(jitter_ms=0).start()
+    _configure_environment(workdir, mock.base_url)
+    
+    try:
+        from app.config import settings
+        from app.services.rag_service import get_rag_service
+        
+        mock.model_latency = {
+            settings.GROQ_MODEL: (args.large_ms, args.large_prefill),
+            settings.LLM_FAST_MODEL: (args.fast_ms, args.fast_prefill),
+        }
+        
+        rag_service = get_rag_service()
+        rag_service._embeddings = DeterministicEmbeddings()
+        text = "\n\n".join(make_page_texts(args.pages, seed=args.seed))
+        if not rag_service.create_vector_store(text, DOCUMENT_ID):
+            raise SystemExit("Failed to build the benchmark index")
+        
+        questions = make_questions(text, args.questions, seed=args.seed)
+        baseline = run_mode(rag_service, questions, routing=False)
+        routed = run_mode(rag_service, questions, routing=True)
+    finally:
+        mock.stop()
+    
+    def saving(key: str) -> float:
+        before, after = baseline["llm"][key], routed["llm"][key]
+        return round(1 - after / before, 3) if before else 0.0
+    
+    results = {
+        "config": {
+            "large_model": settings.GROQ_MODEL,
+            "fast_model": settings.LLM_FAST_MODEL,
+            "fast_max_question_words": settings.LLM_FAST_MAX_QUESTION_WORDS,
+            "fast_max_prompt_tokens": settings.LLM_FAST_MAX_PROMPT_TOKENS,
+            "fast_min_score": settings.LLM_FAST_MIN_SCORE,
+        },
+        "large_only": baseline,
+        "routed": routed,
+        "llm_latency_savings": {"mean": saving("mean_ms"), "p50": saving("p50_ms"), "p95": saving("p95_ms")},
+    }
+    
+    print(f"{len(questions)} questions ({json.dumps(results['config'])})")
+    for name in ("large_only", "routed"):
+        mode = results[name]
+        print(
+            f"{name:>10}: llm p50={mode['llm']['p50_ms']}ms p95={mode['llm']['p95_ms']}ms  "
+            f"total p50={mode['total']['p50_ms']}ms  as expected={mode['routed_as_expected']:.0%}  "
+            f"reasons={mode['reasons']}"
+        )
+        for route, stats in mode["routes"].items():
+            print(f"{'':>12}{route:>5}: {stats['questions']:>4} questions  p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms")
+    savings = results["llm_latency_savings"]
+    print(f"   savings: LLM latency mean {savings['mean']:.1%}, p50 {savings['p50']:.1%}, p95 {savings['p95']:.1%}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
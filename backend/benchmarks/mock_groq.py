@@ -0,0 +1,108 @@
+"""
+Mock Groq server.
+
+Serves the OpenAI-compatible /openai/v1/chat/completions endpoint the
+Groq SDK calls, with a configurable simulated latency, so chat
+benchmarks exercise the full client path without network access or an
+API key. Point the app at it with GROQ_BASE_URL.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+
+class MockGroqServer:
+    """
+    Threaded HTTP server answering chat completions.
+    
+    Args:
+        latency_ms: Base response latency
+        jitter_ms: Uniform random latency added on top
+        prefill_ms_per_1k_tokens: Extra latency per 1000 prompt tokens
+        port: Port to bind (0 picks a free port)
+        model_latency: Per-model (latency_ms, prefill_ms_per_1k_tokens)
+            overriding the defaults, e.g. to make a small model faster
+    """
+    
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 100.0, port: int = 0, seed: int = 0,
+                 prefill_ms_per_1k_tokens: float = 0.0, model_latency: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.prefill_ms_per_1k_tokens = prefill_ms_per_1k_tokens
+        self.model_latency = model_latency or {}
+        self.requests = 0
+        self.requests_by_model: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                body = json.dumps(server.completion(payload)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def completion(self, payload: dict) -> dict:
+        """Build a chat completion response after the simulated delay"""
+        prompt = " ".join(m.get("content", "") for m in payload.get("messages", []))
+        prompt_tokens = max(1, len(prompt) // 4)
+        
+        model = payload.get("model", "mock")
+        latency_ms, prefill_ms = self.model_latency.get(model, (self.latency_ms, self.prefill_ms_per_1k_tokens))
+        
+        with self._lock:
+            self.requests += 1
+            self.requests_by_model[model] = self.requests_by_model.get(model, 0) + 1
+            delay = latency_ms + self._rng.uniform(0, self.jitter_ms)
+        delay += prefill_ms * prompt_tokens / 1000
+        time.sleep(delay / 1000)
+        
+        answer = "Based on the document, the answer is contained in the retrieved sections."
+        completion_tokens = len(answer) // 4
+        now = int(time.time())
+        return {
+            "id": f"chatcmpl-mock-{now}",
+            "object": "chat.completion",
+            "created": now,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+    
+    def start(self) -> "MockGroqServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
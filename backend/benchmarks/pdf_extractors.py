@@ -0,0 +1,186 @@
+"""
+PDF extraction engine benchmark.
+
+Extracts a corpus with each installed engine on its own (no fallback)
+and reports throughput and text fidelity. On the synthetic corpus
+fidelity is measured against the generator's ground truth; with
+--corpus (a directory of real PDFs) it is measured against the
+--reference engine's output, so "1.0" means "same words as today".
+
+Fidelity is reported twice: word F1 (right words, any order) and word
+order similarity (difflib ratio over the word sequence).
+
+Usage:
+    python -m benchmarks.pdf_extractors --docs 20 --pages 10
+    python -m benchmarks.pdf_extractors --corpus ~/pdfs --reference pypdf2
+"""
+import argparse
+import difflib
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app.services.pdf_processor import EXTRACTORS
+from benchmarks.synthetic_pdf import write_pdf
+
+
+def _synthetic_corpus(docs: int, pages: int) -> Dict[str, List[str]]:
+    """Write synthetic PDFs and return their ground-truth page texts by path"""
+    workdir = tempfile.mkdtemp(prefix="pdfbench_")
+    corpus = {}
+    for i in range(docs):
+        path = os.path.join(workdir, f"doc_{i}.pdf")
+        corpus[path] = write_pdf(path, pages, seed=i, words_per_line=8 + i % 8)
+    return corpus
+
+
+def _extract(extractor, path: str) -> Optional[List[Optional[str]]]:
+    """Page texts of one file (None for pages that raised), or None if it didn't open"""
+    try:
+        pdf = extractor.open(path)
+    except Exception:
+        return None
+    try:
+        texts = []
+        for index in range(pdf.page_count):
+            try:
+                texts.append(pdf.page_text(index))
+            except Exception:
+                texts.append(None)
+        return texts
+    finally:
+        pdf.close()
+
+
+def _words(text: Optional[str]) -> List[str]:
+    return (text or "").split()
+
+
+def _fidelity(extracted: Optional[str], truth: str):
+    """Word F1 and word order similarity of one page"""
+    got, want = _words(extracted), _words(truth)
+    if not want:
+        return (1.0, 1.0) if not got else (0.0, 0.0)
+    overlap = sum((Counter(got) & Counter(want)).values())
+    if not overlap:
+        return 0.0, 0.0
+    precision, recall = overlap / len(got), overlap / len(want)
+    f1 = 2 * precision * recall / (precision + recall)
+    order = difflib.SequenceMatcher(None, got, want, autojunk=False).ratio()
+    return f1, order
+
+
+def run_engine(name: str, paths: List[str], repeat: int) -> dict:
+    """Extract every file `repeat` times and keep the fastest pass"""
+    extractor = EXTRACTORS[name]()
+    best = None
+    outputs = {}
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        outputs = {path: _extract(extractor, path) for path in paths}
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    
+    pages = sum(len(texts) for texts in outputs.values() if texts is not None)
+    return {
+        "engine": name,
+        "seconds": round(best, 3),
+        "pages": pages,
+        "pages_per_sec": round(pages / best, 1) if best else 0.0,
+        "unopened_files": sum(1 for texts in outputs.values() if texts is None),
+        "failed_pages": sum(1 for texts in outputs.values() if texts for text in texts if text is None),
+        "empty_pages": sum(1 for texts in outputs.values() if texts for text in texts if text is not None and not text.strip()),
+        "_outputs": outputs,
+    }
+
+
+def score(result: dict, truth: Dict[str, List[Optional[str]]]):
+    """Add mean word F1 and word order similarity against `truth` to a result"""
+    f1_scores, order_scores = [], []
+    for path, truth_pages in truth.items():
+        texts = result["_outputs"].get(path) or []
+        for index, truth_text in enumerate(truth_pages):
+            extracted = texts[index] if index < len(texts) else None
+            f1, order = _fidelity(extracted, truth_text or "")
+            f1_scores.append(f1)
+            order_scores.append(order)
+    result["word_f1"] = round(sum(f1_scores) / len(f1_scores), 4) if f1_scores else None
+    result["word_order"] = round(sum(order_scores) / len(order_scores), 4) if order_scores else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20, help="Synthetic PDFs to generate")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per synthetic PDF")
+    parser.add_argument("--corpus", help="Directory of real PDFs to use instead of synthetic ones")
+    parser.add_argument("--reference", default="pypdf2", help="Engine whose output is the truth for --corpus")
+    parser.add_argument("--engines", default=",".join(EXTRACTORS), help="Comma-separated engines to compare")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes per engine (fastest is reported)")
+    parser.add_argument("--min-fidelity", type=float, default=0.98,
+                        help="Word F1 an engine needs to be recommended")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    names = []
+    for name in (n.strip() for n in args.engines.split(",") if n.strip()):
+        if name not in EXTRACTORS:
+            parser.error(f"unknown engine {name!r} (choose from {', '.join(EXTRACTORS)})")
+        if EXTRACTORS[name].available():
+            names.append(name)
+        else:
+            print(f"skipping {name}: not installed")
+    
+    if args.corpus:
+        paths = sorted(
+            os.path.join(root, filename)
+            for root, _, files in os.walk(args.corpus)
+            for filename in files if filename.lower().endswith(".pdf")
+        )
+        if not paths:
+            parser.error(f"no PDFs found under {args.corpus}")
+        if args.reference not in names:
+            parser.error(f"reference engine {args.reference!r} is not among the benchmarked engines")
+    else:
+        corpus = _synthetic_corpus(args.docs, args.pages)
+        paths = list(corpus)
+    
+    results = [run_engine(name, paths, args.repeat) for name in names]
+    if args.corpus:
+        reference = next(result for result in results if result["engine"] == args.reference)
+        truth = {path: texts or [] for path, texts in reference["_outputs"].items()}
+    else:
+        truth = corpus
+    for result in results:
+        score(result, truth)
+        del result["_outputs"]
+    
+    print(f"{len(paths)} files, fidelity vs {args.reference if args.corpus else 'ground truth'}")
+    for result in sorted(results, key=lambda r: r["pages_per_sec"], reverse=True):
+        print(
+            f"{result['engine']:>10}: {result['pages_per_sec']:>8} pages/s  "
+            f"word F1={result['word_f1']} order={result['word_order']}  "
+            f"empty={result['empty_pages']} failed={result['failed_pages']} unopened={result['unopened_files']}"
+        )
+    
+    good_enough = [
+        result for result in results
+        if result["word_f1"] is not None and result["word_f1"] >= args.min_fidelity and not result["unopened_files"]
+    ]
+    if good_enough:
+        best = max(good_enough, key=lambda r: r["pages_per_sec"])
+        fallbacks = [name for name in names if name != best["engine"]]
+        print(f"\nFastest engine with word F1 >= {args.min_fidelity}: {best['engine']}")
+        print(f"PDF_EXTRACTORS={','.join([best['engine']] + fallbacks)}")
+    else:
+        print(f"\nNo engine reached word F1 >= {args.min_fidelity}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Time-to-first-answer benchmark for progressive indexing.
+
+Uploads one large synthetic PDF (--pages) through the API and asks
+about it as soon as the upload returns, once with progressive indexing
+off (the upload waits for every chunk) and once with it on (the upload
+returns after the first slice and the rest is embedded in the
+background). Embedding cost is simulated with --embed-ms per chunk.
+
+Reports, per mode and in seconds from the start of the upload: when the
+upload returned, when the first answer arrived, when a question about a
+page near the end (asked with a page range, so its pages jump the
+embedding queue) was answered from that page, and when the document was
+fully indexed, with the coverage of the partial index at each answer.
+
+Usage:
+    python -m benchmarks.progressive_indexing --pages 400 --embed-ms 5
+    python -m benchmarks.progressive_indexing --pages 1000 --output results/progressive.json
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+from benchmarks.fake_embeddings import DeterministicEmbeddings
+from benchmarks.harness import _configure_environment
+from benchmarks.mock_groq import MockGroqServer
+from benchmarks.synthetic_pdf import build_pdf, make_page_texts
+
+
+async def ask(client, headers: dict, document_id: int, question: str, page: int = None) -> dict:
+    """Ask one question, optionally limited to one page"""
+    body = {"document_id": document_id, "question": question}
+    if page is not None:
+        body.update(page_start=page, page_end=page)
+    response = await client.post("/api/chat/", headers=headers, json=body, params={"explain": True})
+    response.raise_for_status()
+    return response.json()
+
+
+async def run_mode(client, headers: dict, pdf: bytes, target_page: int, enabled: bool) -> dict:
+    """Upload the PDF and time its answers with progressive indexing on or off"""
+    from app.config import settings
+    
+    configured = settings.PROGRESSIVE_INDEXING_ENABLED
+    settings.PROGRESSIVE_INDEXING_ENABLED = enabled
+    try:
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/documents/upload",
+            headers=headers,
+            files={"file": ("manual.pdf", pdf, "application/pdf")},
+        )
+        response.raise_for_status()
+        upload_seconds = time.perf_counter() - started
+        document = response.json()["document"]
+        
+        first = await ask(client, headers, document["id"], "What does the overview say about revenue?")
+        first_answer_seconds = time.perf_counter() - started
+        
+        # Retried until the page's chunks are searchable (the first try usually finds them)
+        target = await ask(client, headers, document["id"], f"What is in section {target_page}?", page=target_page)
+        while not target["explain"]["chunks"]:
+            target = await ask(client, headers, document["id"], f"What is in section {target_page}?", page=target_page)
+        target_answer_seconds = time.perf_counter() - started
+        
+        while document["status"] != "ready":
+            await asyncio.sleep(0.1)
+            response = await client.get(f"/api/documents/{document['id']}", headers=headers)
+            response.raise_for_status()
+            document = response.json()
+            if document["status"] == "failed":
+                raise RuntimeError(document["status_error"])
+        indexed_seconds = time.perf_counter() - started
+    finally:
+        settings.PROGRESSIVE_INDEXING_ENABLED = configured
+    
+    return {
+        "chunks": document["chunks_total"],
+        "upload_seconds": round(upload_seconds, 3),
+        "first_answer_seconds": round(first_answer_seconds, 3),
+        "first_answer_coverage": first["coverage"],
+        "target_page_answer_seconds": round(target_answer_seconds, 3),
+        "target_page_coverage": target["coverage"],
+        "fully_indexed_seconds": round(indexed_seconds, 3),
+    }
+
+
+async def drive(pdf: bytes, target_page: int) -> dict:
+    import httpx
+    from app.main import app
+    
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            response = await client.post("/api/auth/signup", json={
+                "username": "benchuser", "email": "bench@example.com", "password": "benchpass123"
+            })
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            
+            full = await run_mode(client, headers, pdf, target_page, enabled=False)
+            progressive = await run_mode(client, headers, pdf, target_page, enabled=True)
+    return {"full": full, "progressive": progressive}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="Simulated embedding cost per chunk")
+    parser.add_argument("--target-page", type=int, help="Page asked about while indexing (default: 10 before the end)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="progressivebench_")
+    mock = MockGroqServer(latency_ms=5, jitter_ms=0).start()
+    _configure_environment(workdir, mock.base_url)
+    
+    try:
+        from app.config import settings
+        from app.services.rag_service import get_rag_service
+        
+        settings.PROGRESSIVE_MIN_PAGES = min(settings.PROGRESSIVE_MIN_PAGES, args.pages)
+        settings.NEAR_DUPLICATE_ENABLED = False  # Both modes upload the same PDF; embed it in full each time
+        get_rag_service()._embeddings = DeterministicEmbeddings(cost_per_text_ms=args.embed_ms)
+        target_page = args.target_page or max(1, args.pages - 10)
+        pdf = build_pdf(make_page_texts(args.pages, seed=args.seed))
+        results = asyncio.run(drive(pdf, target_page))
+    finally:
+        mock.stop()
+    
+    print(f"{args.pages} pages, {results['full']['chunks']} chunks, {args.embed_ms}ms/chunk, target page {target_page}")
+    for name in ("full", "progressive"):
+        mode = results[name]
+        print(
+            f"{name:>11}: upload {mode['upload_seconds']:.2f}s  "
+            f"first answer {mode['first_answer_seconds']:.2f}s (coverage {mode['first_answer_coverage']:.0%})  "
+            f"page {target_page} answered {mode['target_page_answer_seconds']:.2f}s (coverage {mode['target_page_coverage']:.0%})  "
+            f"fully indexed {mode['fully_indexed_seconds']:.2f}s"
+        )
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
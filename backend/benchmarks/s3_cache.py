@@ -0,0 +1,196 @@
+"""
+S3 index cache check against an in-process S3 (moto).
+
+Publishes a synthetic index directory from one node and reads it from
+another, each with its own local cache, the way two API workers on
+different hosts share indexes through S3. Checks and reports:
+
+- S3 requests per query while the index is cached (expected: none
+  within STORAGE_CACHE_REVALIDATE_SECONDS, one HEAD after it)
+- that a republished index replaces the reader's cached copy, and a
+  deleted one stops being served
+- that deleting a prefix drops the cached copies nested under it
+  (partial index copies, "doc_1.partial/<chunks>")
+- that evicting a cached index stops the Chroma client opened on it
+  before its directory is removed
+
+Point S3_ENDPOINT_URL at a MinIO server (with S3_ACCESS_KEY_ID /
+S3_SECRET_ACCESS_KEY) and pass --endpoint to run against it instead.
+
+Usage:
+    python -m benchmarks.s3_cache --queries 200
+    python -m benchmarks.s3_cache --endpoint http://localhost:9000 --bucket rag-check
+"""
+import argparse
+import json
+import sys
+import tempfile
+from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+
+INDEX = "doc_1"
+
+
+def count_requests(storage) -> Counter:
+    """Count the S3 operations a storage backend sends, by name"""
+    requests = Counter()
+    
+    def record(model, **kwargs):
+        requests[model.name] += 1
+    
+    storage.client.meta.events.register("before-call.s3", record)
+    return requests
+
+
+def build_index(storage, content: str, name: str = INDEX) -> Path:
+    """Write and publish a small directory under `name`"""
+    from app.services.storage import INDEXES
+    
+    if storage.has_prefix(INDEXES, name):
+        storage.delete_prefix(INDEXES, name)
+    directory = storage.build_dir(INDEXES, name)
+    (directory / "chroma.sqlite3").write_text(content)
+    (directory / "segment").mkdir(exist_ok=True)
+    (directory / "segment" / "data_level0.bin").write_bytes(content.encode("utf-8") * 64)
+    storage.publish_dir(INDEXES, name, directory)
+    return directory
+
+
+def check(results: dict, name: str, passed: bool, detail: str = ""):
+    results["checks"][name] = passed
+    print(f"{'ok  ' if passed else 'FAIL'} {name}{f': {detail}' if detail else ''}")
+
+
+def run(args) -> dict:
+    from app.config import settings
+    from app.services.rag_service import release_index_clients
+    from app.services.storage import INDEXES, LocalCache, S3Storage
+    from chromadb.api.shared_system_client import SharedSystemClient
+    import chromadb
+    
+    settings.S3_BUCKET = args.bucket
+    settings.S3_PREFIX = "check/"
+    if args.endpoint:
+        settings.S3_ENDPOINT_URL = args.endpoint
+    else:
+        settings.S3_ENDPOINT_URL = ""
+        settings.S3_REGION = "us-east-1"
+        settings.S3_ACCESS_KEY_ID = settings.S3_SECRET_ACCESS_KEY = "check"
+    
+    workdir = Path(tempfile.mkdtemp(prefix="s3cache_"))
+    evicted = []
+    
+    def before_remove(namespace: str, path: Path):
+        still_open = any(Path(identifier) == path for identifier in SharedSystemClient._identifier_to_system)
+        release_index_clients(path.name)
+        evicted.append({"path": path.name, "existed": path.exists(), "client_was_open": still_open})
+    
+    writer = S3Storage(LocalCache(str(workdir / "writer"), 1024 ** 3))
+    reader = S3Storage(LocalCache(str(workdir / "reader"), 1024 ** 3, before_remove=before_remove))
+    if not args.endpoint or not any(b["Name"] == args.bucket for b in writer.client.list_buckets()["Buckets"]):
+        writer.client.create_bucket(Bucket=args.bucket)
+    requests = count_requests(reader)
+    results = {"queries": args.queries, "checks": {}}
+    
+    build_index(writer, "version 1")
+    reader.local_dir(INDEXES, INDEX)
+    results["first_read_requests"] = dict(requests)
+    
+    # Cached: no request at all within the revalidation window
+    requests.clear()
+    settings.STORAGE_CACHE_REVALIDATE_SECONDS = 3600
+    for _ in range(args.queries):
+        reader.local_dir(INDEXES, INDEX)
+    results["cached_requests_per_query"] = sum(requests.values()) / args.queries
+    check(results, "cache hits send no request", not requests, f"{dict(requests) or 'none'}")
+    
+    # Past the window: one HEAD of the manifest, no LIST
+    requests.clear()
+    settings.STORAGE_CACHE_REVALIDATE_SECONDS = 0
+    for _ in range(args.queries):
+        reader.local_dir(INDEXES, INDEX)
+    results["revalidated_requests_per_query"] = sum(requests.values()) / args.queries
+    check(
+        results,
+        "revalidation is one HEAD per query",
+        set(requests) == {"HeadObject"} and requests["HeadObject"] == args.queries,
+        f"{dict(requests)}"
+    )
+    
+    # Republished by the other node: the reader picks up the new version
+    build_index(writer, "version 2")
+    refreshed = reader.local_dir(INDEXES, INDEX)
+    check(
+        results,
+        "republished index replaces the cached copy",
+        (refreshed / "chroma.sqlite3").read_text() == "version 2"
+    )
+    
+    # Deleted by the other node: no longer served
+    writer.delete_prefix(INDEXES, INDEX)
+    check(results, "deleted index is not served", reader.local_dir(INDEXES, INDEX) is None)
+    
+    # Nested copies: deleting their prefix drops every cached one
+    copies = [f"{INDEX}.partial/{chunks}" for chunks in (64, 128)]
+    for name in copies:
+        build_index(writer, name, name)
+    cached_copies = [reader.local_dir(INDEXES, name) for name in copies]
+    reader.delete_prefix(INDEXES, f"{INDEX}.partial")
+    check(
+        results,
+        "deleting a prefix drops nested cached copies",
+        all(path is not None for path in cached_copies) and not any(path.exists() for path in cached_copies)
+        and not any(writer.has_prefix(INDEXES, name) for name in copies),
+        f"{[path.name for path in cached_copies if path is not None and path.exists()] or 'none left'}"
+    )
+    
+    # Eviction: a Chroma client open on the cached index is stopped before removal
+    build_index(writer, "version 3")
+    cached = reader.local_dir(INDEXES, INDEX)
+    (cached / "chroma.sqlite3").unlink()  # Let Chroma create a real database in the cached directory
+    chromadb.PersistentClient(path=str(cached)).get_or_create_collection(INDEX)
+    evicted.clear()
+    reader.cache.max_bytes = 0
+    reader.cache.adopt(INDEXES, "doc_2")  # Anything tracked pushes doc_1 out
+    check(
+        results,
+        "eviction stops the open Chroma client first",
+        bool(evicted) and all(entry["existed"] for entry in evicted)
+        and not any(Path(identifier) == cached for identifier in SharedSystemClient._identifier_to_system)
+        and not cached.exists(),
+        f"{evicted}"
+    )
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200, help="Cached reads per phase")
+    parser.add_argument("--endpoint", help="S3-compatible endpoint to use instead of moto (e.g. MinIO)")
+    parser.add_argument("--bucket", default="rag-cache-check")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+    
+    if args.endpoint:
+        mock = nullcontext()
+    else:
+        from moto import mock_aws
+        
+        mock = mock_aws()
+    
+    with mock:
+        results = run(args)
+    
+    print(
+        f"S3 requests per query: {results['cached_requests_per_query']:.2f} cached, "
+        f"{results['revalidated_requests_per_query']:.2f} past the revalidation window"
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(results["checks"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""
+Small statistics helpers shared by the benchmarks.
+"""
+import statistics
+from typing import Dict, Iterable
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty sample)"""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize_ms(seconds: Iterable[float]) -> Dict[str, float]:
+    """Summarize a latency sample given in seconds as milliseconds"""
+    seconds = list(seconds)
+    return {
+        "count": len(seconds),
+        "mean_ms": round(statistics.fmean(seconds) * 1000, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(seconds, 50) * 1000, 2),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 2),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 2),
+    }